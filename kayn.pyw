@@ -1,4 +1,8 @@
+import time
+
+started = time.perf_counter()
+
 from modules.gui.main import main as gui_main_start
 
 if __name__ == "__main__":
-    gui_main_start()
+    gui_main_start(started)
@@ -0,0 +1,164 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from PyQt5.QtGui import QImage
+import argparse
+import ast
+import glob
+import os
+import sys
+import time
+
+# Headless batch processing: `python project.py batch <inputs> -f <chain>`.
+# Every image is read, filtered and written by a worker process, so only
+# paths and timings cross process boundaries. At most `--in-flight` images
+# are queued or being processed at once, which bounds memory whatever the
+# number of inputs, and results are written as soon as they are ready.
+#
+# A chain is a comma separated list of Filters methods with their arguments
+# after colons, e.g. "grayscale,equalize,binarize:127,erosion:5:rect".
+
+EXTENSIONS = {".bmp", ".jpg", ".jpeg", ".png", ".pbm", ".pgm", ".ppm", ".tif", ".tiff", ".webp"}
+
+
+@dataclass
+class Result:
+    source: str
+    target: str
+    seconds: float = 0.0
+    pixels: int = 0
+    error: str = None
+
+
+def parse_chain(chain: str) -> list[tuple[str, tuple]]:
+    from modules.filters import Filters
+
+    steps = []
+    for step in filter(None, (s.strip() for s in chain.split(","))):
+        name, *args = step.split(":")
+        if not callable(getattr(Filters, name, None)) or name.startswith("_"):
+            raise ValueError(f"Unknown filter {name!r}")
+        steps.append((name, tuple(_parse_argument(a) for a in args)))
+    return steps
+
+
+def _parse_argument(text: str):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text  # Plain words, like a structuring element shape.
+
+
+def find_images(inputs: list[str]) -> list[tuple[str, str]]:
+    """(path, name relative to the output directory) of every input image."""
+    images = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                for file in sorted(files):
+                    if os.path.splitext(file)[1].lower() in EXTENSIONS:
+                        path = os.path.join(root, file)
+                        images.append((path, os.path.relpath(path, pattern)))
+        else:
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(path):
+                    images.append((path, os.path.basename(path)))
+    return images
+
+
+def _start_worker() -> None:
+    import modules.result_cache as result_cache
+
+    result_cache.CACHE.resize(0)  # Every image is seen once.
+
+
+def process_image(source: str, target: str, steps: list, threads: int) -> Result:
+    from modules.filters import Filters
+
+    start = time.perf_counter()
+    result = Result(source, target)
+    try:
+        image = QImage(source)
+        if image.isNull():
+            raise OSError("cannot read the image")
+        result.pixels = image.width() * image.height()
+        for name, args in steps:
+            image = getattr(Filters(image, threads=threads), name)(*args)
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        if not image.save(target):
+            raise OSError("cannot write the image")
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def run(images, output: str, steps: list, workers: int, in_flight: int, threads: int, suffix: str = None, skip_existing: bool = False):
+    """Process `images` on a process pool; yields every Result when done."""
+    def targets():
+        for source, name in images:
+            if suffix:
+                name = os.path.splitext(name)[0] + suffix
+            target = os.path.join(output, name)
+            if not (skip_existing and os.path.exists(target)):
+                yield source, target
+
+    pending = set()
+    queue = targets()
+    with ProcessPoolExecutor(workers, initializer=_start_worker) as pool:
+        for source, target in queue:
+            pending.add(pool.submit(process_image, source, target, steps, threads))
+            if len(pending) >= in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+        for future in pending:
+            yield future.result()
+
+
+def report(result: Result) -> None:
+    if result.error:
+        print(f"FAIL {result.source}: {result.error}", flush=True)
+        return
+    rate = result.pixels / result.seconds / 1e6 if result.seconds else 0.0
+    print(f"ok   {result.source} -> {result.target} ({result.seconds:.3f} s, {rate:.1f} MP/s)", flush=True)
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="project.py batch", description="Apply a filter chain to many images.")
+    parser.add_argument("inputs", nargs="+", help="image files, directories or glob patterns")
+    parser.add_argument("-f", "--filters", required=True, help='e.g. "grayscale,equalize,binarize:127"')
+    parser.add_argument("-o", "--output", default="output", help="output directory (default: output)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--in-flight", type=int, default=0, help="images queued at once (default: 2 per worker)")
+    parser.add_argument("--threads", type=int, default=1, help="libkayn threads per worker")
+    parser.add_argument("--format", help="output extension, e.g. png (default: keep the input's)")
+    parser.add_argument("--skip-existing", action="store_true", help="leave images already in the output alone")
+    args = parser.parse_args(argv)
+
+    try:
+        steps = parse_chain(args.filters)
+    except ValueError as e:
+        parser.error(str(e))
+    images = find_images(args.inputs)
+    if not images:
+        parser.error("no input images found")
+
+    workers = max(args.workers, 1)
+    in_flight = args.in_flight if args.in_flight > 0 else 2 * workers
+    suffix = f".{args.format.lstrip('.')}" if args.format else None
+
+    start = time.perf_counter()
+    count = failed = pixels = 0
+    for result in run(images, args.output, steps, workers, in_flight, args.threads, suffix, args.skip_existing):
+        report(result)
+        count += 1
+        failed += result.error is not None
+        pixels += result.pixels if result.error is None else 0
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"\n{count - failed} of {count} images in {elapsed:.2f} s: "
+        f"{count / elapsed if elapsed else 0:.2f} images/s, "
+        f"{pixels / elapsed / 1e6 if elapsed else 0:.1f} MP/s",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
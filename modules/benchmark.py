@@ -0,0 +1,286 @@
+from PyQt5.QtGui import QImage
+import argparse
+import datetime
+import glob
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import numpy as np
+import modules.image_adapter as img_adpt
+import modules.result_cache as result_cache
+import modules.profiling as prof
+import modules.filters as filters
+from modules.filters import Filters
+
+# Benchmark suite: `python project.py bench run` times every public Filters
+# method and the frequency domain helpers on the images in resources/ and
+# on synthetic images, and writes the results as JSON.
+# `python project.py bench compare old.json new.json` matches two runs (of
+# different commits or backends) case by case and flags regressions.
+#
+# Every case runs `--repeat` times and keeps the median. Marshalling and
+# kernel times add up the profiling spans of those names; methods without
+# spans report them as null.
+#
+# Memory is the peak RSS of a case over the RSS it started from. Linux lets
+# the peak be reset before each case; elsewhere, or when the reset fails,
+# the peak is the process's so far and rss_delta_mb is null.
+
+SIZES = (256, 1024, 4096, 8192)
+MARSHAL_SPANS = ("get pixels", "marshal in", "marshal out", "QImage build")
+RESOURCES = "resources"
+
+# Arguments for methods without usable defaults; `w` and `h` are the size.
+ARGUMENTS = {
+    "split_color_channel": lambda w, h: ("red",),
+    "binarize": lambda w, h: (127,),
+    "limiarize": lambda w, h: (127,),
+    "salt_and_pepper": lambda w, h: (10,),
+    "dynamic_compression": lambda w, h: (1, 0.8),
+    "resize_nearest_neighbor": lambda w, h: (max(w // 2, 1), max(h // 2, 1)),
+    "run_pipeline": lambda w, h: (filters.pipelines.Pipeline().grayscale().equalize().binarize(127).erosion(3),),
+}
+# Static methods and how to call them from a QImage.
+FREQUENCY_CASES = {
+    "DCT": lambda image: lambda: Filters.DCT(image),
+    "IDCT": lambda image: _with_coefficients(image, lambda c, w, h: Filters.IDCT(c, w, h)),
+    "lowpass": lambda image: _with_coefficients(image, lambda c, w, h: Filters.lowpass(c, w, h, min(w, h) // 4)),
+    "highpass": lambda image: _with_coefficients(image, lambda c, w, h: Filters.highpass(c, w, h, min(w, h) // 4)),
+    "block_DCT": lambda image: lambda: Filters.block_DCT(image, 8),
+    "block_IDCT": lambda image: _with_block_spectrum(image),
+}
+
+
+def _with_coefficients(image: QImage, function: callable) -> callable:
+    _, coefficients = Filters.DCT(image)
+    w, h = image.width(), image.height()
+    return lambda: function(coefficients, w, h)
+
+
+def _with_block_spectrum(image: QImage) -> callable:
+    _, spectrum = Filters.block_DCT(image, 8)
+
+    def run():
+        spectrum.dirty[:] = True  # Otherwise only the first run does any work.
+        return Filters.block_IDCT(spectrum)
+
+    return run
+
+
+def public_methods() -> list[str]:
+    return [
+        name
+        for name, member in inspect.getmembers(Filters, inspect.isfunction)
+        if not name.startswith("_")
+        and not isinstance(inspect.getattr_static(Filters, name), staticmethod)
+        and name != "area_filter"
+    ]
+
+
+def synthetic_image(side: int, seed: int = 0) -> QImage:
+    """A smooth color gradient with noise: stable and not trivially flat."""
+    y, x = np.mgrid[0:side, 0:side].astype(np.float32) / max(side - 1, 1)
+    noise = np.random.default_rng(seed).normal(0, 12, (side, side, 3))
+    pixels = np.empty((side, side, 4), dtype=np.uint8)
+    base = np.stack([x, y, (x + y) / 2], axis=2) * 220 + noise
+    pixels[..., :3] = np.clip(base, 0, 255)
+    pixels[..., 3] = 255
+    return img_adpt.array_to_image(pixels)
+
+
+def images(sizes, resources: str):
+    for side in sizes:
+        yield f"synthetic-{side}", synthetic_image(side)
+    if resources:
+        for path in sorted(glob.glob(os.path.join(resources, "*"))):
+            image = QImage(path)
+            if not image.isNull():
+                yield os.path.basename(path), image
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak RSS to the current RSS; False where that is not possible."""
+    try:  # Linux only: resets VmHWM, so every case measures its own peak.
+        with open("/proc/self/clear_refs", "w") as refs:
+            refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def _status_mb(field: str) -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb() -> float:
+    return _status_mb("VmRSS")
+
+
+def peak_rss_mb() -> float:
+    peak = _status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def measure(case: callable, repeat: int) -> dict:
+    runs, splits = [], []
+    reset = _reset_peak_rss()
+    before = rss_mb()
+    for _ in range(repeat):
+        call = case()
+        with prof.recording(prof.Aggregator()) as spans:
+            start = time.perf_counter()
+            call()
+            runs.append(time.perf_counter() - start)
+        kernel = spans.total("kernel")
+        marshal = sum(spans.total(name) for name in MARSHAL_SPANS)
+        splits.append((marshal, kernel) if kernel else (None, None))
+    middle = runs.index(sorted(runs)[len(runs) // 2])
+    peak = peak_rss_mb()
+    return {
+        "seconds": statistics.median(runs),
+        "runs": runs,
+        "marshal_s": splits[middle][0],
+        "kernel_s": splits[middle][1],
+        "peak_rss_mb": round(peak, 1),
+        "rss_delta_mb": round(peak - before, 1) if reset and before is not None else None,
+    }
+
+
+def run_suite(sizes, resources: str, backend: str, threads: int, repeat: int, only: str = None):
+    methods = public_methods()
+    for label, image in images(sizes, resources):
+        w, h = image.width(), image.height()
+        cases = {}
+        for name in methods:
+            arguments = ARGUMENTS.get(name, lambda w, h: ())(w, h)
+
+            def case(name=name, arguments=arguments):
+                instance = Filters(image, backend=backend, threads=threads)
+                return lambda: getattr(instance, name)(*arguments)
+
+            cases[name] = case
+        for name, prepare in FREQUENCY_CASES.items():
+            cases[name] = lambda prepare=prepare: prepare(image)
+
+        for name, case in cases.items():
+            if only and only not in name:
+                continue
+            result = {"method": name, "image": label, "width": w, "height": h, "backend": backend}
+            try:
+                result.update(measure(case, repeat))
+                result["mp_per_s"] = w * h / result["seconds"] / 1e6
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+            yield result
+
+
+def metadata(backend: str, threads: int) -> dict:
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "backend": backend,
+        "threads": threads,
+        "native": filters.kayn is not None,
+        "peak_rss_reset": _reset_peak_rss(),
+    }
+
+
+def _key(result: dict) -> tuple:
+    return result["method"], result["image"], result["width"], result["height"]
+
+
+def compare(old: dict, new: dict, threshold: float, min_delta: float = 0.0) -> list[tuple]:
+    """
+    (key, old seconds, new seconds, ratio, regressed) for common cases. A
+    case regressed when it is `threshold` slower and lost over `min_delta`
+    seconds, so timer noise on tiny cases is not flagged.
+    """
+    before = {_key(r): r for r in old["results"] if "error" not in r}
+    rows = []
+    for result in new["results"]:
+        key = _key(result)
+        if key not in before or "error" in result:
+            continue
+        a, b = before[key]["seconds"], result["seconds"]
+        ratio = b / a if a else float("inf")
+        rows.append((key, a, b, ratio, ratio > 1 + threshold and b - a > min_delta))
+    return rows
+
+
+def main_run(args) -> int:
+    result_cache.CACHE.resize(0)  # Repeated runs must recompute.
+    report = {"meta": metadata(args.backend, args.threads), "results": []}
+    if not report["meta"]["peak_rss_reset"]:
+        print("warning: cannot reset the peak RSS here; memory is not measured per case", file=sys.stderr)
+    for result in run_suite(args.sizes, args.resources, args.backend, args.threads, args.repeat, args.only):
+        report["results"].append(result)
+        if "error" in result:
+            print(f"{result['method']:<26} {result['image']:<20} {result['error']}", flush=True)
+        else:
+            delta = result["rss_delta_mb"]
+            memory = f"{delta:+8.1f} MB" if delta is not None else f"{'n/a':>8}   "
+            print(
+                f"{result['method']:<26} {result['image']:<20} {result['seconds']:9.4f} s "
+                f"{result['mp_per_s']:8.2f} MP/s {memory}",
+                flush=True,
+            )
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=1)
+    print(f"\nWrote {len(report['results'])} results to {args.output}")
+    return 0
+
+
+def main_compare(args) -> int:
+    with open(args.old) as old, open(args.new) as new:
+        rows = compare(json.load(old), json.load(new), args.threshold, args.min_delta)
+    regressions = 0
+    for (method, image, _, _), a, b, ratio, regressed in sorted(rows, key=lambda row: -row[3]):
+        flag = "REGRESSION" if regressed else ("faster" if ratio < 1 - args.threshold else "")
+        regressions += regressed
+        print(f"{method:<26} {image:<20} {a:9.4f} s -> {b:9.4f} s  x{ratio:6.2f}  {flag}")
+    print(f"\n{len(rows)} cases compared, {regressions} regressions over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="project.py bench", description="Benchmark the Filters engine.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite and write JSON results")
+    run.add_argument("-o", "--output", default="benchmark.json")
+    run.add_argument("--sizes", type=int, nargs="*", default=list(SIZES), help="synthetic image sides")
+    run.add_argument("--resources", default=RESOURCES, help="directory of real images ('' to skip)")
+    run.add_argument("--backend", default=filters.DEFAULT_BACKEND, choices=sorted(filters.BACKENDS))
+    run.add_argument("--threads", type=int, default=filters.DEFAULT_THREADS)
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--only", help="run only methods whose name contains this")
+    run.set_defaults(main=main_run)
+
+    diff = commands.add_parser("compare", help="compare two result files")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=0.10, help="slowdown flagged as regression")
+    diff.add_argument("--min-delta", type=float, default=0.002, help="seconds below which slowdowns are noise")
+    diff.set_defaults(main=main_compare)
+
+    args = parser.parse_args(argv)
+    return args.main(args)
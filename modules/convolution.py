@@ -0,0 +1,141 @@
+import numpy as np
+import modules.progress as progress
+
+# Convolution engine used by the NumPy backend. `correlate` slides a square
+# mask over an image and returns only the positions where the mask fits
+# entirely ("valid" mode), so a (h, w) image and a k x k mask give a
+# (h - k + 1, w - k + 1) result, like Filters.area_filter expects.
+#
+# The strategy is picked from the mask:
+#   * constant masks (box/mean)  -> summed-area table, O(1) per pixel
+#     (the same tables give local means and deviations, see local_statistics)
+#   * rank-1 masks (separable)   -> two 1-D passes, O(k) per pixel
+#   * small non-separable masks  -> direct sum of shifted images, O(k²)
+#   * large masks                -> FFT, O(log(w·h)) per pixel
+
+DIRECT_MAX_SIDE = 7
+SEPARABLE_MAX_SIDE = 31
+SEPARABLE_TOLERANCE = 1e-6
+
+
+def correlate(image: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Correlate every channel of a (h, w, c) image with a (k, k) mask.
+    Returns a float array of shape (h - k + 1, w - k + 1, c).
+    """
+    mask = np.asarray(mask, dtype=np.float64)
+    side = mask.shape[0]
+    if image.shape[0] < side or image.shape[1] < side:
+        raise ValueError(f"Image is smaller than the {side}x{side} mask")
+
+    if np.all(mask == mask.flat[0]):
+        return box_sum(image, side) * mask.flat[0]
+
+    separable = separate(mask)
+    if separable is not None and side <= SEPARABLE_MAX_SIDE:
+        column, row = separable
+        with progress.section(0, 2):
+            image = _correlate_1d(image, column, axis=0)
+        with progress.section(1, 2):
+            return _correlate_1d(image, row, axis=1)
+
+    if side <= DIRECT_MAX_SIDE:
+        return _correlate_direct(image, mask)
+    return _correlate_fft(image, mask)
+
+
+def separate(mask: np.ndarray):
+    """
+    Split a rank-1 mask into the (column, row) vectors whose outer product
+    rebuilds it, or return None when the mask is not separable.
+    """
+    u, s, vt = np.linalg.svd(mask)
+    if s[0] == 0 or (len(s) > 1 and s[1] > SEPARABLE_TOLERANCE * s[0]):
+        return None
+    scale = np.sqrt(s[0])
+    return u[:, 0] * scale, vt[0] * scale
+
+
+# Summed-area tables (integral images). table[y, x] holds the sum of the
+# pixels above and left of (y, x), so any window sum takes four lookups and
+# costs the same whatever the window size.
+def summed_area_table(image: np.ndarray, dtype=np.float64) -> np.ndarray:
+    """(h + 1, w + 1, ...) table with a zero first row and column."""
+    table = np.zeros((image.shape[0] + 1, image.shape[1] + 1) + image.shape[2:], dtype=dtype)
+    np.cumsum(image, axis=0, dtype=dtype, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+
+def box_sum(image: np.ndarray, side: int) -> np.ndarray:
+    """Sum of every side x side window that fits inside the image."""
+    table = summed_area_table(image)
+    return (
+        table[side:, side:]
+        - table[:-side, side:]
+        - table[side:, :-side]
+        + table[:-side, :-side]
+    )
+
+
+def window_sums(table: np.ndarray, side: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sums over the side x side window centered on every pixel, clipped to the
+    image, and the number of pixels in each window. Same size as the image.
+    """
+    h, w = table.shape[0] - 1, table.shape[1] - 1
+    half = side // 2
+    y0, y1 = (np.clip(np.arange(h) + d, 0, h) for d in (-half, side - half))
+    x0, x1 = (np.clip(np.arange(w) + d, 0, w) for d in (-half, side - half))
+    rows = table[y1] - table[y0]  # Column sums of every window's rows
+    sums = rows[:, x1] - rows[:, x0]
+    counts = (y1 - y0)[:, np.newaxis] * (x1 - x0)
+    return sums, counts
+
+
+def local_statistics(values: np.ndarray, side: int) -> tuple[np.ndarray, np.ndarray]:
+    """Mean and standard deviation of the side x side window around every pixel."""
+    values = np.asarray(values)
+    # Integer tables keep the sums exact, so the variance does not cancel out.
+    exact = np.int64 if values.dtype.kind in "ub" else np.float64
+    with progress.section(0, 2):
+        sums, counts = window_sums(summed_area_table(values, exact), side)
+    with progress.section(1, 2):
+        squares, _ = window_sums(summed_area_table(values.astype(exact) ** 2, exact), side)
+    counts = counts.reshape(counts.shape + (1,) * (values.ndim - 2))
+    spread = np.maximum(counts * squares - sums * sums, 0)  # n² variance
+    return sums / counts, np.sqrt(spread) / counts
+
+
+def _correlate_1d(image: np.ndarray, kernel: np.ndarray, axis: int) -> np.ndarray:
+    size = image.shape[axis] - len(kernel) + 1
+    result = np.zeros(image.shape[:axis] + (size,) + image.shape[axis + 1 :])
+    for i, weight in enumerate(kernel):
+        progress.report(i, len(kernel))
+        if weight != 0:
+            window = image[i : i + size] if axis == 0 else image[:, i : i + size]
+            result += weight * window
+    return result
+
+
+def _correlate_direct(image: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    side = mask.shape[0]
+    h, w = image.shape[0] - side + 1, image.shape[1] - side + 1
+    result = np.zeros((h, w) + image.shape[2:])
+    for (y, x), weight in np.ndenumerate(mask):
+        progress.report(y * side + x, mask.size)
+        if weight != 0:
+            result += weight * image[y : y + h, x : x + w]
+    return result
+
+
+def _correlate_fft(image: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    side = mask.shape[0]
+    h, w = image.shape[:2]
+    # Flipping turns the FFT convolution into a correlation.
+    spectrum = np.fft.rfft2(mask[::-1, ::-1], s=(h, w))
+    if image.ndim == 3:
+        spectrum = spectrum[..., np.newaxis]
+    product = np.fft.rfft2(image, axes=(0, 1)) * spectrum
+    result = np.fft.irfft2(product, s=(h, w), axes=(0, 1))
+    return result[side - 1 :, side - 1 :]
@@ -0,0 +1,267 @@
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+
+# Orthonormal DCT-II / DCT-III (its inverse), computed separably along each
+# axis with real FFTs of length 2N, so any width and height is supported and
+# an N x N transform costs O(N² log N). Twiddle factors and normalization
+# weights are computed once per length and cached.
+#
+# Coefficients are float32 arrays of shape (height, width), where [v, u]
+# holds vertical frequency v and horizontal frequency u.
+#
+# The block mode tiles the image into BLOCK_SIZES squares (edge-padded to a
+# whole number of blocks) and transforms all of them at once as a batched
+# C @ X @ C.T matrix product. Block coefficients keep the spatial layout:
+# block (j, i) occupies the same rows and columns as its pixels.
+
+BLOCK_SIZES = (8, 16)
+
+# JPEG (ITU T.81, Annex K) luminance quantization table for 8 x 8 blocks.
+JPEG_LUMINANCE = np.array(
+    [
+        [16, 11, 10, 16, 24, 40, 51, 61],
+        [12, 12, 14, 19, 26, 58, 60, 55],
+        [14, 13, 16, 24, 40, 57, 69, 56],
+        [14, 17, 22, 29, 51, 87, 80, 62],
+        [18, 22, 37, 56, 68, 109, 103, 77],
+        [24, 35, 55, 64, 81, 104, 113, 92],
+        [49, 64, 78, 87, 103, 121, 120, 101],
+        [72, 92, 95, 98, 112, 100, 103, 99],
+    ],
+    dtype=np.float32,
+)
+
+
+@lru_cache(maxsize=None)
+def _tables(n: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    k = np.arange(n)
+    weights = np.full(n, np.sqrt(2 / n))
+    weights[0] = np.sqrt(1 / n)
+    forward = np.exp(-1j * np.pi * k / (2 * n)) * weights
+    inverse = np.exp(1j * np.pi * k / (2 * n)) * weights * n
+    inverse[0] *= 2  # The half spectrum given to irfft counts bin 0 once.
+    return forward.astype(np.complex64), inverse.astype(np.complex64), weights
+
+
+def _shape_for(axis: int, ndim: int, n: int) -> tuple:
+    shape = [1] * ndim
+    shape[axis] = n
+    return tuple(shape)
+
+
+def _head(values: np.ndarray, n: int, axis: int) -> np.ndarray:
+    return values[(slice(None),) * axis + (slice(0, n),)]
+
+
+def dct_axis(values: np.ndarray, axis: int) -> np.ndarray:
+    n = values.shape[axis]
+    forward = _tables(n)[0].reshape(_shape_for(axis, values.ndim, n))
+    spectrum = np.fft.rfft(values, n=2 * n, axis=axis)
+    return (_head(spectrum, n, axis) * forward).real.astype(np.float32)
+
+
+def idct_axis(coefficients: np.ndarray, axis: int) -> np.ndarray:
+    n = coefficients.shape[axis]
+    inverse = _tables(n)[1].reshape(_shape_for(axis, coefficients.ndim, n))
+    spectrum = coefficients * inverse
+    values = np.fft.irfft(spectrum, n=2 * n, axis=axis)
+    return _head(values, n, axis).astype(np.float32)
+
+
+def dct2(image: np.ndarray) -> np.ndarray:
+    """2-D DCT-II of a (height, width) array."""
+    image = np.asarray(image, dtype=np.float32)
+    return dct_axis(dct_axis(image, 1), 0)
+
+
+def idct2(coefficients: np.ndarray) -> np.ndarray:
+    """2-D DCT-III of a (height, width) array: the inverse of dct2."""
+    coefficients = np.asarray(coefficients, dtype=np.float32)
+    return idct_axis(idct_axis(coefficients, 0), 1)
+
+
+def basis_vector(n: int, k: int) -> np.ndarray:
+    """The k-th orthonormal DCT basis function of length n."""
+    weight = _tables(n)[2][k]
+    return (weight * np.cos(np.pi * (2 * np.arange(n) + 1) * k / (2 * n))).astype(np.float32)
+
+
+def to_pixels(values: np.ndarray) -> np.ndarray:
+    """Round and saturate spatial values to uint8."""
+    return np.clip(np.round(values), 0, 255).astype(np.uint8)
+
+
+def spectrum_pixels(coefficients: np.ndarray, peak: float = None) -> np.ndarray:
+    """
+    Log-magnitude view of the coefficients scaled to 0-255.
+    `peak` is the largest magnitude; it is computed when not given.
+    """
+    if peak is None:
+        peak = float(np.abs(coefficients).max(initial=0))
+    return magnitude_pixels(coefficients, peak)
+
+
+def magnitude_pixels(values, peak: float) -> np.ndarray:
+    """spectrum_pixels of single coefficients against a known peak."""
+    if peak == 0:
+        return np.zeros(np.shape(values), dtype=np.uint8)
+    return to_pixels(np.log1p(np.abs(values)) * (255 / np.log1p(peak)))
+
+
+def radial_mask(height: int, width: int, radius: float) -> np.ndarray:
+    """True where the frequency (v, u) lies within `radius` of the DC term."""
+    v, u = np.ogrid[:height, :width]
+    return u * u + v * v <= radius * radius
+
+
+@dataclass
+class IncrementalInverse:
+    """
+    Keeps the float inverse of a whole-image spectrum up to date while single
+    coefficients change. Changing [v, u] by delta adds delta times the
+    separable basis image outer(basis_vector(h, v), basis_vector(w, u)), an
+    O(h * w) update with no transform. The running min/max of the
+    coefficients gives the display peak, so the spectrum view only changes
+    one pixel unless the peak moves.
+    """
+
+    coefficients: np.ndarray
+    spatial: np.ndarray
+    spectrum: np.ndarray
+    low: float
+    high: float
+
+    @staticmethod
+    def from_coefficients(coefficients: np.ndarray) -> "IncrementalInverse":
+        low, high = float(coefficients.min()), float(coefficients.max())
+        spectrum = spectrum_pixels(coefficients, max(-low, high))
+        return IncrementalInverse(coefficients, idct2(coefficients), spectrum, low, high)
+
+    @property
+    def peak(self) -> float:
+        return max(-self.low, self.high)
+
+    def set_coefficient(self, x: int, y: int, value: float):
+        h, w = self.coefficients.shape
+        old, peak = float(self.coefficients[y, x]), self.peak
+        self.coefficients[y, x] = value
+        basis = np.outer(basis_vector(h, y), basis_vector(w, x))
+        self.spatial += np.float32(value - old) * basis
+
+        if (old == self.low and value > old) or (old == self.high and value < old):
+            # An extreme moved inward: only then rescan.
+            self.low, self.high = float(self.coefficients.min()), float(self.coefficients.max())
+        else:
+            self.low, self.high = min(self.low, value), max(self.high, value)
+
+        if self.peak == peak:
+            self.spectrum[y, x] = magnitude_pixels(value, peak)
+        else:
+            self.spectrum = spectrum_pixels(self.coefficients, self.peak)
+
+    def pixels(self) -> np.ndarray:
+        return to_pixels(self.spatial)
+
+
+@lru_cache(maxsize=None)
+def basis_matrix(n: int) -> np.ndarray:
+    """The n x n orthonormal DCT-II matrix: row k is basis_vector(n, k)."""
+    matrix = np.stack([basis_vector(n, k) for k in range(n)])
+    matrix.flags.writeable = False
+    return matrix
+
+
+def to_blocks(values: np.ndarray, block: int) -> np.ndarray:
+    """View a (h, w) array, both multiples of `block`, as (h/b, w/b, b, b)."""
+    h, w = values.shape
+    return values.reshape(h // block, block, w // block, block).swapaxes(1, 2)
+
+
+def from_blocks(blocks: np.ndarray) -> np.ndarray:
+    rows, columns, block = blocks.shape[:3]
+    return blocks.swapaxes(1, 2).reshape(rows * block, columns * block)
+
+
+def block_mask(block: int, radius: float) -> np.ndarray:
+    """radial_mask of a single block."""
+    return radial_mask(block, block, radius)
+
+
+def quantization_table(block: int, quality: int) -> np.ndarray:
+    """
+    JPEG luminance table scaled for `quality` (1-100, IJG formula) and
+    stretched to `block` x `block` for 16 x 16 blocks.
+    """
+    quality = min(max(quality, 1), 100)
+    scale = 5000 / quality if quality < 50 else 200 - 2 * quality
+    table = np.clip(np.floor((JPEG_LUMINANCE * scale + 50) / 100), 1, 255)
+    factor = block // 8
+    # Orthonormal coefficients of larger blocks grow with the block side.
+    return np.kron(table, np.ones((factor, factor), dtype=np.float32)) * factor
+
+
+@dataclass
+class BlockSpectrum:
+    """
+    Block DCT of a grayscale image. `spatial` caches the float
+    reconstruction and `dirty` marks the blocks whose coefficients changed
+    since the last inverse, so only those are transformed again.
+    """
+
+    coefficients: np.ndarray
+    spatial: np.ndarray
+    dirty: np.ndarray
+    block: int
+    width: int
+    height: int
+
+    @staticmethod
+    def from_pixels(gray: np.ndarray, block: int = 8) -> "BlockSpectrum":
+        if block not in BLOCK_SIZES:
+            raise ValueError(f"Unsupported block size {block}, expected one of {BLOCK_SIZES}")
+        height, width = gray.shape
+        pad = (-height % block, -width % block)
+        spatial = np.pad(gray.astype(np.float32), [(0, pad[0]), (0, pad[1])], mode="edge")
+        matrix = basis_matrix(block)
+        coefficients = from_blocks(matrix @ to_blocks(spatial, block) @ matrix.T)
+        dirty = np.zeros((spatial.shape[0] // block, spatial.shape[1] // block), dtype=bool)
+        return BlockSpectrum(coefficients, spatial, dirty, block, width, height)
+
+    @property
+    def blocks(self) -> np.ndarray:
+        """Writable (rows, columns, block, block) view of the coefficients."""
+        return to_blocks(self.coefficients, self.block)
+
+    def set_coefficient(self, x: int, y: int, value: float):
+        self.coefficients[y, x] = value
+        self.dirty[y // self.block, x // self.block] = True
+
+    def apply_mask(self, mask: np.ndarray):
+        """Multiply every block by a (block, block) mask."""
+        blocks = self.blocks
+        blocks *= mask
+        self.dirty[:] = True
+
+    def lowpass(self, radius: float):
+        self.apply_mask(block_mask(self.block, radius))
+
+    def highpass(self, radius: float):
+        self.apply_mask(~block_mask(self.block, radius))
+
+    def quantize(self, quality: int):
+        """Round every coefficient to a multiple of the JPEG table step."""
+        table = quantization_table(self.block, quality)
+        blocks = self.blocks
+        blocks[:] = np.round(blocks / table) * table
+        self.dirty[:] = True
+
+    def inverse(self) -> np.ndarray:
+        """Reconstruct the dirty blocks and return the (height, width) pixels."""
+        rows, columns = np.nonzero(self.dirty)
+        if len(rows):
+            matrix = basis_matrix(self.block)
+            changed = self.blocks[rows, columns]
+            to_blocks(self.spatial, self.block)[rows, columns] = matrix.T @ changed @ matrix
+            self.dirty[:] = False
+        return to_pixels(self.spatial[: self.height, : self.width])
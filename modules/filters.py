@@ -1,136 +1,186 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from PyQt5.QtGui import QImage
 import numpy as np
-import libkayn as kayn
-from random import randint
-import time
+import modules.image_adapter as img_adpt
+import modules.numpy_backend as np_backend
+import modules.dct as dct
+import modules.pipeline as pipelines
+import modules.result_cache as result_cache
+import modules.profiling as prof
+import os
+
+try:
+    import libkayn as kayn
+except ImportError:  # The Rust extension was not built (see project.py).
+    kayn = None
+
+# Backends implementing the point operations (grayscale, negative, ...).
+BACKENDS = {"numpy": np_backend, "kayn": kayn}
+DEFAULT_BACKEND = os.environ.get("KAYN_BACKEND", "numpy")
+# Threads libkayn may use per filter; 0 uses one per core.
+DEFAULT_THREADS = int(os.environ.get("KAYN_THREADS", 0))
+
+
+def _buffer_entry_point(filter_func: callable):
+    """
+    The libkayn function taking a raw RGBA buffer instead of nested lists,
+    when `filter_func` comes from libkayn and the build provides one.
+    """
+    if kayn is None or getattr(kayn, filter_func.__name__, None) is not filter_func:
+        return None
+    return getattr(kayn, f"{filter_func.__name__}_buffer", None)
+
+
+def _call_buffer_entry_point(native, image: np.ndarray, shape, **kwargs) -> np.ndarray:
+    h, w = image.shape[:2]
+    with prof.span("marshal in"):
+        data, stride = img_adpt.array_to_buffer(image)
+    with prof.span("kernel", native=native.__name__):
+        result = native(data, stride, w, h, **kwargs)
+    with prof.span("marshal out"):
+        return np.frombuffer(result, dtype=np.uint8).reshape(*shape, 4)
+
 
 @dataclass
 class Filters:
     img: QImage
+    backend: str = DEFAULT_BACKEND
+    threads: int = DEFAULT_THREADS
+
+    @property
+    def ops(self):
+        ops = BACKENDS.get(self.backend)
+        if ops is None:
+            raise ValueError(f"Backend {self.backend!r} is not available")
+        return ops
+
+    def _use_threads(self):
+        # libkayn's thread limit is global, so set it before every native call.
+        if hasattr(kayn, "set_threads"):
+            kayn.set_threads(self.threads)
 
     def _default_filter(self, filter_func: callable, **kwargs) -> QImage:
-        t_start = time.perf_counter()
         w, h = self.img.width(), self.img.height()
-        image = self._get_img_pixels(w, h)
-        print("Sending: ", image.shape)
-        t_get_pixels = time.perf_counter()
-        filtered = np.array(filter_func(image, **kwargs), dtype=np.uint8).astype(np.uint8)
-        # filtered = filtered.reshape(h, w, 4)
-        t_filter = time.perf_counter()
-        
-        new_image = QImage(filtered, w, h, QImage.Format.Format_RGBA8888)
-        t_create_image = time.perf_counter()
-        
-        
-        print(f"ABSOLUTED TIME FOR THE FILTER {filter_func.__name__}:")
-        print(f"Get pixels: {t_get_pixels - t_start}")
-        print(f"Filter: {t_filter - t_get_pixels}")
-        print(f"Create image: {t_create_image - t_filter}")
-
-        total = t_create_image - t_start
-        # percentual timings:
-        print("\nRELATIVE TIMINGS:")
-        print(f"Get pixels: {100 * (t_get_pixels - t_start) / total}")
-        print(f"Filter: {100 * (t_filter - t_get_pixels) / total}")
-        print(f"Create image: {100 * (t_create_image - t_filter) / total}")
-
-        return new_image
+        with prof.span(filter_func.__name__, width=w, height=h, **kwargs):
+            self._use_threads()
+            with prof.span("get pixels"):
+                image = self._get_img_pixels()
+            native = _buffer_entry_point(filter_func)
+            if native is not None:
+                filtered = _call_buffer_entry_point(native, image, (h, w), **kwargs)
+            else:
+                with prof.span("kernel"):
+                    filtered = np.asarray(filter_func(image, **kwargs), dtype=np.uint8)
+            with prof.span("QImage build"):
+                return img_adpt.array_to_image(filtered)
 
     def area_filter(self, function: callable, mask_side, **kwargs) -> QImage:
         w, h = self.img.width(), self.img.height()
-        image = self._get_img_pixels(w, h)
-        result = np.array(function(image, **kwargs), dtype=np.uint8).astype(np.uint8)
-        result = result.reshape(h, w, 4)
-
-        new_w, new_h = w - mask_side + 1, h - mask_side + 1
-        new_image = QImage(result, new_w, new_h, QImage.Format.Format_RGBA8888)
-
-        return new_image
-
-    def _create_new_image(self, width=320, height=240):
-        image = QImage(width, height, QImage.Format.Format_RGB32)
-        return image
-
-    def _get_default_elements_to_filters(self) -> tuple:
-        w, h = self.img.width(), self.img.height()
-        image = self._create_new_image(w, h)
-        return w, h, image
-
-    def _get_img_pixels(self, w, h):
-        bits = np.array(self.img.bits().asarray(w * h * 4))
-        pixels = bits.reshape(h, w, 4) # Use matrix to represent the image
-        pixels = pixels[:, :, [2, 1, 0, 3]] # BGR -> RGB
-        return pixels
+        with prof.span(function.__name__, width=w, height=h, mask_side=mask_side, **kwargs):
+            self._use_threads()
+            with prof.span("get pixels"):
+                image = self._get_img_pixels()
+            # Keep only the pixels where the whole mask fits inside the image.
+            new_w, new_h = w - mask_side + 1, h - mask_side + 1
+
+            native = _buffer_entry_point(function)
+            if native is not None:
+                result = _call_buffer_entry_point(native, image, (new_h, new_w), **kwargs)
+            else:
+                with prof.span("kernel"):
+                    result = np.asarray(function(image, **kwargs), dtype=np.uint8)
+                if result.shape[:2] != (new_h, new_w):  # Full frame with empty borders.
+                    half = mask_side // 2
+                    result = result.reshape(h, w, 4)
+                    result = result[half : half + new_h, half : half + new_w]
+            with prof.span("QImage build"):
+                return img_adpt.array_to_image(result)
+
+    def _get_img_pixels(self) -> np.ndarray:
+        return img_adpt.image_to_array(self.img)
 
     def grayscale(self) -> QImage:
         if self.img.isGrayscale():
             return self.img
-        return self._default_filter(kayn.grayscale)
+        return self._default_filter(self.ops.grayscale)
 
     def split_color_channel(self, channel: str) -> QImage:
         ch = 0 if channel == "red" else 1 if channel == "green" else 2
-        return self._default_filter(kayn.split_color_channel, channel=ch)
+        return self._default_filter(self.ops.split_color_channel, channel=ch)
 
     def negative(self) -> QImage:
-        return self._default_filter(kayn.negative)
+        return self._default_filter(self.ops.negative)
 
     def binarize(self, threshold: int) -> QImage:
-        return self._default_filter(kayn.binarize, threshold=threshold)
+        return self._default_filter(self.ops.binarize, threshold=threshold)
 
     def salt_and_pepper(self, amount: float = 1) -> QImage:
         w, h = self.img.width(), self.img.height()
 
-        image = self.img.copy()
+        pixels = self._get_img_pixels().copy()
 
         perc = int(amount * w * h // 100)
-        rand = lambda p: randint(0, p - 1)
-        for _ in range(perc // 2):
-            x1, x2, y1, y2 = rand(w), rand(w), rand(h), rand(h)
-            image.setPixel(x2, y2, 0x00000000)
-            image.setPixel(x1, y1, 0xFFFFFFFF)
-        return image
+        rand = lambda p: np.random.randint(0, p, perc // 2)
+        pixels[rand(h), rand(w)] = (0, 0, 0, 255)
+        pixels[rand(h), rand(w)] = (255, 255, 255, 255)
+        return img_adpt.array_to_image(pixels)
 
     def equalize(self) -> QImage:
-        return self._default_filter(kayn.equalize)
+        return self._default_filter(self.ops.equalize)
 
+    @result_cache.cached
     def mean(self, n: int = 3) -> QImage:
         mask = np.ones(n * n) / (n * n)
         side = int(mask.shape[0] ** 0.5)
-        return self.area_filter(kayn.convolute, side, mask=mask)
-
-    def median(self, n: int = 3) -> QImage:
+        return self.area_filter(self.ops.convolute, side, mask=mask)
+
+    @result_cache.cached
+    def median(self, n: int = 3, per_channel: bool = True) -> QImage:
+        """
+        `per_channel` takes the median of each channel on its own, which is
+        much faster for big windows. Otherwise whole pixels are ordered by
+        their packed 0xRRGGBB value.
+        """
         n = n if n % 2 == 1 else n + 1
         dist = int(n / 2)
-        return self.area_filter(kayn.median, mask_side=n, distance=dist)
+        return self.area_filter(
+            self.ops.median, mask_side=n, distance=dist, per_channel=per_channel
+        )
 
     def dynamic_compression(self, c: float = 1, gamma: float = 1) -> QImage:
-        return self._default_filter(kayn.dynamic_compression, constant=c, gamma=gamma)
+        return self._default_filter(self.ops.dynamic_compression, constant=c, gamma=gamma)
 
     def normalize(self) -> QImage:
-        return self._default_filter(kayn.normalize)
+        return self._default_filter(self.ops.normalize)
 
+    def _on_gray(self) -> "Filters":
+        """The same filters on the gray version of the image; self is unchanged."""
+        return replace(self, img=self.grayscale())
+
+    @result_cache.cached
     def sobel(self) -> QImage:
-        if not self.img.isGrayscale():
-            self.img = self.grayscale()
-        return self.area_filter(kayn.sobel, mask_side=3)
+        return self._on_gray().area_filter(self.ops.sobel, mask_side=3)
 
+    @result_cache.cached
     def sobel_magnitudes(self) -> tuple[QImage, QImage, QImage]:
         kernelY = np.array([-1, -2, -1, 0, 0, 0, 1, 2, 1]) / np.float64(4)
         kernelX = np.array([-1, 0, 1, -2, 0, 2, -1, 0, 1]) / np.float64(4)
-        if not self.img.isGrayscale():
-            self.img = self.grayscale()
-        vert = self.area_filter(kayn.convolute, mask_side=3, mask=kernelY)
-        horiz = self.area_filter(kayn.convolute, mask_side=3, mask=kernelX)
-        magnitude = self.sobel()
+        gray = self._on_gray()
+        vert = gray.area_filter(self.ops.convolute, mask_side=3, mask=kernelY)
+        horiz = gray.area_filter(self.ops.convolute, mask_side=3, mask=kernelX)
+        # The magnitude comes from the two responses rather than a third pass.
+        gradients = (img_adpt.image_to_array(image) for image in (horiz, vert))
+        magnitude = img_adpt.array_to_image(np_backend.sobel_magnitude(*gradients))
         return magnitude, vert, horiz
 
+    @result_cache.cached
     def laplace(self) -> QImage:
         mask = np.array([0, -1, 0, -1, 4, -1, 0, -1, 0]) / np.float64(4)
         side = int(mask.shape[0] ** 0.5)
-        return self.area_filter(kayn.convolute, side, mask=mask)
+        return self.area_filter(self.ops.convolute, side, mask=mask)
 
     # fmt: off
+    @result_cache.cached
     def gaussian_laplacian(self) -> QImage:
         mask = np.array(
             [
@@ -142,114 +192,207 @@ class Filters:
             ]
         ) / np.float64(16)
         side = int(mask.shape[0] ** 0.5)
-        return self.area_filter(kayn.convolute, side, mask=mask)
+        return self.area_filter(self.ops.convolute, side, mask=mask)
 
     def resize_nearest_neighbor(self, new_width: int, new_height: int) -> QImage:
         w, h = self.img.width(), self.img.height()
-        image = self._get_img_pixels(w, h)
-        new_image = QImage(new_width, new_height, QImage.Format.Format_RGB32)
-        resized = kayn.resize_nn(image, w, h, new_width, new_height)
-        for y in range(new_height):
-            for x in range(new_width):
-                new_image.setPixel(x, y, resized[x + y * new_width])
-        return new_image
+        with prof.span("resize_nearest_neighbor", width=w, height=h, new_width=new_width, new_height=new_height):
+            with prof.span("get pixels"):
+                image = self._get_img_pixels()
+            if self.ops is np_backend:
+                with prof.span("kernel"):
+                    resized = np_backend.resize_nearest_neighbor(image, new_width, new_height)
+                with prof.span("QImage build"):
+                    return img_adpt.array_to_image(resized)
+
+            self._use_threads()
+            native = _buffer_entry_point(kayn.resize_nn)
+            if native is not None:
+                shape = (new_height, new_width)
+                resized = _call_buffer_entry_point(
+                    native, image, shape, new_width=new_width, new_height=new_height
+                )
+                with prof.span("QImage build"):
+                    return img_adpt.array_to_image(resized)
+
+            with prof.span("marshal in"):
+                rgb = image[..., :3].reshape(-1, 3).tolist()
+            with prof.span("kernel", native="resize_nn"):
+                resized = kayn.resize_nn(rgb, w, h, new_width, new_height)
+            with prof.span("QImage build"):
+                return img_adpt.hex_to_image(resized, new_width, new_height)
 
     def limiarize(self, threshold: int) -> QImage:
-        return self._default_filter(kayn.limiarize, threshold=threshold)
+        return self._default_filter(self.ops.limiarize, threshold=threshold)
 
     def gray_to_color_scale(self) -> QImage:
-        return self._default_filter(kayn.gray_to_color_scale)
+        return self._default_filter(self.ops.gray_to_color_scale)
 
-    def noise_reduction_max(self, n: int = 3) -> QImage:
+    @result_cache.cached
+    def noise_reduction_max(self, n: int = 3, per_channel: bool = True) -> QImage:
         n = n if n % 2 == 1 else n + 1
         distance = int(n / 2)
-        return self.area_filter(kayn.noise_reduction_max, mask_side=n, distance=distance)
-
-    def noise_reduction_min(self, n: int = 3) -> QImage:
+        return self.area_filter(
+            self.ops.noise_reduction_max,
+            mask_side=n,
+            distance=distance,
+            per_channel=per_channel,
+        )
+
+    @result_cache.cached
+    def noise_reduction_min(self, n: int = 3, per_channel: bool = True) -> QImage:
         n = n if n % 2 == 1 else n + 1
         distance = int(n / 2)
-        return self.area_filter(kayn.noise_reduction_min, mask_side=n, distance=distance)
-
-    def noise_reduction_midpoint(self, n: int = 3) -> QImage:
+        return self.area_filter(
+            self.ops.noise_reduction_min,
+            mask_side=n,
+            distance=distance,
+            per_channel=per_channel,
+        )
+
+    @result_cache.cached
+    def noise_reduction_midpoint(self, n: int = 3, per_channel: bool = True) -> QImage:
         n = n if n % 2 == 1 else n + 1
         distance = int(n / 2)
-        return self.area_filter(kayn.noise_reduction_midpoint, mask_side=n, distance=distance)
+        return self.area_filter(
+            self.ops.noise_reduction_midpoint,
+            mask_side=n,
+            distance=distance,
+            per_channel=per_channel,
+        )
 
     @staticmethod
-    def DCT(image) -> tuple[QImage, np.ndarray]:        
-        f = Filters(image)
-        if not image.isGrayscale():
-            f.img = f.grayscale()
-        
-        w, h, new_image = f._get_default_elements_to_filters()
-        image = f._get_img_pixels(w, h)
-        norm, coeffs = kayn.dct(image, w, h)
-
-        for y in range(h):
-            for x in range(w):
-                new_image.setPixel(x, y, norm[x + y * w])
-        return new_image, coeffs
+    @result_cache.cached
+    def DCT(image) -> tuple[QImage, np.ndarray]:
+        with prof.span("DCT", width=image.width(), height=image.height()):
+            f = Filters(image)
+            if not image.isGrayscale():
+                f.img = f.grayscale()
+
+            with prof.span("get pixels"):
+                gray = f._get_img_pixels()[..., 0]
+            with prof.span("kernel"):
+                coeffs = dct.dct2(gray)
+            return Filters.get_freq_norm(coeffs, image.width(), image.height()), coeffs
 
     @staticmethod
+    @result_cache.cached
     def IDCT(coeffs, width, height) -> QImage:
-        image = QImage(width, height, QImage.Format.Format_RGB32)
-        norm = kayn.idct(coeffs, width, height)
-        for x in range(width):
-            for y in range(height):
-                image.setPixel(x, y, norm[x + y * width])
-        return image
-    
+        with prof.span("IDCT", width=width, height=height):
+            coeffs = np.reshape(coeffs, (height, width))
+            with prof.span("kernel"):
+                pixels = dct.to_pixels(dct.idct2(coeffs))
+            with prof.span("QImage build"):
+                return img_adpt.gray_to_image(pixels)
+
     @staticmethod
     def lowpass(coeffs, width, height, radius) -> tuple[QImage, np.ndarray]:
-        norm, new_coeffs = kayn.freq_lowpass(coeffs, width, height, radius)
-        new_image = Filters.IDCT(new_coeffs, width, height)
-        for x in range(width):
-            for y in range(height):
-                new_image.setPixel(x, y, norm[x + y *  width])
-        return new_image, new_coeffs
-    
+        with prof.span("lowpass", width=width, height=height, radius=radius):
+            coeffs = np.reshape(coeffs, (height, width))
+            with prof.span("kernel"):
+                new_coeffs = np.where(dct.radial_mask(height, width, radius), coeffs, 0)
+                new_coeffs = new_coeffs.astype(np.float32)
+            return Filters.get_freq_norm(new_coeffs, width, height), new_coeffs
+
     @staticmethod
     def highpass(coeffs, width, height, radius) -> tuple[QImage, np.ndarray]:
-        norm, new_coeffs = kayn.freq_highpass(coeffs, width, height, radius)
-        new_image = Filters.IDCT(new_coeffs, width, height)
-        for x in range(width):
-            for y in range(height):
-                new_image.setPixel(x, y, norm[x + y *  width])
-        return new_image, new_coeffs
-    
+        with prof.span("highpass", width=width, height=height, radius=radius):
+            coeffs = np.reshape(coeffs, (height, width))
+            with prof.span("kernel"):
+                new_coeffs = np.where(dct.radial_mask(height, width, radius), 0, coeffs)
+                new_coeffs = new_coeffs.astype(np.float32)
+            return Filters.get_freq_norm(new_coeffs, width, height), new_coeffs
+
     @staticmethod
-    def get_freq_norm(coeffs, width, height) -> QImage:
-        norm = kayn.freq_normalize(coeffs)
-        new_image = QImage(width, height, QImage.Format.Format_RGB32)
-        for x in range(width):
-            for y in range(height):
-                new_image.setPixel(x, y, norm[x + y *  width])
-        return new_image
+    def block_DCT(image, block=8) -> tuple[QImage, dct.BlockSpectrum]:
+        with prof.span("block_DCT", width=image.width(), height=image.height(), block=block):
+            f = Filters(image)
+            if not image.isGrayscale():
+                f.img = f.grayscale()
+
+            with prof.span("get pixels"):
+                gray = f._get_img_pixels()[..., 0]
+            with prof.span("kernel"):
+                spectrum = dct.BlockSpectrum.from_pixels(gray, block)
+            return Filters.get_block_freq_norm(spectrum), spectrum
 
+    @staticmethod
+    def block_IDCT(spectrum: dct.BlockSpectrum) -> QImage:
+        with prof.span("block_IDCT", width=spectrum.width, height=spectrum.height):
+            with prof.span("kernel"):
+                pixels = spectrum.inverse()
+            with prof.span("QImage build"):
+                return img_adpt.gray_to_image(pixels)
 
+    @staticmethod
+    def get_block_freq_norm(spectrum: dct.BlockSpectrum) -> QImage:
+        h, w = spectrum.coefficients.shape
+        return Filters.get_freq_norm(spectrum.coefficients, w, h)
+
+    @staticmethod
+    def get_freq_norm(coeffs, width, height) -> QImage:
+        with prof.span("spectrum"):
+            coeffs = np.reshape(coeffs, (height, width))
+            pixels = dct.spectrum_pixels(coeffs)
+        with prof.span("QImage build"):
+            return img_adpt.gray_to_image(pixels)
+
+    # Otsu builds the gray histogram and applies the threshold in one call.
+    # Multilevel Otsu has no libkayn version and always runs on NumPy.
     def otsu_binarize(self) -> QImage:
-        w, h = self.img.width(), self.img.height()
-        image = self._get_img_pixels(w, h)
-        threshold = kayn.otsu_threshold(image, w, h)
-        return self._default_filter(kayn.binarize, threshold=threshold)
+        return self._default_filter(self.ops.otsu_binarize)
 
     def otsu_limiarize(self) -> QImage:
-        w, h = self.img.width(), self.img.height()
-        image = self._get_img_pixels(w, h)
-        threshold = kayn.otsu_threshold(image, w, h)
-        return self._default_filter(kayn.limiarize, threshold=threshold)
+        return self._default_filter(self.ops.otsu_limiarize)
 
-    def hsl_equalize(self) -> QImage:
-        return self._default_filter(kayn.equalize_hsl)
+    def otsu_multilevel(self, classes: int = 3) -> QImage:
+        return self._default_filter(np_backend.otsu_multilevel, classes=classes)
 
-    def erosion(self) -> QImage:
-        w, h = self.img.width(), self.img.height()
-        return self._default_filter(kayn.erosion, width=w, height=h)
-    
-    def dilation(self) -> QImage:
-        w, h = self.img.width(), self.img.height()
-        return self._default_filter(kayn.dilation, width=w, height=h)
+    # Local thresholds for uneven lighting, from integral images: the cost
+    # per pixel does not depend on the window `size`.
+    @result_cache.cached
+    def niblack_binarize(self, size: int = 15, k: float = -0.2) -> QImage:
+        return self._default_filter(np_backend.niblack_binarize, size=size, k=k)
+
+    @result_cache.cached
+    def sauvola_binarize(self, size: int = 15, k: float = 0.5) -> QImage:
+        return self._default_filter(np_backend.sauvola_binarize, size=size, k=k)
+
+    @result_cache.cached
+    def bradley_binarize(self, size: int = 15, t: float = 15) -> QImage:
+        return self._default_filter(np_backend.bradley_binarize, size=size, t=t)
+
+    def hsl_equalize(self) -> QImage:
+        return self._default_filter(self.ops.equalize_hsl)
+
+    # Morphology works per channel on gray levels, so binary images behave
+    # as in binary morphology. `size` is a side or a (height, width) pair and
+    # `shape` is "rect" or "cross". libkayn has no gray morphology, so these
+    # run on NumPy whatever the backend.
+    @result_cache.cached
+    def erosion(self, size=3, shape: str = "cross") -> QImage:
+        return self._default_filter(np_backend.erosion, size=size, shape=shape)
+
+    @result_cache.cached
+    def dilation(self, size=3, shape: str = "cross") -> QImage:
+        return self._default_filter(np_backend.dilation, size=size, shape=shape)
+
+    @result_cache.cached
+    def opening(self, size=3, shape: str = "cross") -> QImage:
+        return self._default_filter(np_backend.opening, size=size, shape=shape)
+
+    @result_cache.cached
+    def closing(self, size=3, shape: str = "cross") -> QImage:
+        return self._default_filter(np_backend.closing, size=size, shape=shape)
+
+    @result_cache.cached
+    def top_hat(self, size=3, shape: str = "cross") -> QImage:
+        return self._default_filter(np_backend.top_hat, size=size, shape=shape)
     
+    @result_cache.cached
+    def run_pipeline(self, pipeline: pipelines.Pipeline) -> QImage:
+        return pipeline.run(self.img)
+
+    @result_cache.cached
     def zhang_suen_thinning(self) -> QImage:
-        w, h = self.img.width(), self.img.height()
-        return self._default_filter(kayn.zhang_suen_thinning, width=w, height=h)
+        return self._default_filter(self.ops.zhang_suen_thinning)
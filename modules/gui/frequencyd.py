@@ -1,26 +1,25 @@
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QPushButton
 import modules.gui.qt_override as qto
+import modules.image_adapter as img_adpt
+import modules.dct as dct
 from modules.filters import Filters
-from PyQt5.QtWidgets import QMessageBox
 
 
 class FreqDomain:
-    def __init__(self, parent, input_canvas, output_canvas):
+    def __init__(self, parent, input_canvas, output_canvas, load_input: callable):
         self.parent = parent
         self.window = qto.QChildWindow(self.parent, "Frequency Domain", 400, 400)
         self.input_canvas = input_canvas
         self.output_canvas = output_canvas
+        self.load_input = load_input  # Puts an opened image on the input canvas.
+        self.block = 0  # 0 transforms the whole image, else the block side.
+        self.inverse = None
         self.show_freq_domain_window()
 
     def show_freq_domain_window(self):
         img = qto.get_image_from_canvas(self.input_canvas)
         self.w, self.h = img.width(), img.height()
-        if self.w != self.h:
-            QMessageBox.warning(
-                self.parent, "Frequency Domain", "Image must be square."
-            )
-            return
 
         self.add_submenus()
         self.grid = qto.QGrid(self.window)
@@ -40,8 +39,25 @@ class FreqDomain:
         self.grid.setColumnStretch(1, 1)
         qto.display_grid_on_window(self.window, self.grid)
 
-        norm, self.freq = Filters.DCT(img)
+        self.transform(img)
+        qto.put_image_on_canvas(self.s_canvas, img)
+
+    def transform(self, img):
+        if self.block:
+            norm, self.freq = Filters.block_DCT(img, self.block)
+        else:
+            norm, self.freq = Filters.DCT(img)
         qto.put_image_on_canvas(self.f_canvas, norm)
+
+    def show_blocks(self):
+        qto.put_image_on_canvas(self.f_canvas, Filters.get_block_freq_norm(self.freq))
+        qto.put_image_on_canvas(self.s_canvas, Filters.block_IDCT(self.freq))
+
+    def set_block(self, block: int):
+        self.block = block
+        self.quantize_action.setEnabled(block > 0)
+        img = qto.get_image_from_canvas(self.input_canvas)
+        self.transform(img)
         qto.put_image_on_canvas(self.s_canvas, img)
 
     def open_image(self):
@@ -49,33 +65,48 @@ class FreqDomain:
         file_name = qto.QDialogs(self.parent).get_open_path()
         if not file_name:
             return
-        img = QPixmap(file_name).toImage()
+        pixmap = QPixmap(file_name)
+        self.load_input(pixmap)
+        img = pixmap.toImage()
         self.w, self.h = img.width(), img.height()
-        if self.w != self.h:
-            QMessageBox.warning(
-                self.parent, "Frequency Domain", "Image must be square."
-            )
-            return
-        qto.put_image_on_canvas(self.input_canvas, img)
-        norm, self.freq = Filters.DCT(img)
-        qto.put_image_on_canvas(self.f_canvas, norm)
+        self.transform(img)
         qto.put_image_on_canvas(self.s_canvas, img)
 
+    def get_radius(self) -> int:
+        w, h = (self.block, self.block) if self.block else (self.w, self.h)
+        max_radius = int((w**2 + h**2) ** 0.5) + 1
+        return qto.display_int_input_dialog("Radius", 0, max_radius, w // 2)
+
     def lowpass(self):
-        radius = qto.display_int_input_dialog("Radius", 0, self.w, self.w // 2)
-        if radius > 0:
+        radius = self.get_radius()
+        if radius > 0 and self.block:
+            self.freq.lowpass(radius)
+            self.show_blocks()
+        elif radius > 0:
             norm, self.freq = Filters.lowpass(self.freq, self.w, self.h, radius)
             qto.put_image_on_canvas(self.f_canvas, norm)
             output = Filters.IDCT(self.freq, self.w, self.h)
             qto.put_image_on_canvas(self.s_canvas, output)
 
     def highpass(self):
-        radius = qto.display_int_input_dialog("Radius", 0, self.w, self.w // 2)
+        radius = self.get_radius()
+        if radius < 0:
+            return
+        if self.block:
+            self.freq.highpass(radius)
+            self.show_blocks()
+            return
         norm, self.freq = Filters.highpass(self.freq, self.w, self.h, radius)
         qto.put_image_on_canvas(self.f_canvas, norm)
         output = Filters.IDCT(self.freq, self.w, self.h)
         qto.put_image_on_canvas(self.s_canvas, output)
 
+    def quantize(self):
+        quality = qto.display_int_input_dialog("Quality (1-100)", 1, 100, 50)
+        if quality > 0:
+            self.freq.quantize(quality)
+            self.show_blocks()
+
     def add_noise(self):
         self.f_canvas.mousePressEvent = self.add_noise_to_freq_canvas
         self.add_noise_btn.setEnabled(False)
@@ -92,20 +123,33 @@ class FreqDomain:
 
     def add_noise_to_freq_canvas(self, event):
         x, y = event.x(), event.y()
-        if x < 0 or y < 0 or x >= self.w or y >= self.h:
+        coeffs = self.freq.coefficients if self.block else self.freq
+        if x < 0 or y < 0 or x >= coeffs.shape[1] or y >= coeffs.shape[0]:
             return
-        max_ = max(self.freq)
+        if self.block:
+            max_ = coeffs.max()
+        else:
+            max_ = self.get_incremental_inverse().high
         level = qto.display_int_input_dialog("Level (0-255)", 0, 255, 64)
-        if level != -1:
+        if level != -1 and self.block:
+            self.freq.set_coefficient(x, y, max_ * level / 255)
+            self.show_blocks()
+        elif level != -1:
             ratio = level / 255
-            self.freq[x + y * self.w] = max_ * ratio
+            self.inverse.set_coefficient(x, y, max_ * ratio)
 
-            output = Filters.IDCT(self.freq, self.w, self.h)
+            output = img_adpt.gray_to_image(self.inverse.pixels())
             qto.put_image_on_canvas(self.s_canvas, output)
 
-            norm = Filters.get_freq_norm(self.freq, self.w, self.h)
+            norm = img_adpt.gray_to_image(self.inverse.spectrum)
             qto.put_image_on_canvas(self.f_canvas, norm)
 
+    def get_incremental_inverse(self) -> dct.IncrementalInverse:
+        # Rebuilt whenever a filter replaced the coefficient array.
+        if self.inverse is None or self.inverse.coefficients is not self.freq:
+            self.inverse = dct.IncrementalInverse.from_coefficients(self.freq)
+        return self.inverse
+
     def add_submenus(self):
         menubar = self.window.menuBar()
         menubar.addAction("Open", self.open_image)
@@ -114,6 +158,13 @@ class FreqDomain:
         self.filter_menu = menubar.addMenu("Filter")
         self.filter_menu.addAction("Lowpass", self.lowpass)
         self.filter_menu.addAction("Highpass", self.highpass)
+        self.quantize_action = self.filter_menu.addAction("Quantize", self.quantize)
+        self.quantize_action.setEnabled(False)
+
+        mode_menu = menubar.addMenu("Mode")
+        mode_menu.addAction("Whole image", lambda: self.set_block(0))
+        mode_menu.addAction("8x8 blocks", lambda: self.set_block(8))
+        mode_menu.addAction("16x16 blocks", lambda: self.set_block(16))
 
         self.add_noise_btn = menubar.addAction("Add Noise", self.add_noise)
         self.stop_noise_btn = menubar.addAction("Stop Noise", self.stop_noise)
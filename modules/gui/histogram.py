@@ -1,13 +1,15 @@
-import matplotlib.pyplot as plt
 import numpy as np
 from PyQt5.QtGui import QImage, QPixmap
 from PyQt5.QtWidgets import QLabel
 import modules.gui.qt_override as qto
 from modules.filters import Filters
+import modules.image_adapter as img_adpt
 import os
 
 
 def display_histogram(parent, image) -> None:
+    import matplotlib.pyplot as plt  # Slow to import; only needed here.
+
     hist, bins = calculate_image_histogram(image)
     plt.figure(figsize=(10, 5))
     plt.style.use("ggplot")
@@ -42,8 +44,7 @@ def calculate_image_histogram(image) -> tuple[np.ndarray, np.ndarray]:
 
 
 def get_array_of_pixels_from_image(image: QImage) -> np.ndarray:
-    w, h = image.width(), image.height()
-    pixels = np.array(image.bits().asarray(w * h * 4))[::4]
+    pixels = img_adpt.image_to_array(image)[:, :, 0].ravel()
     return pixels
 
 
@@ -0,0 +1,147 @@
+from PyQt5.QtCore import QEventLoop, QObject, QRunnable, QThreadPool, pyqtSignal
+import modules.image_adapter as img_adpt
+import modules.progress as progress
+
+
+class JobSignals(QObject):
+    # Emitted from worker threads, delivered on the GUI thread.
+    progress = pyqtSignal(int, int)  # job id, percent
+    finished = pyqtSignal(int, object)  # job id, result
+    failed = pyqtSignal(int, str)  # job id, message
+    cancelled = pyqtSignal(int)  # job id
+
+
+class Job(QRunnable):
+    def __init__(self, job_id: int, task: callable, signals: JobSignals, cancellable: bool = True):
+        super().__init__()
+        self.setAutoDelete(False)  # JobRunner keeps it until it reports back.
+        self.job_id = job_id
+        self.cancellable = cancellable
+        self.task = task
+        self.signals = signals
+        self.percent = -1
+        self.token = progress.Token(on_progress=self.on_progress)
+
+    def on_progress(self, fraction: float) -> None:
+        percent = int(fraction * 100)
+        if percent != self.percent:  # Kernels report far more often than that.
+            self.percent = percent
+            self.signals.progress.emit(self.job_id, percent)
+
+    def run(self) -> None:
+        try:
+            with progress.tracking(self.token):
+                # Results go on to widgets and other threads: their pixels
+                # must belong to Qt, not to an array only this job holds.
+                result = img_adpt.detach(self.task())
+        except progress.Cancelled:
+            self.signals.cancelled.emit(self.job_id)
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, f"{type(e).__name__}: {e}")
+        else:
+            self.signals.finished.emit(self.job_id, result)
+
+
+class JobRunner(QObject):
+    """
+    Runs filters on a QThreadPool, one current job per lane. Submitting a
+    job cancels the current one of its lane, and results of superseded jobs
+    are dropped, so every lane's output matches its last request. Progress
+    follows the job submitted last.
+
+    Jobs submitted with cancellable=False (saves, which would leave a
+    truncated file) always run to the end: cancelling skips them, and a new
+    job in their lane waits for them to finish first.
+    """
+
+    progress = pyqtSignal(int)
+    busy = pyqtSignal(bool)
+    failed = pyqtSignal(str)
+
+    def __init__(self, parent: QObject = None):
+        super().__init__(parent)
+        self.pool = QThreadPool.globalInstance()
+        self.signals = JobSignals()
+        self.signals.progress.connect(self._on_progress)
+        self.signals.finished.connect(self._on_finished)
+        self.signals.failed.connect(self._on_failed)
+        self.signals.cancelled.connect(self._forget)
+        self.running: dict[int, Job] = {}
+        self.current: dict[str, int] = {}  # lane -> job id
+        self.on_result: dict[str, callable] = {}
+        self.lanes: dict[int, str] = {}  # job id -> lane
+        self.last_id = 0
+
+    def submit(
+        self, task: callable, on_result: callable, lane: str = "output", cancellable: bool = True
+    ) -> None:
+        self.cancel(lane)
+        self.finish(lane)  # Only jobs that cannot be cancelled are left.
+        self.last_id += 1
+        job = Job(self.last_id, task, self.signals, cancellable)
+        self.running[job.job_id] = job
+        self.lanes[job.job_id] = lane
+        self.current[lane], self.on_result[lane] = job.job_id, on_result
+        self.busy.emit(True)
+        self.progress.emit(0)
+        self.pool.start(job)
+
+    def cancel(self, lane: str = None) -> None:
+        """Cancel the current job of `lane`, or of every lane."""
+        lanes = list(self.current) if lane is None else [lane]
+        for lane in lanes:
+            job_id = self.current.get(lane)
+            if job_id is not None and self.running[job_id].cancellable:
+                del self.current[lane]
+                self.running[job_id].token.cancel()
+        if lanes and not self.current:
+            self.busy.emit(False)
+
+    def pending(self, lane: str) -> bool:
+        return lane in self.current
+
+    def finish(self, lane: str) -> None:
+        """
+        Block until the current job of `lane` delivered its result. User input
+        waits meanwhile, so nothing can submit a job replacing this one.
+        """
+        job_id = self.current.get(lane)
+        if job_id is None:
+            return
+        loop = QEventLoop()
+        reported = lambda reporter, *_: loop.quit() if reporter == job_id else None
+        signals = (self.signals.finished, self.signals.failed, self.signals.cancelled)
+        for signal in signals:
+            signal.connect(reported)
+        try:
+            loop.exec_(QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents)
+        finally:
+            for signal in signals:
+                signal.disconnect(reported)
+
+    def wait(self, msecs: int = -1) -> bool:
+        return self.pool.waitForDone(msecs)
+
+    def _forget(self, job_id: int) -> bool:
+        """Drop a job that reported back; True if it was current in its lane."""
+        self.running.pop(job_id, None)
+        lane = self.lanes.pop(job_id)
+        if self.current.get(lane) != job_id:
+            return False
+        del self.current[lane]
+        if not self.current:
+            self.busy.emit(False)
+        return True
+
+    def _on_progress(self, job_id: int, percent: int) -> None:
+        if job_id == self.last_id:
+            self.progress.emit(percent)
+
+    def _on_finished(self, job_id: int, result) -> None:
+        lane = self.lanes.get(job_id)
+        if self._forget(job_id):
+            self.on_result[lane](result)
+
+    def _on_failed(self, job_id: int, message: str) -> None:
+        if self._forget(job_id):
+            self.failed.emit(message)
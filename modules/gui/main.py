@@ -1,14 +1,14 @@
-from PyQt5.QtWidgets import QApplication, QLabel, QMainWindow, QPushButton
+from PyQt5.QtWidgets import QApplication, QFileDialog, QLabel, QMainWindow, QPushButton, QProgressBar
 from PyQt5.QtGui import QIcon, QPixmap, QImage, QFont, QGuiApplication, QMouseEvent
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 
-from modules.filters import Filters
-from modules.gui.color_converter import ColorConverter
 import modules.colors_adapter as c_adpt
 import modules.gui.qt_override as qto
-import modules.gui.frequencyd as freqd
-import modules.gui.histogram as hist
-import modules.gui.laplacian_comparision as lap_cmp
+from modules.gui.job_runner import JobRunner
+
+# Filters, tool windows and their dependencies (NumPy, matplotlib) are
+# imported where they are first used, so the window shows up before they
+# load. `python kayn.pyw --startup-time` measures how long that takes.
 
 
 class MenuAction:
@@ -34,18 +34,40 @@ class MenuAction:
         return self.tooltip
 
 
+class Windowed:
+    """
+    A filter over size x size windows. Previews run on a downsampled image,
+    where the same window would cover a larger area, so they shrink it.
+    """
+
+    def __init__(self, function, size: int):
+        self.function = function  # function(filters, size)
+        self.size = size
+
+    def __call__(self, filters):
+        return self.function(filters, self.size)
+
+    def scaled(self, scale: float) -> callable:
+        size = min(self.size, max(3, int(round(self.size * scale)) | 1))
+        return lambda filters: self.function(filters, size)
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.window_dimensions = (750, 360)
         self.input_canvas: QLabel = QLabel()
         self.output_canvas: QLabel = QLabel()
+        self.jobs = JobRunner(self)
+        self.input_pyramid: tuple = None  # (pixmap cache key, Pyramid)
+        self.history = None  # Created on first use, see get_history.
         self.initUI()
 
     def initUI(self) -> None:
         self.set_window_properties()
         self.display_menubar()
         self.display_main_content()
+        self.display_job_status()
 
     # Main Graphical User Interface
     def set_window_properties(self) -> None:
@@ -90,6 +112,32 @@ class MainWindow(QMainWindow):
 
         qto.display_grid_on_window(self, grid)
 
+    # Feature: Run filters in the background with progress and cancellation
+    def display_job_status(self) -> None:
+        progress_bar = QProgressBar()
+        progress_bar.setMaximumWidth(200)
+        cancel_button = qto.QObjects.button(
+            name="Cancel",
+            func=lambda: self.jobs.cancel(),
+            shortcut="Esc",
+            tooltip="Cancel the running filter",
+        )
+        status_bar = self.statusBar()
+        status_bar.addPermanentWidget(progress_bar)
+        status_bar.addPermanentWidget(cancel_button)
+
+        self.jobs.progress.connect(progress_bar.setValue)
+        self.jobs.busy.connect(progress_bar.setVisible)
+        self.jobs.busy.connect(cancel_button.setVisible)
+        self.jobs.busy.connect(lambda busy: busy and status_bar.clearMessage())
+        self.jobs.failed.connect(lambda message: status_bar.showMessage(message))
+        progress_bar.setVisible(False)
+        cancel_button.setVisible(False)
+
+    def closeEvent(self, event) -> None:
+        self.jobs.cancel()
+        super().closeEvent(event)
+
     # Feature: Display the histogram of the input image
 
     # Feature: Display splitted color channels of the input image
@@ -121,6 +169,8 @@ class MainWindow(QMainWindow):
     def insert_isolated_color_channel_into_canvas(
         self, color: str, canvas: QLabel
     ) -> None:
+        from modules.filters import Filters
+
         f = Filters(img=qto.get_image_from_canvas(self.input_canvas))
         image: QImage = f.split_color_channel(color)
         qto.put_image_on_canvas(canvas, image)
@@ -175,76 +225,171 @@ class MainWindow(QMainWindow):
 
         x, y = event.x(), event.y()
         image = qto.get_image_from_canvas(canvas)
-        pixel_integer = image.pixel(x, y)
+        px, py = x, y
+        if canvas.hasScaledContents():  # A preview stretched over the canvas.
+            px = x * image.width() // max(canvas.width(), 1)
+            py = y * image.height() // max(canvas.height(), 1)
+        pixel_integer = image.pixel(px, py)
         color = c_adpt.get_rgb_from_color_integer(pixel_integer)
         return x, y, color
 
     # fmt: off
     # Feature: Apply filters to the input image.
+    # Every entry returns the operation computing the filter from a Filters
+    # instance, or None when a parameter dialog was cancelled. Dialogs run
+    # here, on the GUI thread; the operation runs in the background and its
+    # result goes to the output.
     def apply_filter_to_input_image(self, filter: str) -> None:
+        from modules.filters import Filters
+
         all_filters = {
             # No parameters
-            "Grayscale": lambda: f.grayscale(),
-            "Equalize": lambda: f.equalize(),
-            "Negative": lambda: f.negative(),
-            "Sobel": lambda: f.sobel(),
-            "Laplacian": lambda: f.laplace(),
-            "Normalize": lambda: f.normalize(),
-            "Laplacian of Gaussian": lambda: f.gaussian_laplacian(),
-            "Colorize from Gray": lambda: f.gray_to_color_scale(),
-            "Noise Reduction Max": lambda: f.noise_reduction_max(),
-            "Noise Reduction Min": lambda: f.noise_reduction_min(),
-            "Noise Reduction Midpoint": lambda: f.noise_reduction_midpoint(),
-            "OTSU Binarize": lambda: f.otsu_binarize(),
-            "OTSU Limiarize": lambda: f.otsu_limiarize(),
-            "HSL Equalize": lambda: f.hsl_equalize(),
-            "Erosion": lambda: f.erosion(),
-            "Dilation": lambda: f.dilation(),
-            "Zhang Suen Thinning": lambda: f.zhang_suen_thinning(),
-
-            "Binarize": lambda: self.try_to_binarize_image(f),
-            "Mean": lambda: self.try_to_apply_mean_filter(f),
-            "Median": lambda: self.try_to_apply_median_filter(f),
-            "Salt and Pepper": lambda: self.try_to_apply_salt_and_pepper_filter(f),
-            "Dynamic Compression": lambda: self.try_to_apply_dynamic_compression_filter(f),
-            "Sobel Magnitudes": lambda: self.display_sobel_magnitudes_filter(f),
-            "Limiarize": lambda: self.try_to_apply_limiarization_filter(f),
-            "Resize": lambda: self.try_to_apply_resize_filter(f),
+            "Grayscale": lambda: Filters.grayscale,
+            "Equalize": lambda: Filters.equalize,
+            "Negative": lambda: Filters.negative,
+            "Sobel": lambda: Filters.sobel,
+            "Laplacian": lambda: Filters.laplace,
+            "Normalize": lambda: Filters.normalize,
+            "Laplacian of Gaussian": lambda: Filters.gaussian_laplacian,
+            "Colorize from Gray": lambda: Filters.gray_to_color_scale,
+            "Noise Reduction Max": lambda: Filters.noise_reduction_max,
+            "Noise Reduction Min": lambda: Filters.noise_reduction_min,
+            "Noise Reduction Midpoint": lambda: Filters.noise_reduction_midpoint,
+            "OTSU Binarize": lambda: Filters.otsu_binarize,
+            "OTSU Limiarize": lambda: Filters.otsu_limiarize,
+            "OTSU Multilevel": self.try_to_apply_otsu_multilevel_filter,
+            "Sauvola Binarize": lambda: self.try_to_apply_local_threshold(Filters.sauvola_binarize, 0.5),
+            "Niblack Binarize": lambda: self.try_to_apply_local_threshold(Filters.niblack_binarize, 0.2, -1),
+            "Bradley Binarize": lambda: self.try_to_apply_local_threshold(Filters.bradley_binarize, 15),
+            "HSL Equalize": lambda: Filters.hsl_equalize,
+            "Zhang Suen Thinning": lambda: Filters.zhang_suen_thinning,
+
+            "Binarize": self.try_to_binarize_image,
+            "Mean": self.try_to_apply_mean_filter,
+            "Median": self.try_to_apply_median_filter,
+            "Salt and Pepper": self.try_to_apply_salt_and_pepper_filter,
+            "Dynamic Compression": self.try_to_apply_dynamic_compression_filter,
+            "Limiarize": self.try_to_apply_limiarization_filter,
+            "Resize": self.try_to_apply_resize_filter,
+            "Erosion": lambda: self.try_to_apply_morphology_filter(Filters.erosion),
+            "Dilation": lambda: self.try_to_apply_morphology_filter(Filters.dilation),
+            "Opening": lambda: self.try_to_apply_morphology_filter(Filters.opening),
+            "Closing": lambda: self.try_to_apply_morphology_filter(Filters.closing),
+            "Top-hat": lambda: self.try_to_apply_morphology_filter(Filters.top_hat),
         }
-        f = Filters(qto.get_image_from_canvas(self.input_canvas))
-        if filter in all_filters:
-            output = all_filters[filter]()
-            self.update_output_canvas(output)
+        image = qto.get_image_from_canvas(self.input_canvas)
+        if filter == "Sobel Magnitudes":
+            f = Filters(image)
+            self.jobs.submit(f.sobel_magnitudes, self.display_sobel_magnitudes)
+        elif filter in all_filters:
+            operation = all_filters[filter]()
+            if operation is not None:
+                self.run_operation(operation, image, preview=filter not in self.FULL_RESOLUTION_ONLY)
     # fmt: on
-    def try_to_apply_mean_filter(self, filtertool: Filters) -> QImage:
+
+    # Feature: Preview filters on a downsampled copy of large images.
+    # The operation first runs on the pyramid level matching the output
+    # canvas and is shown stretched over it; the full-resolution result
+    # follows in the background and is waited for only by Apply and Save.
+    # Windowed filters get windows shrunk by the same factor as the image.
+    # Filters with fixed kernels or topology-dependent results would show
+    # something else on a downsampled image, so they get no preview.
+    FULL_RESOLUTION_ONLY = {
+        "Resize",
+        "Sobel",
+        "Laplacian",
+        "Laplacian of Gaussian",
+        "Noise Reduction Max",
+        "Noise Reduction Min",
+        "Noise Reduction Midpoint",
+        "Zhang Suen Thinning",
+    }
+
+    def run_operation(self, operation: callable, image: QImage, preview: bool) -> None:
+        from modules.filters import Filters
+        import modules.image_adapter as img_adpt
+
+        self.jobs.cancel("preview")
+        full = Filters(image)
+        if preview and self.preview_action.isChecked():
+            level, pixels = self.get_input_pyramid(image).level_for(*self.get_display_size())
+            if level > 0:
+                proxy = Filters(img_adpt.array_to_image(pixels))
+                preview_operation = operation
+                if isinstance(operation, Windowed):
+                    preview_operation = operation.scaled(2.0**-level)
+                size = image.width(), image.height()
+                show = lambda result: self.update_output_preview(result, *size)
+                self.jobs.submit(lambda: preview_operation(proxy), show, lane="preview")
+        self.jobs.submit(lambda: operation(full), self.update_output_canvas)
+
+    def get_input_pyramid(self, image: QImage):
+        import modules.image_adapter as img_adpt
+        import modules.pyramid as pyramid
+
+        key = self.input_canvas.pixmap().cacheKey()
+        if self.input_pyramid is None or self.input_pyramid[0] != key:
+            self.input_pyramid = key, pyramid.Pyramid.of(img_adpt.image_to_array(image))
+        return self.input_pyramid[1]
+
+    def get_display_size(self) -> tuple[int, int]:
+        # The part of the output canvas actually on screen, in device pixels;
+        # the whole screen until the canvas has been shown.
+        screen = QGuiApplication.primaryScreen().availableGeometry()
+        visible = self.output_canvas.visibleRegion().boundingRect()
+        if visible.isEmpty():
+            return screen.width(), screen.height()
+        ratio = self.output_canvas.devicePixelRatioF()
+        width = min(visible.width(), screen.width())
+        height = min(visible.height(), screen.height())
+        return int(width * ratio), int(height * ratio)
+
+    def update_output_preview(self, new_image: QImage, width: int, height: int):
+        if new_image is not None and self.jobs.pending("output"):
+            qto.put_preview_on_canvas(self.output_canvas, new_image, width, height)
+
+    def try_to_apply_mean_filter(self) -> callable:
         size = self.display_mean_and_median_filter_size_chooser()
         size = size + 1 if size % 2 == 0 else size
         if size >= 3:
-            return filtertool.mean(size)
+            return Windowed(lambda f, size: f.mean(size), size)
         return None
 
-    def try_to_apply_median_filter(self, filtertool: Filters) -> QImage:
+    def try_to_apply_median_filter(self) -> callable:
         size = self.display_mean_and_median_filter_size_chooser()
         if size >= 3:
-            return filtertool.median(size)
+            return Windowed(lambda f, size: f.median(size), size)
         return None
 
     def display_mean_and_median_filter_size_chooser(self) -> int:
         return qto.display_int_input_dialog("Filter size", 3, 100, 3)
 
-    def try_to_apply_salt_and_pepper_filter(self, filtertool: Filters) -> QImage:
+    def try_to_apply_morphology_filter(self, operation) -> callable:
+        size, shape = self.display_morphology_parameters()
+        if size >= 1 and shape is not None:
+            return Windowed(lambda f, size: operation(f, size, shape), size)
+        return None
+
+    def display_morphology_parameters(self) -> tuple[int, str]:
+        size = qto.display_int_input_dialog("Structuring element size", 1, 101, 3)
+        if size < 1:
+            return -1, None
+        shape = qto.display_item_input_dialog("Structuring element", ["cross", "rect"])
+        return size, shape
+
+    def try_to_apply_salt_and_pepper_filter(self) -> callable:
         size = self.display_salt_and_pepper_filter_size_chooser()
         if size >= 1:
-            return filtertool.salt_and_pepper(size)
+            return lambda f: f.salt_and_pepper(size)
         return None
 
     def display_salt_and_pepper_filter_size_chooser(self) -> int:
         return qto.display_int_input_dialog("Percentage of noise", 1, 100, 10)
 
-    def try_to_apply_dynamic_compression_filter(self, filtertool: Filters) -> QImage:
+    def try_to_apply_dynamic_compression_filter(self) -> callable:
         c, gama = self.display_dynamic_compression_filter_parameters()
         if c >= 0 and gama >= 0:
-            return filtertool.dynamic_compression(c, gama)
+            return lambda f: f.dynamic_compression(c, gama)
         return None
 
     def display_dynamic_compression_filter_parameters(self) -> tuple[int, int]:
@@ -252,25 +397,43 @@ class MainWindow(QMainWindow):
         gamma = qto.display_float_input_dialog("Gama", 0, 3, 0.8)
         return constant, gamma
 
-    def try_to_apply_limiarization_filter(self, filtertool: Filters) -> QImage:
+    def try_to_apply_limiarization_filter(self) -> callable:
         limiar = self.display_limiarization_filter_parameter()
         if limiar >= 0:
-            return filtertool.limiarize(limiar)
+            return lambda f: f.limiarize(limiar)
         return None
 
-    def try_to_binarize_image(self, filtertool: Filters) -> QImage:
+    def try_to_binarize_image(self) -> callable:
         limiar = self.display_limiarization_filter_parameter()
         if limiar >= 0:
-            return filtertool.binarize(limiar)
+            return lambda f: f.binarize(limiar)
         return None
 
     def display_limiarization_filter_parameter(self) -> int:
         return qto.display_int_input_dialog("Limiar", 0, 255, 127)
 
-    def try_to_apply_resize_filter(self, f: Filters) -> QImage:
+    def try_to_apply_otsu_multilevel_filter(self) -> callable:
+        classes = qto.display_int_input_dialog("Number of classes", 2, 16, 3)
+        if classes >= 2:
+            return lambda f: f.otsu_multilevel(classes)
+        return None
+
+    def try_to_apply_local_threshold(self, operation, default: float, sign: int = 1) -> callable:
+        size, weight = self.display_local_threshold_parameters(default)
+        if size >= 3 and weight >= 0:
+            return Windowed(lambda f, size: operation(f, size, sign * weight), size | 1)
+        return None
+
+    def display_local_threshold_parameters(self, default: float) -> tuple[int, float]:
+        size = qto.display_int_input_dialog("Window size", 3, 501, 15)
+        if size < 3:
+            return -1, -1
+        return size, qto.display_float_input_dialog("Sensitivity", 0, 100, default)
+
+    def try_to_apply_resize_filter(self) -> callable:
         w, h = self.display_resize_filter_parameters()
         if w > 0 and h > 0:
-            return f.resize_nearest_neighbor(w, h)
+            return lambda f: f.resize_nearest_neighbor(w, h)
         return None
 
     def display_resize_filter_parameters(self) -> tuple[int, int]:
@@ -280,8 +443,7 @@ class MainWindow(QMainWindow):
             return w, h
         return -1, -1
 
-    def display_sobel_magnitudes_filter(self, f: Filters) -> None:
-        images = f.sobel_magnitudes()
+    def display_sobel_magnitudes(self, images: list[QImage]) -> None:
         names = ["XY", "X", "Y"]
         w, h = images[0].width(), images[0].height()
 
@@ -309,11 +471,44 @@ class MainWindow(QMainWindow):
             grid.addWidget(canvas, 1, i)
 
     def apply_output_to_input_canvas(self):
+        self.jobs.finish("output")
         pixmap = qto.get_pixmap_from_canvas(self.output_canvas)
+        self.record_in_history(pixmap)
         qto.put_pixmap_on_canvas(self.input_canvas, pixmap)
 
+    # Feature: Undo and redo the changes applied to the input image
+    def get_history(self):
+        if self.history is None:
+            from modules.history import History
+
+            self.history = History()
+        return self.history
+
+    def record_in_history(self, pixmap: QPixmap) -> None:
+        import modules.image_adapter as img_adpt
+
+        history = self.get_history()
+        if history.current is None:  # Nothing opened yet: the placeholder.
+            history.reset(img_adpt.image_to_array(qto.get_image_from_canvas(self.input_canvas)))
+        history.commit(img_adpt.image_to_array(pixmap.toImage()))
+
+    def undo(self) -> None:
+        self.show_history_state(self.get_history().undo())
+
+    def redo(self) -> None:
+        self.show_history_state(self.get_history().redo())
+
+    def show_history_state(self, pixels) -> None:
+        import modules.image_adapter as img_adpt
+
+        if pixels is not None:
+            # History keeps editing `pixels` in place, so the canvas gets a copy.
+            qto.put_image_on_canvas(self.input_canvas, img_adpt.array_to_image(pixels.copy()))
+
     def update_output_canvas(self, new_image: QImage):
+        self.jobs.cancel("preview")
         if new_image is not None:
+            qto.clear_preview_from_canvas(self.output_canvas)
             qto.put_image_on_canvas(self.output_canvas, new_image)
 
     def create_apply_changes_button(self) -> QPushButton:
@@ -342,7 +537,10 @@ class MainWindow(QMainWindow):
     def add_actions_to_file_menu(self, file_menu):
         actions = (
             MenuAction("Open", self.open_image, "CTRL+O", "Open an image"),
+            MenuAction("Open Large Image", self.open_large_image, "CTRL+SHIFT+O", "Open an image tile by tile, from disk"),
             MenuAction("Save", self.save_image, "CTRL+S", "Save the image"),
+            MenuAction("Undo", self.undo, "CTRL+Z", "Undo the last applied change"),
+            MenuAction("Redo", self.redo, "CTRL+SHIFT+Z", "Redo the last undone change"),
             MenuAction("Exit", self.close, "CTRL+Q", "Exit the application"),
         )
         self.add_actions_to_generic_menu(file_menu, actions)
@@ -354,14 +552,41 @@ class MainWindow(QMainWindow):
             MenuAction("Channels", self.display_color_channels),
             MenuAction("Resize", lambda: f("Resize"), "Ctrl+R"),
             MenuAction("Colorize Gray", lambda: f("Colorize from Gray"), "Ctrl+G"),
-            MenuAction("Frequency Domain", lambda: freqd.FreqDomain(self, self.input_canvas, self.output_canvas), "Ctrl+F"),
+            MenuAction("Frequency Domain", self.open_frequency_domain, "Ctrl+F"),
             MenuAction("Sobel Magnitudes", lambda: f("Sobel Magnitudes")),
-            MenuAction("Lap. vs Lap. of the Gaussian", lambda: lap_cmp.Comparison(self, self.input_canvas)),
-            MenuAction("Color Converter", lambda: ColorConverter(self)),
-            MenuAction("Histogram", lambda: hist.display_histogram(self, self.input_canvas), "Ctrl+H"),
+            MenuAction("Lap. vs Lap. of the Gaussian", self.open_laplacian_comparison),
+            MenuAction("Color Converter", self.open_color_converter),
+            MenuAction("Histogram", self.open_histogram, "Ctrl+H"),
         )
         self.add_actions_to_generic_menu(tools_menu, actions)
+        self.preview_action = qto.add_submenu(self, "Fast Preview", None, "Ctrl+Shift+P", "Preview filters on a downsampled image first")
+        self.preview_action.setCheckable(True)
+        self.preview_action.setChecked(True)
+        tools_menu.addAction(self.preview_action)
+
+    # fmt: on
+    # Tool windows
+    def open_frequency_domain(self):
+        import modules.gui.frequencyd as freqd
+
+        freqd.FreqDomain(self, self.input_canvas, self.output_canvas, self.load_input_image)
+
+    def open_laplacian_comparison(self):
+        import modules.gui.laplacian_comparision as lap_cmp
+
+        lap_cmp.Comparison(self, self.input_canvas)
+
+    def open_color_converter(self):
+        from modules.gui.color_converter import ColorConverter
+
+        ColorConverter(self)
+
+    def open_histogram(self):
+        import modules.gui.histogram as hist
 
+        hist.display_histogram(self, self.input_canvas)
+
+    # fmt: off
     def add_actions_to_filters_menu(self, filters_menu):
         f = lambda filter: self.apply_filter_to_input_image(filter)
         filters = (
@@ -373,6 +598,10 @@ class MainWindow(QMainWindow):
             MenuAction("Limiarize", lambda: f("Limiarize"), "F6"),
             MenuAction("OTSU Binarize", lambda: f("OTSU Binarize"), "F7"),
             MenuAction("OTSU Limiarize", lambda: f("OTSU Limiarize"), "F8"),
+            MenuAction("OTSU Multilevel", lambda: f("OTSU Multilevel"), "Ctrl+F9"),
+            MenuAction("Sauvola Binarize", lambda: f("Sauvola Binarize"), "Ctrl+F10"),
+            MenuAction("Niblack Binarize", lambda: f("Niblack Binarize"), "Ctrl+F11"),
+            MenuAction("Bradley Binarize", lambda: f("Bradley Binarize"), "Ctrl+F12"),
             MenuAction("Dyn. Compress.", lambda: f("Dynamic Compression"), "F9"),
             MenuAction("Noise Reduction Max", lambda: f("Noise Reduction Max"), "F10"),
             MenuAction("Noise Reduction Min", lambda: f("Noise Reduction Min"), "F11"),
@@ -382,6 +611,9 @@ class MainWindow(QMainWindow):
             MenuAction("Erosion", lambda: f("Erosion"), "Ctrl+F3"),
             MenuAction("Dilation", lambda: f("Dilation"), "Ctrl+F4"),
             MenuAction("Zhang Suen Thinning", lambda: f("Zhang Suen Thinning"), "Ctrl+F5"),
+            MenuAction("Opening", lambda: f("Opening"), "Ctrl+F6"),
+            MenuAction("Closing", lambda: f("Closing"), "Ctrl+F7"),
+            MenuAction("Top-hat", lambda: f("Top-hat"), "Ctrl+F8"),
         )
         self.add_actions_to_generic_menu(filters_menu, filters)
 
@@ -407,19 +639,57 @@ class MainWindow(QMainWindow):
     def open_image(self):
         filename = qto.QDialogs().get_open_path()
         if filename:
-            pixmap = QPixmap(filename)
-            qto.put_pixmap_on_canvas(self.input_canvas, pixmap)
+            self.load_input_image(QPixmap(filename))
+
+    def load_input_image(self, pixmap: QPixmap) -> None:
+        """Show a newly opened image on the input canvas and restart its history."""
+        import modules.image_adapter as img_adpt
+
+        qto.put_pixmap_on_canvas(self.input_canvas, pixmap)
+        self.get_history().reset(img_adpt.image_to_array(pixmap.toImage()))
+
+    # Feature: View and filter images larger than memory, see modules/tiled.py
+    def open_large_image(self):
+        filename, _ = QFileDialog.getOpenFileName(
+            self, "Open Large Image", "", "Images (*.bmp *.ppm *.pgm *.npy *.tif *.tiff *.jpg *.png)"
+        )
+        if filename:
+            import modules.tiled as tiled
+            from modules.gui.tiled_view import TiledViewer
+
+            show = lambda image: TiledViewer(self, image, filename)
+            self.jobs.submit(lambda: tiled.TiledImage.open(filename), show, lane="open large")
 
     def save_image(self):
+        self.jobs.finish("output")
         filename = qto.QDialogs().get_save_path()
         if filename:
             qto.get_pixmap_from_canvas(self.input_canvas).save(filename)
 
 
-def main():
+def main(started: float = None):
+    """
+    `started` is the perf_counter() value when the program began. With
+    `--startup-time[=budget]` the window quits once it is painted, after
+    printing how long startup took; it exits with 1 when over `budget`
+    seconds, so scripts can catch slow starts.
+    """
     from sys import argv, exit
+    import time
 
-    app = QApplication(argv)
+    started = time.perf_counter() if started is None else started
+    timing = next((a for a in argv[1:] if a.startswith("--startup-time")), None)
+    app = QApplication([a for a in argv if a != timing])
     window = MainWindow()
     window.show()
+    if timing is not None:
+        budget = float(timing.split("=", 1)[1]) if "=" in timing else None
+        shown = time.perf_counter() - started
+
+        def report():
+            painted = time.perf_counter() - started
+            print(f"Startup: window shown after {shown:.3f} s, painted after {painted:.3f} s")
+            app.exit(1 if budget is not None and painted > budget else 0)
+
+        QTimer.singleShot(0, report)  # Runs once pending paint events are done.
     exit(app.exec())
@@ -7,8 +7,9 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QInputDialog,
     QAction,
+    QWIDGETSIZE_MAX,
 )
-from PyQt5.QtGui import QPixmap, QImage, QColor, QFont
+from PyQt5.QtGui import QPixmap, QImage, QColor, QFont, QLinearGradient, QPainter
 from PyQt5.QtCore import Qt
 
 
@@ -36,13 +37,21 @@ class QObjects:
 
     @staticmethod
     def _fill_rgb_gradient(image: QImage, width: int, height: int) -> None:
-        color = QColor()
-        x_ratio = 360 / width  # 360º of the color spectrum (HSL representation)
-        bright_ratio = 255 / height
-        for x in range(width):
-            for y in range(height):
-                color.setHsl(int(x * x_ratio), 255, int((height - y) * bright_ratio))
-                image.setPixel(x, y, color.rgb())
+        # Hue along x (360º of the HSL spectrum), lightness from white at the
+        # top to black at the bottom. At full saturation HSL is piecewise
+        # linear in RGB, so two linear gradients paint it exactly.
+        painter = QPainter(image)
+        hues = QLinearGradient(0, 0, width, 0)
+        for i, color in enumerate((Qt.red, Qt.yellow, Qt.green, Qt.cyan, Qt.blue, Qt.magenta, Qt.red)):
+            hues.setColorAt(i / 6, QColor(color))
+        painter.fillRect(0, 0, width, height, hues)
+        lightness = QLinearGradient(0, 0, 0, height)
+        lightness.setColorAt(0, QColor(255, 255, 255, 255))
+        lightness.setColorAt(0.5, QColor(255, 255, 255, 0))
+        lightness.setColorAt(0.5, QColor(0, 0, 0, 0))
+        lightness.setColorAt(1, QColor(0, 0, 0, 255))
+        painter.fillRect(0, 0, width, height, lightness)
+        painter.end()
 
     @staticmethod
     def label(text: str) -> QLabel:
@@ -123,6 +132,20 @@ def put_image_on_canvas(canvas: QLabel, image: QImage) -> None:
     canvas.setPixmap(QPixmap.fromImage(image))
 
 
+def put_preview_on_canvas(canvas: QLabel, image: QImage, width: int, height: int) -> None:
+    # The label stretches the small image while painting, so the preview
+    # takes the place of the full image without scaling it up in memory.
+    canvas.setScaledContents(True)
+    canvas.setFixedSize(width, height)
+    put_image_on_canvas(canvas, image)
+
+
+def clear_preview_from_canvas(canvas: QLabel) -> None:
+    canvas.setScaledContents(False)
+    canvas.setMinimumSize(0, 0)
+    canvas.setMaximumSize(QWIDGETSIZE_MAX, QWIDGETSIZE_MAX)
+
+
 def display_int_input_dialog(
     title: str, low: int, high: int, default: int = None
 ) -> int:
@@ -167,6 +190,21 @@ def display_float_input_dialog(
     return -1
 
 
+def display_item_input_dialog(title: str, items: list, default: int = 0) -> str:
+    dialog = QInputDialog()
+    dialog.setWindowTitle(title)
+    dialog.setLabelText("Choose an option:")
+    dialog.setComboBoxItems(items)
+    dialog.setTextValue(items[default])
+
+    dialog.setCancelButtonText("Cancel")
+    dialog.setOkButtonText("Ok")
+    dialog.exec_()
+    if dialog.result() == QInputDialog.DialogCode.Accepted:
+        return dialog.textValue()
+    return None
+
+
 def create_label_and_canvas(name: str = "Canvas", xscale: int = 0, yscale: int = 0):
     label = QObjects.label(name)
     label.setFont(QFont("Monospace", 16))
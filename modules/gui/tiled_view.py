@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtWidgets import QFileDialog, QScrollArea, QWidget
+import modules.gui.qt_override as qto
+import modules.image_adapter as img_adpt
+import modules.tiled as tiled
+from modules.pipeline import Pipeline
+
+# Viewer for TiledImages. The canvas paints only the tiles that intersect the
+# exposed area, at the zoom level it shows, and keeps the last CACHED_TILES
+# of them as QImages; everything else stays on disk.
+
+CACHED_TILES = 64
+MAX_LEVEL = 8
+
+
+class TiledCanvas(QWidget):
+    def __init__(self, image: tiled.TiledImage, level: int = 0):
+        super().__init__()
+        self.tiles: OrderedDict = OrderedDict()  # (level, tx, ty) -> QImage
+        self.set_image(image, level)
+
+    def set_image(self, image: tiled.TiledImage, level: int = None) -> None:
+        self.image = image
+        self.tiles.clear()
+        self.set_level(self.level if level is None else level)
+
+    def set_level(self, level: int) -> None:
+        self.level = max(0, min(level, MAX_LEVEL))
+        self.setFixedSize(*self.image.level_size(self.level))
+        self.update()
+
+    def get_tile(self, tx: int, ty: int) -> QImage:
+        key = (self.level, tx, ty)
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+        else:
+            self.tiles[key] = img_adpt.array_to_image(self.image.tile(tx, ty, self.level))
+            if len(self.tiles) > CACHED_TILES:
+                self.tiles.popitem(last=False)
+        return self.tiles[key]
+
+    def paintEvent(self, event) -> None:
+        rect = event.rect()
+        across, down = self.image.tile_count(self.level)
+        tx0, tx1 = rect.left() // tiled.TILE, min(rect.right() // tiled.TILE + 1, across)
+        ty0, ty1 = rect.top() // tiled.TILE, min(rect.bottom() // tiled.TILE + 1, down)
+        painter = QPainter(self)
+        for ty in range(ty0, ty1):
+            for tx in range(tx0, tx1):
+                painter.drawImage(tx * tiled.TILE, ty * tiled.TILE, self.get_tile(tx, ty))
+        painter.end()
+
+
+class TiledViewer:
+    def __init__(self, parent, image: tiled.TiledImage, title: str = "Large Image"):
+        self.parent = parent
+        self.window = qto.QChildWindow(parent, title, 900, 700)
+        self.jobs = parent.jobs
+        # Own lanes, so viewers and the open action never cancel each other.
+        self.lane = f"tiled {id(self)}"
+        self.save_lane = f"{self.lane} save"
+        # Start zoomed out far enough for the whole image to fit the window.
+        level = 0
+        while level < MAX_LEVEL and max(image.level_size(level)) > 900:
+            level += 1
+        self.canvas = TiledCanvas(image, level)
+        self.scroll = QScrollArea()
+        self.scroll.setWidget(self.canvas)
+        self.scroll.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.scroll.wheelEvent = self.wheel
+        self.add_submenus()
+        self.window.setCentralWidget(self.scroll)
+        self.window.show()
+
+    def add_submenus(self) -> None:
+        menubar = self.window.menuBar()
+        file_menu = menubar.addMenu("File")
+        file_menu.addAction(qto.add_submenu(self.window, "Save", self.save, "Ctrl+S"))
+
+        view = menubar.addMenu("View")
+        view.addAction(qto.add_submenu(self.window, "Zoom In", lambda: self.zoom(-1), "Ctrl++"))
+        view.addAction(qto.add_submenu(self.window, "Zoom Out", lambda: self.zoom(1), "Ctrl+-"))
+
+        # fmt: off
+        filters = menubar.addMenu("Filters")
+        operations = (
+            ("Grayscale", lambda: Pipeline().grayscale()),
+            ("Normalize", lambda: Pipeline().normalize()),
+            ("Equalize", lambda: Pipeline().equalize()),
+            ("Negative", lambda: Pipeline().negative()),
+            ("Binarize", lambda: self.with_limiar(Pipeline().binarize)),
+            ("Limiarize", lambda: self.with_limiar(Pipeline().limiarize)),
+            ("Mean", lambda: self.with_size(Pipeline().mean)),
+            ("Median", lambda: self.with_size(Pipeline().median)),
+            ("Laplacian", lambda: Pipeline().laplace()),
+            ("Laplacian of Gaussian", lambda: Pipeline().gaussian_laplacian()),
+            ("Erosion", lambda: self.with_size(Pipeline().erosion)),
+            ("Dilation", lambda: self.with_size(Pipeline().dilation)),
+            ("Opening", lambda: self.with_size(Pipeline().opening)),
+            ("Closing", lambda: self.with_size(Pipeline().closing)),
+        )
+        # fmt: on
+        for name, pipeline in operations:
+            action = lambda pipeline=pipeline: self.apply(pipeline())
+            filters.addAction(qto.add_submenu(self.window, name, action))
+
+    def with_limiar(self, step: callable):
+        limiar = qto.display_int_input_dialog("Limiar", 0, 255, 127)
+        return step(limiar) if limiar >= 0 else None
+
+    def with_size(self, step: callable):
+        size = qto.display_int_input_dialog("Filter size", 3, 101, 3)
+        return step(size | 1) if size >= 3 else None
+
+    def apply(self, pipeline: Pipeline) -> None:
+        if pipeline is not None:
+            image = self.canvas.image
+            self.jobs.submit(lambda: image.apply(pipeline), self.canvas.set_image, lane=self.lane)
+
+    def zoom(self, steps: int) -> None:
+        self.canvas.set_level(self.canvas.level + steps)
+
+    def wheel(self, event) -> None:
+        if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            self.zoom(-1 if event.angleDelta().y() > 0 else 1)
+        else:
+            QScrollArea.wheelEvent(self.scroll, event)
+
+    def save(self) -> None:
+        self.jobs.finish(self.lane)
+        filename, _ = QFileDialog.getSaveFileName(
+            self.window, "Save Image", "img.npy", "NumPy Arrays (*.npy);;Image Files (*.png *.jpg *.bmp *.tif)"
+        )
+        if filename:
+            image = self.canvas.image
+            save = lambda: image.save(filename)
+            self.jobs.submit(save, lambda _: None, lane=self.save_lane, cancellable=False)
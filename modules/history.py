@@ -0,0 +1,181 @@
+from dataclasses import dataclass, field
+import os
+import tempfile
+import zlib
+import numpy as np
+
+# Undo/redo history of an RGBA image that stores changes, not copies. A
+# step keeps only the tiles that differ between two states, the old and new
+# version of each, zlib compressed at its fastest level. Undoing or redoing
+# a step writes those tiles back, so it costs time in proportion to the
+# area that changed. Steps that change the image size keep both images.
+#
+# Payloads live in memory up to `budget` bytes; beyond that the oldest are
+# moved to an anonymous temporary file and read back when needed.
+
+TILE = 256
+# Memory for compressed steps, in MiB, before spilling to disk.
+DEFAULT_BUDGET_MB = int(os.environ.get("KAYN_HISTORY_MB", 256))
+
+
+@dataclass
+class _Store:
+    """Compressed payloads, in memory or spilled to a temporary file."""
+
+    budget: int
+    memory: dict = field(default_factory=dict)  # id -> bytes
+    disk: dict = field(default_factory=dict)  # id -> (offset, length)
+    size: int = 0
+    spilled: int = 0
+    last_id: int = 0
+    file: object = None
+
+    def put(self, data: bytes) -> int:
+        self.last_id += 1
+        self.memory[self.last_id] = data
+        self.size += len(data)
+        return self.last_id
+
+    def get(self, key: int) -> bytes:
+        if key in self.memory:
+            return self.memory[key]
+        offset, length = self.disk[key]
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def drop(self, key: int) -> None:
+        data = self.memory.pop(key, None)
+        if data is not None:
+            self.size -= len(data)
+        self.disk.pop(key, None)  # The file is append only; clear() frees it.
+
+    def spill(self) -> None:
+        """Move the oldest payloads to disk until memory fits the budget."""
+        for key in sorted(self.memory):
+            if self.size <= self.budget:
+                break
+            if self.file is None:
+                self.file = tempfile.TemporaryFile(prefix="kayn-history-")
+            data = self.memory.pop(key)
+            self.file.seek(0, os.SEEK_END)
+            self.disk[key] = self.file.tell(), len(data)
+            self.file.write(data)
+            self.size -= len(data)
+            self.spilled += len(data)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.disk.clear()
+        self.size = self.spilled = 0
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+@dataclass
+class _Step:
+    tiles: list  # (y, x) tile origins; None when the whole image changed
+    before: int  # payload ids
+    after: int
+    shape_before: tuple
+    shape_after: tuple
+
+
+def changed_tiles(a: np.ndarray, b: np.ndarray, tile: int = TILE) -> list[tuple[int, int]]:
+    """Origins of the tile x tile blocks where two same-shape images differ."""
+    h, w = a.shape[:2]
+    # One 32-bit comparison per RGBA pixel.
+    as_words = lambda pixels: np.ascontiguousarray(pixels).view(np.uint32)[..., 0]
+    changed = as_words(a) != as_words(b)
+    ty, tx = -(-h // tile), -(-w // tile)
+    padded = np.zeros((ty * tile, tx * tile), dtype=bool)
+    padded[:h, :w] = changed
+    blocks = padded.reshape(ty, tile, tx, tile).any(axis=(1, 3))
+    return [(y * tile, x * tile) for y, x in zip(*np.nonzero(blocks))]
+
+
+class History:
+    def __init__(self, budget: int = DEFAULT_BUDGET_MB << 20, tile: int = TILE):
+        self.tile = tile
+        self.store = _Store(budget)
+        self.undo_steps: list[_Step] = []
+        self.redo_steps: list[_Step] = []
+        self.current: np.ndarray = None
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self.undo_steps)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self.redo_steps)
+
+    def reset(self, pixels: np.ndarray) -> None:
+        """Start over from `pixels`, e.g. after opening an image."""
+        self.store.clear()
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+        self.current = np.array(pixels, dtype=np.uint8)
+
+    def commit(self, pixels: np.ndarray) -> bool:
+        """Record `pixels` as the new state; False when nothing changed."""
+        pixels = np.array(pixels, dtype=np.uint8)
+        if self.current is None:
+            self.reset(pixels)
+            return False
+        if pixels.shape == self.current.shape:
+            tiles = changed_tiles(self.current, pixels, self.tile)
+            if not tiles:
+                return False
+            before = self._pack(self.current, tiles)
+            after = self._pack(pixels, tiles)
+        else:
+            tiles = None
+            before = zlib.compress(self.current.tobytes(), 1)
+            after = zlib.compress(pixels.tobytes(), 1)
+
+        for step in self.redo_steps:  # A new branch replaces the undone steps.
+            self.store.drop(step.before)
+            self.store.drop(step.after)
+        self.redo_steps.clear()
+        step = _Step(tiles, self.store.put(before), self.store.put(after), self.current.shape, pixels.shape)
+        self.undo_steps.append(step)
+        self.current = pixels
+        self.store.spill()
+        return True
+
+    def undo(self) -> np.ndarray:
+        """Go one step back; returns the current state (None if no step)."""
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        self._restore(step.tiles, step.before, step.shape_before)
+        self.redo_steps.append(step)
+        return self.current
+
+    def redo(self) -> np.ndarray:
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        self._restore(step.tiles, step.after, step.shape_after)
+        self.undo_steps.append(step)
+        return self.current
+
+    def _tile_slices(self, y: int, x: int):
+        return slice(y, y + self.tile), slice(x, x + self.tile)
+
+    def _pack(self, pixels: np.ndarray, tiles: list) -> bytes:
+        chunks = [pixels[self._tile_slices(y, x)].tobytes() for y, x in tiles]
+        return zlib.compress(b"".join(chunks), 1)
+
+    def _restore(self, tiles: list, payload: int, shape: tuple) -> None:
+        data = zlib.decompress(self.store.get(payload))
+        if tiles is None:
+            self.current = np.frombuffer(data, dtype=np.uint8).reshape(shape).copy()
+            return
+        offset = 0
+        for y, x in tiles:
+            target = self.current[self._tile_slices(y, x)]
+            size = target.size
+            target[...] = np.frombuffer(data, np.uint8, size, offset).reshape(target.shape)
+            offset += size
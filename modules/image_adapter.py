@@ -0,0 +1,118 @@
+import ctypes
+import numpy as np
+from PyQt5 import sip
+from PyQt5.QtGui import QImage
+
+PIXEL_FORMAT = QImage.Format.Format_RGBA8888
+
+# array_to_image, gray_to_image and hex_to_image wrap NumPy memory that Qt
+# does not own: PyQt5 cannot give QImage a cleanup function, so the array
+# is kept alive by the Python wrapper of the returned QImage, and only by
+# it. Copies made on the C++ side share the pixels without that reference:
+# QImage(image), QPixmap.fromImage(image) and QImages queued across threads
+# read freed memory, and crash, once the wrapper is collected. Such images
+# stay inside the code that made them; wherever one escapes (job results,
+# cache entries), pass it through detach() first.
+
+
+def normalize_format(image: QImage) -> QImage:
+    """
+    Return `image` in RGBA8888 (bytes laid out as R, G, B, A).
+    Images already in that format are returned as they are, without copying.
+    """
+    if image.format() == PIXEL_FORMAT:
+        return image
+    return image.convertToFormat(PIXEL_FORMAT)
+
+
+def image_to_array(image: QImage) -> np.ndarray:
+    """
+    Read-only (height, width, 4) RGBA view over the pixels of `image`.
+    The view shares memory with the QImage and keeps it alive, so no pixel
+    is copied unless the image has to be converted to RGBA8888 first.
+    """
+    image = normalize_format(image)
+    w, h, stride = image.width(), image.height(), image.bytesPerLine()
+    buffer = (ctypes.c_uint8 * (stride * h)).from_address(int(image.constBits()))
+    buffer._image = image  # The buffer owns the QImage while the view lives.
+
+    rows = np.frombuffer(buffer, dtype=np.uint8).reshape(h, stride)
+    pixels = rows[:, : w * 4].reshape(h, w, 4)
+    pixels.flags.writeable = False
+    return pixels
+
+
+def array_to_image(pixels: np.ndarray) -> QImage:
+    """
+    Wrap a (height, width, 4) RGBA uint8 array into a QImage without copying.
+    The array is stored on the returned image so it outlives the QImage.
+
+    WARNING: only this Python object keeps the pixels alive. Do not let Qt
+    copy it, e.g. QImage(image), without keeping it; call detach() instead.
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    if pixels.strides[1:] != (4, 1):
+        pixels = np.ascontiguousarray(pixels)
+    h, w = pixels.shape[:2]
+    data = sip.voidptr(pixels.ctypes.data)
+    image = QImage(data, w, h, pixels.strides[0], PIXEL_FORMAT)
+    image._pixels = pixels
+    return image
+
+
+def gray_to_image(gray: np.ndarray) -> QImage:
+    """
+    Wrap a (height, width) uint8 array into a Grayscale8 QImage without copying.
+    WARNING: the pixels live as long as this Python object; see array_to_image.
+    """
+    gray = np.asarray(gray, dtype=np.uint8)
+    if gray.strides[1:] != (1,):
+        gray = np.ascontiguousarray(gray)
+    h, w = gray.shape
+    data = sip.voidptr(gray.ctypes.data)
+    image = QImage(data, w, h, gray.strides[0], QImage.Format.Format_Grayscale8)
+    image._pixels = gray
+    return image
+
+
+def hex_to_image(pixels, width: int, height: int) -> QImage:
+    """
+    Build an RGB32 QImage from flat 0xRRGGBB values in row-major order (a
+    libkayn Vec<Hex>, a list or an array) in one step.
+    WARNING: the pixels live as long as this Python object; see array_to_image.
+    """
+    packed = np.asarray(pixels, dtype=np.uint32).reshape(height, width) | 0xFF000000
+    data = sip.voidptr(packed.ctypes.data)
+    image = QImage(data, width, height, packed.strides[0], QImage.Format.Format_RGB32)
+    image._pixels = packed
+    return image
+
+
+def detach(value):
+    """
+    `value` with every QImage wrapping a NumPy array replaced by a copy that
+    Qt owns, looking into tuples and lists. Anything else is returned as is.
+    """
+    if isinstance(value, QImage):
+        return value.copy() if hasattr(value, "_pixels") else value
+    if isinstance(value, tuple):
+        return tuple(detach(v) for v in value)
+    if isinstance(value, list):
+        return [detach(v) for v in value]
+    return value
+
+
+def array_to_buffer(pixels: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    Flat uint8 view spanning the rows of a (height, width, 4) RGBA array and
+    the distance in bytes between rows, as taken by libkayn's *_buffer functions.
+    """
+    if pixels.strides[1:] != (4, 1):
+        pixels = np.ascontiguousarray(pixels)
+    h, w = pixels.shape[:2]
+    stride = pixels.strides[0]
+    span = (h - 1) * stride + w * 4 if h > 0 else 0
+    data = np.lib.stride_tricks.as_strided(
+        pixels, shape=(span,), strides=(1,), writeable=False
+    )
+    return data, stride
@@ -0,0 +1,178 @@
+use crate::pool;
+use std::ops::Range;
+
+// Banded execution on the worker pool. The output is split into horizontal
+// bands of whole rows, one job per band. A neighborhood op reads the input
+// rows of its band plus a halo of `side / 2` rows on each side; since the
+// input is shared read-only, the halo is just the wider range of rows the
+// band reads, and bands never write to each other's rows.
+//
+// Reductions (histograms, min/max) run in two phases: every band reduces its
+// own rows, then the partial results are combined in band order.
+//
+// `Image` is stored as columns (image[x][y]), so for those kernels a "row"
+// of storage is an image column and bands are bands of columns.
+
+// Bands per thread, so uneven bands do not leave threads idle.
+const BANDS_PER_THREAD: usize = 4;
+// Rows below which splitting costs more than it saves.
+const MIN_BAND_ROWS: usize = 8;
+
+/// Rows per band for an output of `rows` rows.
+pub fn band_rows(rows: usize) -> usize {
+    let bands = pool::threads() * BANDS_PER_THREAD;
+    (rows / bands.max(1)).max(MIN_BAND_ROWS).min(rows.max(1))
+}
+
+/// Call `job(rows, band)` for every band of an output made of rows of
+/// `row_len` items; `band` holds exactly the items of `rows`. Bands are at
+/// least twice as tall as the `halo`, so re-reading it stays cheap.
+pub fn for_each_band<T, F>(output: &mut [T], row_len: usize, halo: usize, job: F)
+where
+    T: Send,
+    F: Fn(Range<usize>, &mut [T]) + Sync,
+{
+    if row_len == 0 {
+        return;
+    }
+    let rows = output.len() / row_len;
+    let band = band_rows(rows).max(2 * halo);
+    pool::for_each_chunk(output, band * row_len, |i, chunk| {
+        let start = i * band;
+        job(start..start + chunk.len() / row_len, chunk)
+    });
+}
+
+/// Map every item of `input` to one output item, in bands.
+pub fn map<T, U, F>(input: &[T], function: F) -> Vec<U>
+where
+    T: Sync,
+    U: Send + Default + Clone,
+    F: Fn(&T) -> U + Sync,
+{
+    let mut output = vec![U::default(); input.len()];
+    for_each_band(&mut output, 1, 0, |rows, band| {
+        for (value, item) in band.iter_mut().zip(&input[rows]) {
+            *value = function(item);
+        }
+    });
+    output
+}
+
+/// Two-phase reduction over `rows` rows: `partial(rows)` per band, then
+/// `combine` folds the partial results in band order.
+pub fn reduce<A, P, C>(rows: usize, partial: P, combine: C) -> Option<A>
+where
+    A: Send,
+    P: Fn(Range<usize>) -> A + Sync,
+    C: Fn(A, A) -> A,
+{
+    let band = band_rows(rows);
+    let count = (rows + band - 1) / band;
+    let mut results: Vec<Option<A>> = (0..count).map(|_| None).collect();
+    pool::for_each_chunk(&mut results, 1, |i, slot| {
+        let start = i * band;
+        slot[0] = Some(partial(start..(start + band).min(rows)));
+    });
+    results.into_iter().flatten().reduce(combine)
+}
+
+/// 256-bin histogram over 0..len: `count(i, histogram)` adds item i.
+pub fn histogram<F>(len: usize, count: F) -> [u32; 256]
+where
+    F: Fn(usize, &mut [u32; 256]) + Sync,
+{
+    let partial = |range: Range<usize>| {
+        let mut histogram = [0u32; 256];
+        range.for_each(|i| count(i, &mut histogram));
+        histogram
+    };
+    let combine = |mut a: [u32; 256], b: [u32; 256]| {
+        a.iter_mut().zip(b.iter()).for_each(|(a, b)| *a += b);
+        a
+    };
+    reduce(len, partial, combine).unwrap_or([0; 256])
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::pool::testing::{thread_counts, with_threads};
+
+    // Sizes below, around and well above one band per thread.
+    const ROWS: [usize; 7] = [0, 1, 2, 5, 9, 100, 1001];
+
+    #[test]
+    fn map_matches_serial() {
+        for threads in thread_counts() {
+            for rows in ROWS {
+                let input: Vec<u32> = (0..rows as u32).collect();
+                let banded = with_threads(threads, || map(&input, |v| v * 3 + 1));
+                let serial: Vec<u32> = input.iter().map(|v| v * 3 + 1).collect();
+                assert_eq!(banded, serial, "{} rows, {} threads", rows, threads);
+            }
+        }
+    }
+
+    #[test]
+    fn reduce_combines_in_band_order() {
+        for threads in thread_counts() {
+            for rows in ROWS {
+                let partial = |range: Range<usize>| range.collect::<Vec<_>>();
+                let concat = |mut a: Vec<usize>, b: Vec<usize>| {
+                    a.extend(b);
+                    a
+                };
+                let banded = with_threads(threads, || reduce(rows, partial, concat));
+                let expected = if rows == 0 {
+                    None
+                } else {
+                    Some((0..rows).collect())
+                };
+                assert_eq!(banded, expected, "{} rows, {} threads", rows, threads);
+            }
+        }
+    }
+
+    #[test]
+    fn histogram_matches_serial() {
+        for threads in thread_counts() {
+            for rows in ROWS {
+                let values: Vec<u8> = (0..rows).map(|i| (i * 37 % 256) as u8).collect();
+                let banded = with_threads(threads, || {
+                    histogram(rows, |i, histogram| histogram[values[i] as usize] += 1)
+                });
+                let mut serial = [0u32; 256];
+                values.iter().for_each(|v| serial[*v as usize] += 1);
+                assert_eq!(banded, serial, "{} rows, {} threads", rows, threads);
+            }
+        }
+    }
+
+    #[test]
+    fn bands_read_their_halo() {
+        // Each output row sums the input rows within `halo` of it.
+        let (row_len, halo) = (3, 2);
+        for threads in thread_counts() {
+            for rows in ROWS {
+                let input: Vec<u64> = (0..(rows * row_len) as u64).map(|v| v * v % 97).collect();
+                let sum = |y: usize, x: usize| -> u64 {
+                    let rows = y.saturating_sub(halo)..(y + halo + 1).min(rows);
+                    rows.map(|r| input[r * row_len + x]).sum()
+                };
+                let mut banded = vec![0u64; rows * row_len];
+                with_threads(threads, || {
+                    for_each_band(&mut banded, row_len, halo, |band_rows, band| {
+                        for (y, row) in band_rows.zip(band.chunks_exact_mut(row_len)) {
+                            row.iter_mut().enumerate().for_each(|(x, v)| *v = sum(y, x));
+                        }
+                    })
+                });
+                let serial: Vec<u64> = (0..rows * row_len)
+                    .map(|i| sum(i / row_len, i % row_len))
+                    .collect();
+                assert_eq!(banded, serial, "{} rows, {} threads", rows, threads);
+            }
+        }
+    }
+}
@@ -0,0 +1,68 @@
+use crate::common::{Hex, Image, Rgb, Rgba};
+
+// Conversions between contiguous RGBA8888 byte buffers and the pixel
+// representations used by the kernels. A buffer holds `height` rows of
+// `width` RGBA pixels, each row starting `stride` bytes after the previous.
+
+pub fn required_len(width: usize, height: usize, stride: usize) -> usize {
+    match height {
+        0 => 0,
+        _ => (height - 1) * stride + width * 4,
+    }
+}
+
+pub fn check_layout(len: usize, width: usize, height: usize, stride: usize) -> Result<(), String> {
+    if stride < width * 4 {
+        return Err(format!(
+            "stride {} is smaller than a row of {} pixels",
+            stride, width
+        ));
+    }
+    let needed = required_len(width, height, stride);
+    if len < needed {
+        return Err(format!("buffer has {} bytes, {} are needed", len, needed));
+    }
+    Ok(())
+}
+
+fn rows(data: &[u8], width: usize, height: usize, stride: usize) -> impl Iterator<Item = &[u8]> {
+    (0..height).map(move |y| &data[y * stride..y * stride + width * 4])
+}
+
+pub fn to_image(data: &[u8], width: usize, height: usize, stride: usize) -> Image {
+    rows(data, width, height, stride)
+        .map(|row| {
+            row.chunks_exact(4)
+                .map(|p| [p[0], p[1], p[2], p[3]])
+                .collect()
+        })
+        .collect()
+}
+
+pub fn to_rgb(data: &[u8], width: usize, height: usize, stride: usize) -> Vec<Rgb> {
+    rows(data, width, height, stride)
+        .flat_map(|row| row.chunks_exact(4).map(|p| [p[0], p[1], p[2]]))
+        .collect()
+}
+
+/// Flatten an image, dropping `border` pixels on every side.
+pub fn from_image(image: &Image, border: usize) -> Vec<u8> {
+    let height = image.len();
+    let width = image.first().map_or(0, |row| row.len());
+    let mut data = Vec::with_capacity(width * height * 4);
+    for row in &image[border..height - border] {
+        for pixel in &row[border..width - border] {
+            data.extend_from_slice(pixel as &Rgba);
+        }
+    }
+    data
+}
+
+/// Unpack 0xRRGGBB pixels into opaque RGBA bytes.
+pub fn from_hex(pixels: &[Hex]) -> Vec<u8> {
+    let mut data = Vec::with_capacity(pixels.len() * 4);
+    for pixel in pixels {
+        data.extend_from_slice(&[(pixel >> 16) as u8, (pixel >> 8) as u8, *pixel as u8, 255]);
+    }
+    data
+}
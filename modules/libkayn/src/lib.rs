@@ -1,174 +1,586 @@
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
+use pyo3::types::PyByteArray;
 use pyo3::wrap_pyfunction;
 
+mod bands;
+mod buffer;
 mod common;
 mod operations;
+mod pool;
+mod rank;
+mod thinning;
 mod transformations;
 use common::{Hex, Image, Rgb};
+use rank::Rank;
+
+// Every entry point converts its arguments while holding the GIL and then
+// releases it for the computation, so other Python threads keep running.
 
 #[pyfunction]
-fn grayscale(image: Image) -> PyResult<Image> {
-    Ok(operations::grayscale(image))
+fn grayscale(py: Python, image: Image) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::grayscale(image)))
 }
 
 #[pyfunction]
-fn negative(image: Image) -> PyResult<Image> {
-    Ok(operations::negative(image))
+fn negative(py: Python, image: Image) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::negative(image)))
 }
 
 #[pyfunction]
-fn convolute(image: Image, mask: Vec<f32>) -> PyResult<Image> {
-    Ok(operations::convolute(image, &mask))
+fn convolute(py: Python, image: Image, mask: Vec<f32>) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::convolute(&image, &mask)))
 }
 #[pyfunction]
-fn sobel(image: Image) -> PyResult<Image> {
-    Ok(operations::sobel(image))
+fn sobel(py: Python, image: Image) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::sobel(image)))
 }
 #[pyfunction]
-fn median(image: Vec<Rgb>, distance: u32, width: u32, height: u32) -> PyResult<Vec<Hex>> {
-    Ok(operations::median(image, distance, width, height))
+fn median(
+    py: Python,
+    image: Vec<Rgb>,
+    distance: u32,
+    width: u32,
+    height: u32,
+) -> PyResult<Vec<Hex>> {
+    Ok(py.allow_threads(|| operations::median(image, distance, width, height)))
 }
 
 #[pyfunction]
-fn dynamic_compression(image: Image, constant: f32, gamma: f32) -> PyResult<Image> {
-    Ok(operations::dynamic_compression(image, constant, gamma))
+fn dynamic_compression(py: Python, image: Image, constant: f32, gamma: f32) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::dynamic_compression(image, constant, gamma)))
 }
 
 #[pyfunction]
-fn normalize(image: Image) -> PyResult<Image> {
-    Ok(operations::normalize(image))
+fn normalize(py: Python, image: Image) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::normalize(image)))
 }
 
 #[pyfunction]
-fn limiarize(image: Image, threshold: u8) -> PyResult<Image> {
-    Ok(operations::limiarize(image, threshold))
+fn limiarize(py: Python, image: Image, threshold: u8) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::limiarize(image, threshold)))
 }
 
 #[pyfunction]
-fn binarize(image: Image, threshold: u8) -> PyResult<Image> {
-    Ok(operations::binarize(image, threshold))
+fn binarize(py: Python, image: Image, threshold: u8) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::binarize(image, threshold)))
 }
 #[pyfunction]
-fn equalize(image: Image) -> PyResult<Image> {
-    Ok(operations::equalize(image))
+fn equalize(py: Python, image: Image) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::equalize(image)))
 }
 #[pyfunction]
-fn gray_to_color_scale(image: Vec<Rgb>) -> PyResult<Vec<Hex>> {
-    Ok(operations::gray_to_color_scale(image))
+fn gray_to_color_scale(py: Python, image: Vec<Rgb>) -> PyResult<Vec<Hex>> {
+    Ok(py.allow_threads(|| operations::gray_to_color_scale(image)))
 }
 #[pyfunction]
 fn noise_reduction_max(
+    py: Python,
     image: Vec<Rgb>,
     distance: u32,
     width: u32,
     height: u32,
 ) -> PyResult<Vec<Hex>> {
-    Ok(operations::noise_reduction_max(
-        image, distance, width, height,
-    ))
+    Ok(py.allow_threads(|| {
+        operations::noise_reduction_max(image, distance, width, height)
+    }))
 }
 #[pyfunction]
 fn noise_reduction_min(
+    py: Python,
     image: Vec<Rgb>,
     distance: u32,
     width: u32,
     height: u32,
 ) -> PyResult<Vec<Hex>> {
-    Ok(operations::noise_reduction_min(
-        image, distance, width, height,
-    ))
+    Ok(py.allow_threads(|| {
+        operations::noise_reduction_min(image, distance, width, height)
+    }))
 }
 #[pyfunction]
 fn noise_reduction_midpoint(
+    py: Python,
     image: Vec<Rgb>,
     distance: u32,
     width: u32,
     height: u32,
 ) -> PyResult<Vec<Hex>> {
-    Ok(operations::noise_reduction_midpoint(
-        image, distance, width, height,
-    ))
+    Ok(py.allow_threads(|| {
+        operations::noise_reduction_midpoint(image, distance, width, height)
+    }))
+}
+#[pyfunction]
+fn otsu_binarize(py: Python, image: Image) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::otsu_binarize(image)))
+}
+
+#[pyfunction]
+fn otsu_limiarize(py: Python, image: Image) -> PyResult<Image> {
+    Ok(py.allow_threads(|| operations::otsu_limiarize(image)))
 }
+
 #[pyfunction]
-fn otsu_threshold(image: Vec<Rgb>, width: u32, height: u32) -> PyResult<u8> {
-    Ok(operations::otsu_thresholding(image, width, height))
+fn otsu_threshold(py: Python, image: Vec<Rgb>, width: u32, height: u32) -> PyResult<u8> {
+    Ok(py.allow_threads(|| operations::otsu_thresholding(image, width, height)))
 }
 
 #[pyfunction]
-fn dct(image: Vec<Rgb>, width: u32, height: u32) -> PyResult<(Vec<Hex>, Vec<f32>)> {
-    Ok(transformations::dct_multithread(image, width, height))
+fn dct(py: Python, image: Vec<Rgb>, width: u32, height: u32) -> PyResult<(Vec<Hex>, Vec<f32>)> {
+    Ok(py.allow_threads(|| transformations::dct_multithread(&image, width, height)))
 }
 
 #[pyfunction]
-fn idct(coefficients: Vec<f32>, width: u32, height: u32) -> PyResult<Vec<Hex>> {
-    Ok(transformations::idct_multithread(
-        coefficients,
-        width,
-        height,
-    ))
+fn idct(py: Python, coefficients: Vec<f32>, width: u32, height: u32) -> PyResult<Vec<Hex>> {
+    Ok(py.allow_threads(|| {
+        transformations::idct_multithread(&coefficients, width, height)
+    }))
 }
 
 #[pyfunction]
 fn resize_nn(
+    py: Python,
     image: Vec<Rgb>,
     width: u32,
     height: u32,
     new_width: u32,
     new_height: u32,
 ) -> PyResult<Vec<Hex>> {
-    Ok(transformations::resize_nearest_neighbor(
-        image, width, height, new_width, new_height,
-    ))
+    Ok(py.allow_threads(|| {
+        transformations::resize_nearest_neighbor(image, width, height, new_width, new_height)
+    }))
 }
 #[pyfunction]
 fn freq_lowpass(
+    py: Python,
     image: Vec<f32>,
     width: u32,
     height: u32,
     radius: u32,
 ) -> PyResult<(Vec<Hex>, Vec<f32>)> {
-    Ok(transformations::freq_lowpass(image, width, height, radius))
+    Ok(py.allow_threads(|| transformations::freq_lowpass(image, width, height, radius)))
 }
 #[pyfunction]
 fn freq_highpass(
+    py: Python,
     image: Vec<f32>,
     width: u32,
     height: u32,
     radius: u32,
 ) -> PyResult<(Vec<Hex>, Vec<f32>)> {
-    Ok(transformations::freq_highpass(image, width, height, radius))
+    Ok(py.allow_threads(|| transformations::freq_highpass(image, width, height, radius)))
+}
+#[pyfunction]
+fn freq_normalize(py: Python, image: Vec<f32>) -> PyResult<Vec<Hex>> {
+    Ok(py.allow_threads(|| transformations::freq_normalize(&image)))
+}
+
+#[pyfunction]
+fn equalize_hsl(py: Python, image: Vec<Rgb>) -> PyResult<Vec<Hex>> {
+    Ok(py.allow_threads(|| operations::equalize_hsl(image)))
+}
+#[pyfunction]
+fn split_color_channel(py: Python, image: Vec<Rgb>, channel: usize) -> PyResult<Vec<Hex>> {
+    Ok(py.allow_threads(|| operations::split_color_channel(image, channel)))
+}
+
+#[pyfunction]
+fn zhang_suen_thinning(py: Python, image: Vec<Rgb>, width: u32, height: u32) -> PyResult<Vec<Hex>> {
+    Ok(py.allow_threads(|| operations::zhang_suen_thinning(image, width, height)))
+}
+
+// Buffer entry points.
+// They take a contiguous uint8 RGBA buffer (anything implementing the buffer
+// protocol, e.g. a NumPy array) plus its row stride, width and height, and
+// return the result as a bytearray of RGBA pixels. Area filters return only
+// the pixels where the whole mask fits: (width - side + 1) x (height - side + 1).
+//
+// The buffer is copied once while holding the GIL (Python may change it
+// afterwards); conversion, filtering and packing run with the GIL released.
+
+fn read_buffer(
+    py: Python,
+    data: &PyBuffer<u8>,
+    width: usize,
+    height: usize,
+    stride: usize,
+) -> PyResult<Vec<u8>> {
+    let bytes = data.to_vec(py)?;
+    buffer::check_layout(bytes.len(), width, height, stride).map_err(PyValueError::new_err)?;
+    Ok(bytes)
+}
+
+/// Run `filter` on the raw bytes without the GIL.
+fn bytes_filter<'py, F>(
+    py: Python<'py>,
+    data: &PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    filter: F,
+) -> PyResult<&'py PyByteArray>
+where
+    F: FnOnce(&[u8]) -> Vec<u8> + Send,
+{
+    let bytes = read_buffer(py, data, width, height, stride)?;
+    let result = py.allow_threads(|| filter(&bytes));
+    Ok(PyByteArray::new(py, &result))
+}
+
+/// Run an `Image` filter without the GIL; `border` pixels are cropped.
+fn image_filter<'py, F>(
+    py: Python<'py>,
+    data: &PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    border: usize,
+    filter: F,
+) -> PyResult<&'py PyByteArray>
+where
+    F: FnOnce(Image) -> Image + Send,
+{
+    bytes_filter(py, data, stride, width, height, |bytes| {
+        let image = buffer::to_image(bytes, width, height, stride);
+        buffer::from_image(&filter(image), border)
+    })
+}
+
+/// Run a `Vec<Rgb> -> Vec<Hex>` filter without the GIL.
+fn rgb_filter<'py, F>(
+    py: Python<'py>,
+    data: &PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    filter: F,
+) -> PyResult<&'py PyByteArray>
+where
+    F: FnOnce(Vec<Rgb>) -> Vec<Hex> + Send,
+{
+    bytes_filter(py, data, stride, width, height, |bytes| {
+        buffer::from_hex(&filter(buffer::to_rgb(bytes, width, height, stride)))
+    })
+}
+
+fn rank_filter(
+    bytes: &[u8],
+    stride: usize,
+    width: usize,
+    height: usize,
+    distance: usize,
+    rank: Rank,
+    per_channel: bool,
+) -> Vec<u8> {
+    match per_channel {
+        true => rank::rank_filter(bytes, width, height, stride, distance, rank),
+        false => rank::packed_rank_filter(bytes, width, height, stride, distance, rank),
+    }
+}
+
+#[pyfunction]
+fn grayscale_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<&'py PyByteArray> {
+    image_filter(py, &data, stride, width, height, 0, |image| {
+        operations::grayscale(image)
+    })
+}
+
+#[pyfunction]
+fn negative_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<&'py PyByteArray> {
+    image_filter(py, &data, stride, width, height, 0, |image| {
+        operations::negative(image)
+    })
+}
+
+#[pyfunction]
+fn convolute_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    mask: Vec<f32>,
+) -> PyResult<&'py PyByteArray> {
+    let half = ((mask.len() as f32).sqrt().round() as usize) / 2;
+    image_filter(py, &data, stride, width, height, half, |image| {
+        operations::convolute(&image, &mask)
+    })
+}
+
+#[pyfunction]
+fn sobel_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<&'py PyByteArray> {
+    image_filter(py, &data, stride, width, height, 1, |image| {
+        operations::sobel(image)
+    })
+}
+
+#[pyfunction]
+fn median_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    distance: usize,
+    per_channel: bool,
+) -> PyResult<&'py PyByteArray> {
+    bytes_filter(py, &data, stride, width, height, |bytes| {
+        rank_filter(bytes, stride, width, height, distance, Rank::Median, per_channel)
+    })
+}
+
+#[pyfunction]
+fn dynamic_compression_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    constant: f32,
+    gamma: f32,
+) -> PyResult<&'py PyByteArray> {
+    image_filter(py, &data, stride, width, height, 0, |image| {
+        operations::dynamic_compression(image, constant, gamma)
+    })
+}
+
+#[pyfunction]
+fn normalize_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<&'py PyByteArray> {
+    image_filter(py, &data, stride, width, height, 0, |image| {
+        operations::normalize(image)
+    })
+}
+
+#[pyfunction]
+fn limiarize_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    threshold: u8,
+) -> PyResult<&'py PyByteArray> {
+    image_filter(py, &data, stride, width, height, 0, |image| {
+        operations::limiarize(image, threshold)
+    })
+}
+
+#[pyfunction]
+fn binarize_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    threshold: u8,
+) -> PyResult<&'py PyByteArray> {
+    image_filter(py, &data, stride, width, height, 0, |image| {
+        operations::binarize(image, threshold)
+    })
+}
+
+#[pyfunction]
+fn equalize_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<&'py PyByteArray> {
+    image_filter(py, &data, stride, width, height, 0, |image| {
+        operations::equalize(image)
+    })
+}
+
+#[pyfunction]
+fn gray_to_color_scale_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<&'py PyByteArray> {
+    rgb_filter(py, &data, stride, width, height, |image| {
+        operations::gray_to_color_scale(image)
+    })
 }
+
+#[pyfunction]
+fn noise_reduction_max_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    distance: usize,
+    per_channel: bool,
+) -> PyResult<&'py PyByteArray> {
+    bytes_filter(py, &data, stride, width, height, |bytes| {
+        rank_filter(bytes, stride, width, height, distance, Rank::Max, per_channel)
+    })
+}
+
+#[pyfunction]
+fn noise_reduction_min_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    distance: usize,
+    per_channel: bool,
+) -> PyResult<&'py PyByteArray> {
+    bytes_filter(py, &data, stride, width, height, |bytes| {
+        rank_filter(bytes, stride, width, height, distance, Rank::Min, per_channel)
+    })
+}
+
+#[pyfunction]
+fn noise_reduction_midpoint_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    distance: usize,
+    per_channel: bool,
+) -> PyResult<&'py PyByteArray> {
+    bytes_filter(py, &data, stride, width, height, |bytes| {
+        rank_filter(bytes, stride, width, height, distance, Rank::Midpoint, per_channel)
+    })
+}
+
+#[pyfunction]
+fn otsu_binarize_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<&'py PyByteArray> {
+    image_filter(py, &data, stride, width, height, 0, |image| {
+        operations::otsu_binarize(image)
+    })
+}
+
 #[pyfunction]
-fn freq_normalize(image: Vec<f32>) -> PyResult<Vec<Hex>> {
-    Ok(transformations::freq_normalize(&image))
+fn otsu_limiarize_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<&'py PyByteArray> {
+    image_filter(py, &data, stride, width, height, 0, |image| {
+        operations::otsu_limiarize(image)
+    })
 }
 
 #[pyfunction]
-fn equalize_hsl(image: Vec<Rgb>) -> PyResult<Vec<Hex>> {
-    Ok(operations::equalize_hsl(image))
+fn otsu_threshold_buffer(
+    py: Python,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<u8> {
+    let bytes = read_buffer(py, &data, width, height, stride)?;
+    Ok(py.allow_threads(|| {
+        let image = buffer::to_rgb(&bytes, width, height, stride);
+        operations::otsu_thresholding(image, width as u32, height as u32)
+    }))
 }
+
+#[pyfunction]
+fn resize_nn_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    new_width: u32,
+    new_height: u32,
+) -> PyResult<&'py PyByteArray> {
+    rgb_filter(py, &data, stride, width, height, |image| {
+        let (w, h) = (width as u32, height as u32);
+        transformations::resize_nearest_neighbor(image, w, h, new_width, new_height)
+    })
+}
+
+#[pyfunction]
+fn equalize_hsl_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<&'py PyByteArray> {
+    rgb_filter(py, &data, stride, width, height, |image| {
+        operations::equalize_hsl(image)
+    })
+}
+
 #[pyfunction]
-fn split_color_channel(image: Vec<Rgb>, channel: usize) -> PyResult<Vec<Hex>> {
-    Ok(operations::split_color_channel(image, channel))
+fn split_color_channel_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+    channel: usize,
+) -> PyResult<&'py PyByteArray> {
+    rgb_filter(py, &data, stride, width, height, |image| {
+        operations::split_color_channel(image, channel)
+    })
 }
 
 #[pyfunction]
-fn erosion(image: Vec<Rgb>, width: u32, height: u32) -> PyResult<Vec<Hex>> {
-    Ok(operations::erosion(image, width as i32, height as i32))
+fn zhang_suen_thinning_buffer<'py>(
+    py: Python<'py>,
+    data: PyBuffer<u8>,
+    stride: usize,
+    width: usize,
+    height: usize,
+) -> PyResult<&'py PyByteArray> {
+    rgb_filter(py, &data, stride, width, height, |image| {
+        operations::zhang_suen_thinning(image, width as u32, height as u32)
+    })
 }
 
+/// Limit the threads libkayn uses for the following calls; 0 uses one per core.
 #[pyfunction]
-fn dilation(image: Vec<Rgb>, width: u32, height: u32) -> PyResult<Vec<Hex>> {
-    Ok(operations::dilation(image, width as i32, height as i32))
+fn set_threads(threads: usize) {
+    pool::set_threads(threads)
 }
 
+/// Number of threads libkayn currently uses.
 #[pyfunction]
-fn zhang_suen_thinning(image: Vec<Rgb>, width: u32, height: u32) -> PyResult<Vec<Hex>> {
-    Ok(operations::zhang_suen_thinning(
-        image,
-        width as u32,
-        height as u32,
-    ))
+fn threads() -> usize {
+    pool::threads()
 }
 
 #[pymodule]
@@ -187,6 +599,8 @@ fn libkayn(_py: Python, m: &PyModule) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(noise_reduction_max, m)?)?;
     m.add_function(wrap_pyfunction!(noise_reduction_min, m)?)?;
     m.add_function(wrap_pyfunction!(noise_reduction_midpoint, m)?)?;
+    m.add_function(wrap_pyfunction!(otsu_binarize, m)?)?;
+    m.add_function(wrap_pyfunction!(otsu_limiarize, m)?)?;
     m.add_function(wrap_pyfunction!(otsu_threshold, m)?)?;
     m.add_function(wrap_pyfunction!(dct, m)?)?;
     m.add_function(wrap_pyfunction!(idct, m)?)?;
@@ -196,8 +610,29 @@ fn libkayn(_py: Python, m: &PyModule) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(freq_normalize, m)?)?;
     m.add_function(wrap_pyfunction!(equalize_hsl, m)?)?;
     m.add_function(wrap_pyfunction!(split_color_channel, m)?)?;
-    m.add_function(wrap_pyfunction!(erosion, m)?)?;
-    m.add_function(wrap_pyfunction!(dilation, m)?)?;
     m.add_function(wrap_pyfunction!(zhang_suen_thinning, m)?)?;
+    m.add_function(wrap_pyfunction!(grayscale_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(negative_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(convolute_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(sobel_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(median_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(dynamic_compression_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(normalize_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(limiarize_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(binarize_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(equalize_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(gray_to_color_scale_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(noise_reduction_max_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(noise_reduction_min_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(noise_reduction_midpoint_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(otsu_binarize_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(otsu_limiarize_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(otsu_threshold_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(resize_nn_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(equalize_hsl_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(split_color_channel_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(zhang_suen_thinning_buffer, m)?)?;
+    m.add_function(wrap_pyfunction!(set_threads, m)?)?;
+    m.add_function(wrap_pyfunction!(threads, m)?)?;
     Ok(())
 }
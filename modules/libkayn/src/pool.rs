@@ -0,0 +1,280 @@
+use std::collections::VecDeque;
+use std::panic::{self, AssertUnwindSafe};
+use std::sync::atomic::{AtomicBool, AtomicUsize, Ordering};
+use std::sync::{Arc, Condvar, Mutex, OnceLock};
+use std::thread;
+
+// Shared worker pool. The threads are started on first use and live for the
+// whole process, so a filter call no longer pays for spawning threads.
+//
+// `run(count, f)` calls f(0..count) across the workers and the calling
+// thread, and returns once every call finished. Because it blocks until
+// then, `f` may borrow data from the caller's stack (read-only slices,
+// disjoint output chunks) instead of cloning it for each thread. The caller
+// takes part in the work, so nested calls from inside a job cannot deadlock.
+
+type Job = dyn Fn(usize) + Sync;
+
+struct Task {
+    // Only dereferenced while the `run` call that owns it is waiting.
+    job: *const Job,
+    count: usize,
+    next: AtomicUsize,
+    finished: Mutex<usize>,
+    all_finished: Condvar,
+    panicked: AtomicBool,
+}
+
+// The pointer is only shared while `run` keeps the closure alive.
+unsafe impl Send for Task {}
+unsafe impl Sync for Task {}
+
+impl Task {
+    fn work(&self) {
+        let mut done = 0;
+        loop {
+            let index = self.next.fetch_add(1, Ordering::Relaxed);
+            if index >= self.count {
+                break;
+            }
+            // An unfinished index keeps the owning `run` call waiting.
+            let job = unsafe { &*self.job };
+            if panic::catch_unwind(AssertUnwindSafe(|| job(index))).is_err() {
+                self.panicked.store(true, Ordering::Relaxed);
+            }
+            done += 1;
+        }
+        if done > 0 {
+            let mut finished = self.finished.lock().unwrap();
+            *finished += done;
+            if *finished == self.count {
+                self.all_finished.notify_all();
+            }
+        }
+    }
+
+    fn wait(&self) {
+        let mut finished = self.finished.lock().unwrap();
+        while *finished < self.count {
+            finished = self.all_finished.wait(finished).unwrap();
+        }
+    }
+}
+
+struct Pool {
+    queue: Mutex<VecDeque<Arc<Task>>>,
+    available: Condvar,
+    workers: usize,
+}
+
+static POOL: OnceLock<Arc<Pool>> = OnceLock::new();
+
+fn pool() -> &'static Arc<Pool> {
+    POOL.get_or_init(|| {
+        let workers = thread::available_parallelism().map_or(1, |n| n.get());
+        // Tests need several workers to exercise banding on any machine.
+        #[cfg(test)]
+        let workers = workers.max(4);
+        let pool = Arc::new(Pool {
+            queue: Mutex::new(VecDeque::new()),
+            available: Condvar::new(),
+            workers,
+        });
+        for i in 0..workers {
+            let pool = Arc::clone(&pool);
+            thread::Builder::new()
+                .name(format!("libkayn-{}", i))
+                .spawn(move || loop {
+                    let task = {
+                        let mut queue = pool.queue.lock().unwrap();
+                        loop {
+                            match queue.pop_front() {
+                                Some(task) => break task,
+                                None => queue = pool.available.wait(queue).unwrap(),
+                            }
+                        }
+                    };
+                    task.work();
+                })
+                .expect("could not start a libkayn worker thread");
+        }
+        pool
+    })
+}
+
+// Upper bound on the threads working on one call (0 = one per core).
+static THREAD_LIMIT: AtomicUsize = AtomicUsize::new(0);
+
+/// Limit the threads used by later calls; 0 uses one per core.
+pub fn set_threads(threads: usize) {
+    THREAD_LIMIT.store(threads, Ordering::Relaxed);
+}
+
+/// Number of threads working on a call, including the caller.
+pub fn threads() -> usize {
+    let workers = pool().workers;
+    match THREAD_LIMIT.load(Ordering::Relaxed) {
+        0 => workers,
+        limit => limit.min(workers),
+    }
+}
+
+/// Call `job(i)` for every i in 0..count in parallel and wait for all calls.
+pub fn run<F: Fn(usize) + Sync>(count: usize, job: F) {
+    if count == 0 {
+        return;
+    }
+    if count == 1 || threads() == 1 {
+        return (0..count).for_each(job);
+    }
+    let job: &(dyn Fn(usize) + Sync + '_) = &job;
+    let task = Arc::new(Task {
+        // Erase the borrow's lifetime: `task.wait()` below outlives every use.
+        job: unsafe { std::mem::transmute::<_, &'static Job>(job) },
+        count,
+        next: AtomicUsize::new(0),
+        finished: Mutex::new(0),
+        all_finished: Condvar::new(),
+        panicked: AtomicBool::new(false),
+    });
+
+    let pool = pool();
+    let helpers = (count - 1).min(threads() - 1);
+    {
+        let mut queue = pool.queue.lock().unwrap();
+        for _ in 0..helpers {
+            queue.push_back(Arc::clone(&task));
+        }
+    }
+    for _ in 0..helpers {
+        pool.available.notify_one();
+    }
+    task.work();
+    task.wait();
+    if task.panicked.load(Ordering::Relaxed) {
+        panic!("a libkayn worker panicked");
+    }
+}
+
+/// Split `data` in chunks of `chunk_len` items and call `job(index, chunk)`
+/// on every chunk in parallel.
+pub fn for_each_chunk<T, F>(data: &mut [T], chunk_len: usize, job: F)
+where
+    T: Send,
+    F: Fn(usize, &mut [T]) + Sync,
+{
+    let chunks: Vec<Mutex<&mut [T]>> = data.chunks_mut(chunk_len.max(1)).map(Mutex::new).collect();
+    run(chunks.len(), |i| job(i, &mut chunks[i].lock().unwrap()));
+}
+
+/// Run both closures in parallel and return both results.
+pub fn join<A, B, RA, RB>(a: A, b: B) -> (RA, RB)
+where
+    A: FnOnce() -> RA + Send,
+    B: FnOnce() -> RB + Send,
+    RA: Send,
+    RB: Send,
+{
+    let a = Mutex::new((Some(a), None));
+    let b = Mutex::new((Some(b), None));
+    run(2, |i| match i {
+        0 => {
+            let mut a = a.lock().unwrap();
+            a.1 = a.0.take().map(|f| f());
+        }
+        _ => {
+            let mut b = b.lock().unwrap();
+            b.1 = b.0.take().map(|f| f());
+        }
+    });
+    (
+        a.into_inner().unwrap().1.unwrap(),
+        b.into_inner().unwrap().1.unwrap(),
+    )
+}
+
+#[cfg(test)]
+pub mod testing {
+    use std::sync::Mutex;
+
+    // The thread limit is global, so tests that change it take turns.
+    static LIMIT: Mutex<()> = Mutex::new(());
+
+    /// Thread counts worth comparing: serial, an odd split and every worker.
+    pub fn thread_counts() -> Vec<usize> {
+        vec![1, 3, super::pool().workers]
+    }
+
+    /// Run `f` with at most `threads` threads per call.
+    pub fn with_threads<R>(threads: usize, f: impl FnOnce() -> R) -> R {
+        let _turn = LIMIT
+            .lock()
+            .unwrap_or_else(|poisoned| poisoned.into_inner());
+        super::set_threads(threads);
+        let result = f();
+        super::set_threads(0);
+        result
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::testing::{thread_counts, with_threads};
+    use super::*;
+
+    #[test]
+    fn run_calls_every_index_once() {
+        for threads in thread_counts() {
+            for count in [0, 1, 2, 3, 7, 100] {
+                let calls: Vec<AtomicUsize> = (0..count).map(|_| AtomicUsize::new(0)).collect();
+                with_threads(threads, || {
+                    run(count, |i| {
+                        calls[i].fetch_add(1, Ordering::Relaxed);
+                    })
+                });
+                assert!(
+                    calls.iter().all(|c| c.load(Ordering::Relaxed) == 1),
+                    "{} threads",
+                    threads
+                );
+            }
+        }
+    }
+
+    #[test]
+    fn nested_runs_finish() {
+        with_threads(3, || {
+            let total = AtomicUsize::new(0);
+            run(4, |_| {
+                run(5, |i| {
+                    total.fetch_add(i, Ordering::Relaxed);
+                })
+            });
+            assert_eq!(total.load(Ordering::Relaxed), 4 * 10);
+        });
+    }
+
+    #[test]
+    fn panics_reach_the_caller() {
+        let result = with_threads(3, || panic::catch_unwind(|| run(8, |i| assert!(i != 5))));
+        assert!(result.is_err());
+        // The pool keeps working afterwards.
+        with_threads(3, || assert_eq!(join(|| 1, || 2), (1, 2)));
+    }
+
+    #[test]
+    fn chunks_cover_the_data() {
+        for threads in thread_counts() {
+            let mut data = vec![0usize; 1000];
+            with_threads(threads, || {
+                for_each_chunk(&mut data, 64, |i, chunk| {
+                    chunk
+                        .iter_mut()
+                        .enumerate()
+                        .for_each(|(j, v)| *v = i * 64 + j)
+                })
+            });
+            assert!(data.iter().enumerate().all(|(i, v)| i == *v));
+        }
+    }
+}
@@ -0,0 +1,342 @@
+use crate::bands;
+use crate::common::rgb2hex;
+
+// Rank filters (median, min, max, midpoint) over RGBA8888 buffers.
+//
+// Both modes run in bands of output rows on the worker pool.
+//
+// The per-channel mode uses the Perreault-Hébert algorithm: one histogram
+// per image column is kept for the current band of rows, and the window
+// histogram slides along the row by subtracting the leftmost column and
+// adding the next one. Each output pixel costs a fixed number of histogram
+// operations, whatever the window size. Histograms are two-level (16 coarse
+// bins over 256 fine ones) so finding the n-th value scans at most 32 bins.
+//
+// The packed mode orders whole pixels by their 0xRRGGBB value, as the
+// original kernels do. That ordering has no per-channel histogram, so it
+// selects the n-th pixel of every window instead.
+
+#[derive(Clone, Copy)]
+pub enum Rank {
+    Median,
+    Min,
+    Max,
+    Midpoint,
+}
+
+#[derive(Clone)]
+struct Histogram {
+    coarse: [u16; 16],
+    fine: [u16; 256],
+}
+
+impl Histogram {
+    fn new() -> Histogram {
+        Histogram {
+            coarse: [0; 16],
+            fine: [0; 256],
+        }
+    }
+
+    fn insert(&mut self, value: u8) {
+        self.coarse[(value >> 4) as usize] += 1;
+        self.fine[value as usize] += 1;
+    }
+
+    fn remove(&mut self, value: u8) {
+        self.coarse[(value >> 4) as usize] -= 1;
+        self.fine[value as usize] -= 1;
+    }
+
+    fn add(&mut self, other: &Histogram) {
+        for (a, b) in self.coarse.iter_mut().zip(other.coarse.iter()) {
+            *a += b;
+        }
+        for (a, b) in self.fine.iter_mut().zip(other.fine.iter()) {
+            *a += b;
+        }
+    }
+
+    fn subtract(&mut self, other: &Histogram) {
+        for (a, b) in self.coarse.iter_mut().zip(other.coarse.iter()) {
+            *a -= b;
+        }
+        for (a, b) in self.fine.iter_mut().zip(other.fine.iter()) {
+            *a -= b;
+        }
+    }
+
+    /// The value with `n` smaller values before it (0-based rank).
+    fn nth(&self, n: usize) -> u8 {
+        let mut seen = 0;
+        for (bin, count) in self.coarse.iter().enumerate() {
+            let count = *count as usize;
+            if seen + count > n {
+                for value in bin * 16..bin * 16 + 16 {
+                    seen += self.fine[value] as usize;
+                    if seen > n {
+                        return value as u8;
+                    }
+                }
+            }
+            seen += count;
+        }
+        255
+    }
+}
+
+fn select(histogram: &Histogram, rank: Rank, size: usize) -> u8 {
+    match rank {
+        Rank::Median => histogram.nth(size / 2),
+        Rank::Min => histogram.nth(0),
+        Rank::Max => histogram.nth(size - 1),
+        Rank::Midpoint => histogram.nth(0) / 2 + histogram.nth(size - 1) / 2,
+    }
+}
+
+/// Per-channel rank filter. Returns the (width - side + 1) x
+/// (height - side + 1) valid region as opaque RGBA pixels.
+pub fn rank_filter(
+    data: &[u8],
+    width: usize,
+    height: usize,
+    stride: usize,
+    distance: usize,
+    rank: Rank,
+) -> Vec<u8> {
+    let side = 2 * distance + 1;
+    if width < side || height < side {
+        return vec![];
+    }
+    let (new_width, new_height) = (width - side + 1, height - side + 1);
+    let size = side * side;
+    let mut new_image = vec![255u8; new_width * new_height * 4];
+    let pixel = |x: usize, y: usize, channel: usize| data[y * stride + x * 4 + channel];
+
+    // Each band of output rows starts its own column histograms from the
+    // `side - 1` input rows above it (its halo).
+    bands::for_each_band(&mut new_image, new_width * 4, side, |rows, band| {
+        for channel in 0..3 {
+            let mut columns = vec![Histogram::new(); width];
+            for y in rows.start..rows.start + side - 1 {
+                for x in 0..width {
+                    columns[x].insert(pixel(x, y, channel));
+                }
+            }
+            for y in rows.clone() {
+                for x in 0..width {
+                    if y > rows.start {
+                        columns[x].remove(pixel(x, y - 1, channel));
+                    }
+                    columns[x].insert(pixel(x, y + side - 1, channel));
+                }
+
+                let mut window = Histogram::new();
+                for column in &columns[0..side] {
+                    window.add(column);
+                }
+                let row = (y - rows.start) * new_width;
+                for x in 0..new_width {
+                    if x > 0 {
+                        window.subtract(&columns[x - 1]);
+                        window.add(&columns[x + side - 1]);
+                    }
+                    band[(row + x) * 4 + channel] = select(&window, rank, size);
+                }
+            }
+        }
+    });
+    new_image
+}
+
+/// Rank filter ordering whole pixels by their packed 0xRRGGBB value.
+pub fn packed_rank_filter(
+    data: &[u8],
+    width: usize,
+    height: usize,
+    stride: usize,
+    distance: usize,
+    rank: Rank,
+) -> Vec<u8> {
+    let side = 2 * distance + 1;
+    if width < side || height < side {
+        return vec![];
+    }
+    let (new_width, new_height) = (width - side + 1, height - side + 1);
+    let size = side * side;
+    let mut keys = vec![0u32; width * height];
+    bands::for_each_band(&mut keys, width, 0, |rows, band| {
+        for (y, row) in rows.zip(band.chunks_exact_mut(width)) {
+            for (x, key) in row.iter_mut().enumerate() {
+                let i = y * stride + x * 4;
+                *key = rgb2hex(data[i], data[i + 1], data[i + 2]);
+            }
+        }
+    });
+
+    let mut new_image = vec![255u8; new_width * new_height * 4];
+    bands::for_each_band(&mut new_image, new_width * 4, side, |rows, band| {
+        let mut window: Vec<u32> = Vec::with_capacity(size);
+        for y in rows.clone() {
+            for x in 0..new_width {
+                window.clear();
+                for row in y..y + side {
+                    window.extend_from_slice(&keys[row * width + x..row * width + x + side]);
+                }
+                let color = match rank {
+                    Rank::Median => *window.select_nth_unstable(size / 2).1,
+                    Rank::Min => *window.iter().min().unwrap(),
+                    Rank::Max => *window.iter().max().unwrap(),
+                    Rank::Midpoint => {
+                        let low = *window.iter().min().unwrap();
+                        let high = *window.iter().max().unwrap();
+                        let half = |color: u32, shift: u32| ((color >> shift) as u8) / 2;
+                        rgb2hex(
+                            half(low, 16) + half(high, 16),
+                            half(low, 8) + half(high, 8),
+                            half(low, 0) + half(high, 0),
+                        )
+                    }
+                };
+                let i = ((y - rows.start) * new_width + x) * 4;
+                band[i..i + 3].copy_from_slice(&[
+                    (color >> 16) as u8,
+                    (color >> 8) as u8,
+                    color as u8,
+                ]);
+            }
+        }
+    });
+    new_image
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::pool::testing::{thread_counts, with_threads};
+
+    const RANKS: [Rank; 4] = [Rank::Median, Rank::Min, Rank::Max, Rank::Midpoint];
+
+    // (width, height, distance): one and two output rows (fewer than the
+    // threads), tall, wide and too small for the window.
+    const SIZES: [(usize, usize, usize); 6] = [
+        (7, 3, 1),
+        (5, 4, 1),
+        (40, 37, 1),
+        (23, 50, 2),
+        (61, 12, 3),
+        (2, 2, 1),
+    ];
+
+    /// Pseudo-random RGBA rows with 8 bytes of padding each.
+    fn image(width: usize, height: usize) -> (Vec<u8>, usize) {
+        let stride = width * 4 + 8;
+        let mut state = 12345u32;
+        let data = (0..stride * height)
+            .map(|_| {
+                state = state.wrapping_mul(1103515245).wrapping_add(12345);
+                (state >> 16) as u8
+            })
+            .collect();
+        (data, stride)
+    }
+
+    /// (min, median, max) of a window.
+    fn pick<T: Copy + Ord>(window: &mut Vec<T>) -> (T, T, T) {
+        window.sort();
+        (
+            window[0],
+            window[window.len() / 2],
+            window[window.len() - 1],
+        )
+    }
+
+    /// Serial per-pixel reference, sorting every window.
+    fn reference(
+        data: &[u8],
+        width: usize,
+        height: usize,
+        stride: usize,
+        distance: usize,
+        rank: Rank,
+        packed: bool,
+    ) -> Vec<u8> {
+        let side = 2 * distance + 1;
+        if width < side || height < side {
+            return vec![];
+        }
+        let mut output = vec![];
+        for y in 0..height - side + 1 {
+            for x in 0..width - side + 1 {
+                let pixels: Vec<&[u8]> = (0..side * side)
+                    .map(|i| &data[(y + i / side) * stride + (x + i % side) * 4..][..3])
+                    .collect();
+                if packed {
+                    let mut keys: Vec<u32> =
+                        pixels.iter().map(|p| rgb2hex(p[0], p[1], p[2])).collect();
+                    let (low, median, high) = pick(&mut keys);
+                    let channel = |color: u32, shift: u32| (color >> shift) as u8;
+                    let color = |c: u32| [channel(c, 16), channel(c, 8), channel(c, 0)];
+                    output.extend(match rank {
+                        Rank::Median => color(median),
+                        Rank::Min => color(low),
+                        Rank::Max => color(high),
+                        Rank::Midpoint => {
+                            let (l, h) = (color(low), color(high));
+                            [
+                                l[0] / 2 + h[0] / 2,
+                                l[1] / 2 + h[1] / 2,
+                                l[2] / 2 + h[2] / 2,
+                            ]
+                        }
+                    });
+                } else {
+                    for channel in 0..3 {
+                        let mut values: Vec<u8> = pixels.iter().map(|p| p[channel]).collect();
+                        let (low, median, high) = pick(&mut values);
+                        output.push(match rank {
+                            Rank::Median => median,
+                            Rank::Min => low,
+                            Rank::Max => high,
+                            Rank::Midpoint => low / 2 + high / 2,
+                        });
+                    }
+                }
+                output.push(255);
+            }
+        }
+        output
+    }
+
+    fn check(filter: fn(&[u8], usize, usize, usize, usize, Rank) -> Vec<u8>, packed: bool) {
+        for (width, height, distance) in SIZES {
+            let (data, stride) = image(width, height);
+            for rank in RANKS {
+                let expected = reference(&data, width, height, stride, distance, rank, packed);
+                for threads in thread_counts() {
+                    let banded = with_threads(threads, || {
+                        filter(&data, width, height, stride, distance, rank)
+                    });
+                    assert!(
+                        banded == expected,
+                        "{}x{} r{}, {} threads",
+                        width,
+                        height,
+                        distance,
+                        threads
+                    );
+                }
+            }
+        }
+    }
+
+    #[test]
+    fn rank_filter_matches_serial_reference() {
+        check(rank_filter, false);
+    }
+
+    #[test]
+    fn packed_rank_filter_matches_serial_reference() {
+        check(packed_rank_filter, true);
+    }
+}
@@ -0,0 +1,277 @@
+use crate::common::{Hex, Rgb};
+use crate::operations::{count_neighbors, transitions};
+
+// Zhang-Suen thinning driven by a frontier of candidate pixels.
+//
+// The image is bit packed, 64 pixels per word. A pixel's deletion test only
+// depends on its 8 neighbors, packed into one byte (bit i - 1 holds P(i+1)
+// of the paper: N, NE, E, SE, S, SW, W, NW), so both sub-steps are a lookup
+// in a 256-entry table built once from `count_neighbors` and `transitions`.
+//
+// A pixel that survived a sub-step can only become deletable in that same
+// sub-step once one of its neighbors is deleted. Each sub-step therefore
+// keeps a queue of pixels to re-examine: every foreground pixel at first,
+// then only the neighbors of deleted pixels. The result is the same as
+// rescanning the whole image every sub-step.
+
+struct BitImage {
+    words: usize,
+    bits: Vec<u64>,
+}
+
+impl BitImage {
+    fn new(width: usize, height: usize) -> BitImage {
+        let words = (width + 63) / 64;
+        BitImage { words, bits: vec![0; words * height] }
+    }
+
+    fn word(&self, x: usize, y: usize) -> (usize, u64) {
+        (y * self.words + x / 64, 1u64 << (x % 64))
+    }
+
+    fn get(&self, x: usize, y: usize) -> bool {
+        let (word, bit) = self.word(x, y);
+        self.bits[word] & bit != 0
+    }
+
+    fn set(&mut self, x: usize, y: usize) {
+        let (word, bit) = self.word(x, y);
+        self.bits[word] |= bit;
+    }
+
+    fn clear(&mut self, x: usize, y: usize) {
+        let (word, bit) = self.word(x, y);
+        self.bits[word] &= !bit;
+    }
+
+    // Neighbors of an inner pixel, clockwise from north.
+    fn neighbors(&self, x: usize, y: usize) -> u8 {
+        let offsets = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)];
+        offsets.iter().enumerate().fold(0u8, |code, (i, (dx, dy))| {
+            let (nx, ny) = ((x as isize + dx) as usize, (y as isize + dy) as usize);
+            code | (self.get(nx, ny) as u8) << i
+        })
+    }
+}
+
+// deletable[step][code]: whether a pixel with neighbors `code` is removed
+// in the first (0) or second (1) sub-step.
+fn deletable_tables() -> [[bool; 256]; 2] {
+    let mut tables = [[false; 256]; 2];
+    for code in 0..256usize {
+        let mut p = vec![true];
+        p.extend((0..8).map(|i| code >> i & 1 == 1));
+        let neighbors = count_neighbors(&p);
+        let shape = (2..=6).contains(&neighbors) && transitions(&p) == 1;
+        tables[0][code] = shape && !(p[1] && p[3] && p[5]) && !(p[3] && p[5] && p[7]);
+        tables[1][code] = shape && !(p[1] && p[3] && p[7]) && !(p[1] && p[5] && p[7]);
+    }
+    tables
+}
+
+pub fn zhang_suen_thinning(image: &[Rgb], width: usize, height: usize) -> Vec<Hex> {
+    // Border pixels stay background, so every foreground pixel has 8 neighbors.
+    let mut foreground = BitImage::new(width, height);
+    let mut frontier: [Vec<(u32, u32)>; 2] = [vec![], vec![]];
+    for y in 1..height.saturating_sub(1) {
+        for x in 1..width.saturating_sub(1) {
+            if image[y * width + x] != [0, 0, 0] {
+                foreground.set(x, y);
+                frontier[0].push((x as u32, y as u32));
+            }
+        }
+    }
+    frontier[1] = frontier[0].clone();
+    let mut queued = [BitImage::new(width, height), BitImage::new(width, height)];
+    frontier.iter().zip(queued.iter_mut()).for_each(|(pixels, queued)| {
+        pixels.iter().for_each(|&(x, y)| queued.set(x as usize, y as usize))
+    });
+
+    let tables = deletable_tables();
+    loop {
+        let mut changed = false;
+        for step in 0..2 {
+            let candidates = std::mem::take(&mut frontier[step]);
+            // All tests see the image as it was before this sub-step.
+            let deleted: Vec<(usize, usize)> = candidates
+                .iter()
+                .map(|&(x, y)| (x as usize, y as usize))
+                .filter(|&(x, y)| {
+                    queued[step].clear(x, y);
+                    foreground.get(x, y) && tables[step][foreground.neighbors(x, y) as usize]
+                })
+                .collect();
+            deleted.iter().for_each(|&(x, y)| foreground.clear(x, y));
+            changed |= !deleted.is_empty();
+
+            for &(x, y) in &deleted {
+                for ny in y - 1..=y + 1 {
+                    for nx in x - 1..=x + 1 {
+                        if !foreground.get(nx, ny) {
+                            continue;
+                        }
+                        for (pixels, queued) in frontier.iter_mut().zip(queued.iter_mut()) {
+                            if !queued.get(nx, ny) {
+                                queued.set(nx, ny);
+                                pixels.push((nx as u32, ny as u32));
+                            }
+                        }
+                    }
+                }
+            }
+        }
+        if !changed {
+            break;
+        }
+    }
+
+    let mut new_image: Vec<Hex> = Vec::with_capacity(width * height);
+    for y in 0..height {
+        for x in 0..width {
+            new_image.push(if foreground.get(x, y) { 0xFFFFFFFF } else { 0xFF000000 });
+        }
+    }
+    new_image
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    // The paper's test on a 3x3 patch, grid[y][x], with the center at (1, 1).
+    fn reference_deletable(grid: &[[bool; 3]; 3], step: usize) -> bool {
+        let p = vec![
+            grid[1][1],
+            grid[0][1],
+            grid[0][2],
+            grid[1][2],
+            grid[2][2],
+            grid[2][1],
+            grid[2][0],
+            grid[1][0],
+            grid[0][0],
+        ];
+        let (p2, p4, p6, p8) = (p[1], p[3], p[5], p[7]);
+        let neighbors = count_neighbors(&p);
+        let shape = (2..=6).contains(&neighbors) && transitions(&p) == 1;
+        if step == 0 {
+            shape && !(p2 && p4 && p6) && !(p4 && p6 && p8)
+        } else {
+            shape && !(p2 && p4 && p8) && !(p2 && p6 && p8)
+        }
+    }
+
+    // Rescans every pixel in every sub-step.
+    fn reference_thinning(image: &[Rgb], width: usize, height: usize) -> Vec<Hex> {
+        let mut foreground = vec![false; width * height];
+        for y in 1..height.saturating_sub(1) {
+            for x in 1..width.saturating_sub(1) {
+                foreground[y * width + x] = image[y * width + x] != [0, 0, 0];
+            }
+        }
+        loop {
+            let mut changed = false;
+            for step in 0..2 {
+                let mut deleted = vec![];
+                for y in 1..height.saturating_sub(1) {
+                    for x in 1..width.saturating_sub(1) {
+                        if !foreground[y * width + x] {
+                            continue;
+                        }
+                        let mut grid = [[false; 3]; 3];
+                        for (dy, row) in grid.iter_mut().enumerate() {
+                            for (dx, cell) in row.iter_mut().enumerate() {
+                                *cell = foreground[(y + dy - 1) * width + x + dx - 1];
+                            }
+                        }
+                        if reference_deletable(&grid, step) {
+                            deleted.push(y * width + x);
+                        }
+                    }
+                }
+                deleted.iter().for_each(|&i| foreground[i] = false);
+                changed |= !deleted.is_empty();
+            }
+            if !changed {
+                break;
+            }
+        }
+        foreground.iter().map(|&on| if on { 0xFFFFFFFF } else { 0xFF000000 }).collect()
+    }
+
+    // Overlapping filled rectangles and scattered pixels, from a fixed seed.
+    fn drawing(width: usize, height: usize, seed: u64) -> Vec<Rgb> {
+        let mut state = seed;
+        let mut next = |limit: usize| {
+            state = state.wrapping_mul(6364136223846793005).wrapping_add(1442695040888963407);
+            (state >> 33) as usize % limit.max(1)
+        };
+        let mut image = vec![[0u8; 3]; width * height];
+        for _ in 0..6 {
+            let (x0, y0) = (next(width), next(height));
+            let (x1, y1) = ((x0 + 1 + next(width / 2)).min(width), (y0 + 1 + next(height / 2)).min(height));
+            for y in y0..y1 {
+                for x in x0..x1 {
+                    image[y * width + x] = [255, 255, 255];
+                }
+            }
+        }
+        for _ in 0..width * height / 20 {
+            let i = next(width * height);
+            image[i] = [255, 255, 255];
+        }
+        image
+    }
+
+    #[test]
+    fn tables_match_the_paper_conditions() {
+        let tables = deletable_tables();
+        let positions = [(0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (2, 0), (1, 0), (0, 0)];
+        for code in 0..256usize {
+            let mut grid = [[false; 3]; 3];
+            grid[1][1] = true;
+            let mut image = BitImage::new(3, 3);
+            image.set(1, 1);
+            for (i, &(y, x)) in positions.iter().enumerate() {
+                if code >> i & 1 == 1 {
+                    grid[y][x] = true;
+                    image.set(x, y);
+                }
+            }
+            assert_eq!(image.neighbors(1, 1) as usize, code);
+            for step in 0..2 {
+                assert_eq!(tables[step][code], reference_deletable(&grid, step), "code {code:#010b}");
+            }
+        }
+    }
+
+    #[test]
+    fn frontier_matches_full_rescan() {
+        let sizes = [(1, 1), (2, 5), (3, 3), (17, 5), (5, 31), (64, 9), (70, 130), (129, 65)];
+        for (seed, &(width, height)) in sizes.iter().enumerate() {
+            let image = drawing(width, height, seed as u64);
+            assert_eq!(
+                zhang_suen_thinning(&image, width, height),
+                reference_thinning(&image, width, height),
+                "{width}x{height}"
+            );
+        }
+    }
+
+    #[test]
+    fn thins_a_thick_bar_to_a_line() {
+        let (width, height) = (40, 11);
+        let mut image = vec![[0u8; 3]; width * height];
+        for y in 2..9 {
+            for x in 3..37 {
+                image[y * width + x] = [255, 255, 255];
+            }
+        }
+        let result = zhang_suen_thinning(&image, width, height);
+        assert_eq!(result, reference_thinning(&image, width, height));
+        for x in 8..32 {
+            let column = (0..height).filter(|&y| result[y * width + x] == 0xFFFFFFFF).count();
+            assert_eq!(column, 1, "column {x}");
+        }
+    }
+}
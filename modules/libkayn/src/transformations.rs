@@ -1,134 +1,103 @@
-use crate::common::{rgb2hex, Hex, Image, Rgb, Rgba};
+use crate::common::{rgb2hex, Hex, Image, Rgb};
+use crate::bands;
+use crate::pool;
 use std::f32::consts::PI;
-use std::thread;
 
-pub fn normalize_float(transformed: &Vec<Vec<f32>>) -> Image {
+// Gray levels stretched over the range of the values at least `border`
+// pixels from the edges; the border itself comes out black.
+pub fn normalize_float(transformed: &Vec<Vec<f32>>, border: usize) -> Image {
     let width = transformed.len();
-    let height = transformed[0].len();
-    let mut new_image: Image = vec![vec![Rgba::default(); height]; width];
+    let height = transformed.first().map_or(0, |column| column.len());
+    let (columns, rows) = (border..width.saturating_sub(border), border..height.saturating_sub(border));
+    let inside = |x: usize, y: usize| columns.contains(&x) && rows.contains(&y);
+    let partial = |range: std::ops::Range<usize>| {
+        range
+            .filter(|x| columns.contains(x))
+            .flat_map(|x| transformed[x][rows.clone()].iter())
+            .fold((f32::MAX, f32::MIN), |(min, max), v| (min.min(*v), max.max(*v)))
+    };
+    let combine = |a: (f32, f32), b: (f32, f32)| (a.0.min(b.0), a.1.max(b.1));
+    let (min, max) = bands::reduce(width, partial, combine).unwrap_or((0.0, 1.0));
 
-    let [mut min, mut max] = [std::f32::MIN, std::f32::MAX];
-    for x in 0..width {
-        for y in 0..height {
-            let value = transformed[x][y];
-            if value < min {
-                min = value;
-            } else if value > max {
-                max = value;
+    let mut image: Image = vec![vec![[0, 0, 0, 255]; height]; width];
+    bands::for_each_band(&mut image, 1, 0, |band_columns, band| {
+        for (x, column) in band_columns.zip(band.iter_mut()) {
+            for (y, pixel) in column.iter_mut().enumerate().filter(|&(y, _)| inside(x, y)) {
+                let value = (255.0 * (transformed[x][y] - min) / (max - min)) as u8;
+                *pixel = [value, value, value, 255];
             }
         }
-    }
+    });
+    image
+}
 
-    for x in 0..width {
-        for y in 0..height {
-            let value = (255.0 * (transformed[x][y] - min) / (max - min)) as u8;
-            new_image[x][y] = [value, value, value, 255];
+pub fn dct_multithread(image: &[Rgb], width: u32, height: u32) -> (Vec<Hex>, Vec<f32>) {
+    // One column of coefficients (fixed u, every v) per job.
+    let mut coeff = vec![0f32; (width * height) as usize];
+    pool::for_each_chunk(&mut coeff, height as usize, |u, column| {
+        let u = u as u32;
+        let ci = match u {
+            0 => (1.0 / width as f32).sqrt(),
+            _ => (2.0 / width as f32).sqrt(),
+        };
+        for v in 0..height {
+            let cj = match v {
+                0 => (1.0 / height as f32).sqrt(),
+                _ => (2.0 / height as f32).sqrt(),
+            };
+            let mut sum = 0.0;
+            for x in 0..width {
+                for y in 0..height {
+                    let pixel = image[(y * width + x) as usize][0] as f32;
+                    let dctl = {
+                        pixel
+                            * ((2.0 * x as f32 + 1.0) * u as f32 * PI / (2.0 * width as f32))
+                                .cos()
+                            * ((2.0 * y as f32 + 1.0) * v as f32 * PI / (2.0 * height as f32))
+                                .cos()
+                    };
+                    sum += dctl;
+                }
+            }
+            column[v as usize] = sum * ci * cj;
         }
-    }
-
-    new_image
+    });
+    let normalized = freq_normalize(&coeff);
+    (normalized, coeff)
 }
 
-pub fn dct_multithread(image: Vec<Rgb>, width: u32, height: u32) -> (Vec<Hex>, Vec<f32>) {
-    let mut coeff: Vec<f32> = vec![];
-    let num_cpus = num_cpus::get() as u32;
-    let mut handles = vec![];
-    let mut i = 0;
-    while i < num_cpus {
-        let image_clone = image.clone(); // rust forces us to not do race conditions
-        handles.push(thread::spawn(move || {
-            let mut coeff_clone = vec![];
-            let (mut ci, mut cj): (f32, f32);
-            // Divide the image into chunks. Each chunk is a vector of pixels.
-            for u in (i * width / num_cpus)..((i + 1) * width / num_cpus) {
+pub fn idct_multithread(coeff: &[f32], width: u32, height: u32) -> Vec<Hex> {
+    // One column of pixels (fixed x, every y) per job.
+    let mut new_image: Vec<Hex> = vec![0; (width * height) as usize];
+    pool::for_each_chunk(&mut new_image, height as usize, |x, column| {
+        let x = x as u32;
+        for y in 0..height {
+            let mut sum = 0.0;
+
+            for u in 0..width {
                 for v in 0..height {
-                    ci = match u {
+                    let ci = match u {
                         0 => (1.0 / width as f32).sqrt(),
                         _ => (2.0 / width as f32).sqrt(),
                     };
-                    cj = match v {
+                    let cj = match v {
                         0 => (1.0 / height as f32).sqrt(),
                         _ => (2.0 / height as f32).sqrt(),
                     };
-                    let mut sum = 0.0;
-                    for x in 0..width {
-                        for y in 0..height {
-                            let pixel = image_clone[(y * width + x) as usize][0] as f32;
-                            let dctl = {
-                                pixel
-                                    * ((2.0 * x as f32 + 1.0) * u as f32 * PI
-                                        / (2.0 * width as f32))
-                                        .cos()
-                                    * ((2.0 * y as f32 + 1.0) * v as f32 * PI
-                                        / (2.0 * height as f32))
-                                        .cos()
-                            };
-                            sum += dctl;
-                        }
-                    }
-                    let value = sum * ci * cj;
-                    coeff_clone.push(value);
-                }
-            }
-            coeff_clone
-        }));
-        i += 1;
-    }
-    for h in handles {
-        coeff.extend(h.join().unwrap());
-    }
-    let normalized = freq_normalize(&coeff);
-    (normalized, coeff)
-}
-
-pub fn idct_multithread(coeff: Vec<f32>, width: u32, height: u32) -> Vec<Hex> {
-    let mut new_image: Vec<Hex> = vec![];
-    let num_cpus = num_cpus::get() as u32;
-    let mut handles = vec![];
-    let mut i = 0;
-    while i < num_cpus {
-        let coeff_clone = coeff.clone();
-        handles.push(thread::spawn(move || {
-            let mut new_image_clone = vec![];
-            let (mut ci, mut cj): (f32, f32);
-            for x in (i * width / num_cpus)..((i + 1) * width / num_cpus) {
-                for y in 0..height {
-                    let mut sum = 0.0;
-
-                    for u in 0..width {
-                        for v in 0..height {
-                            ci = match u {
-                                0 => (1.0 / width as f32).sqrt(),
-                                _ => (2.0 / width as f32).sqrt(),
-                            };
-                            cj = match v {
-                                0 => (1.0 / height as f32).sqrt(),
-                                _ => (2.0 / height as f32).sqrt(),
-                            };
-                            let dctl = {
-                                coeff_clone[(v * width + u) as usize]
-                                    * ((2.0 * x as f32 + 1.0) * u as f32 * PI
-                                        / (2.0 * width as f32))
-                                        .cos()
-                                    * ((2.0 * y as f32 + 1.0) * v as f32 * PI
-                                        / (2.0 * height as f32))
-                                        .cos()
-                            };
-                            sum += dctl * ci * cj;
-                        }
-                    }
-                    let rounded = sum.round() as u8;
-                    let color = rgb2hex(rounded, rounded, rounded);
-                    new_image_clone.push(color);
+                    let dctl = {
+                        coeff[(v * width + u) as usize]
+                            * ((2.0 * x as f32 + 1.0) * u as f32 * PI / (2.0 * width as f32))
+                                .cos()
+                            * ((2.0 * y as f32 + 1.0) * v as f32 * PI / (2.0 * height as f32))
+                                .cos()
+                    };
+                    sum += dctl * ci * cj;
                 }
             }
-            new_image_clone
-        }));
-        i += 1;
-    }
-    for h in handles {
-        new_image.extend(h.join().unwrap());
-    }
+            let rounded = sum.round() as u8;
+            column[y as usize] = rgb2hex(rounded, rounded, rounded);
+        }
+    });
     new_image
 }
 
@@ -167,7 +136,7 @@ pub fn freq_highpass(
     (normalized, new_coeff)
 }
 
-pub fn freq_normalize(coeff: &Vec<f32>) -> Vec<Hex> {
+pub fn freq_normalize(coeff: &[f32]) -> Vec<Hex> {
     // Similar to CLIP in NumPy.
     let mut new_coeff: Vec<f32> = vec![];
     for i in 0..coeff.len() {
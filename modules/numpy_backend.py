@@ -0,0 +1,297 @@
+import numpy as np
+import modules.convolution as conv
+import modules.rank as rank
+import modules.morphology as morph
+import modules.otsu as otsu
+import modules.thinning as thinning
+
+# Vectorized counterparts of the libkayn operations. Every function
+# takes a (height, width, 4) RGBA uint8 array and returns a new one with the
+# same shape, keeping the alpha channel untouched. Signatures mirror libkayn
+# so both modules can be used interchangeably by Filters. Area filters
+# return only the region where the whole mask fits.
+
+LEVELS = np.arange(256)
+
+
+def _new_image_like(image: np.ndarray) -> np.ndarray:
+    new_image = np.empty(image.shape, dtype=np.uint8)
+    new_image[..., 3] = image[..., 3]
+    return new_image
+
+
+def round_half_away(values: np.ndarray) -> np.ndarray:
+    """Round halves away from zero, as Rust's f32::round (np.round goes to even)."""
+    return np.copysign(np.floor(np.abs(values) + 0.5), values)
+
+
+def stretch_table(lo: int, hi: int) -> np.ndarray:
+    """Levels lo..hi stretched to 0-255, with libkayn's float32 arithmetic."""
+    levels = LEVELS[lo : hi + 1].astype(np.float32)
+    return round_half_away((levels - lo) / np.float32(hi - lo) * np.float32(255))
+
+
+def apply_lut(image: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """
+    Map the RGB channels through a lookup table.
+    `lut` is either a single (256,) table or one table per channel (3, 256).
+    """
+    lut = np.asarray(lut, dtype=np.uint8)
+    luts = lut if lut.ndim == 2 else (lut, lut, lut)
+    new_image = _new_image_like(image)
+    for channel in range(3):
+        new_image[..., channel] = luts[channel][image[..., channel]]
+    return new_image
+
+
+def grayscale(image: np.ndarray) -> np.ndarray:
+    # Channel by channel; a sum over the last axis is several times slower.
+    gray = image[..., 0].astype(np.uint16) + image[..., 1] + image[..., 2]
+    gray //= 3
+    new_image = _new_image_like(image)
+    new_image[..., :3] = gray[..., np.newaxis]
+    return new_image
+
+
+def negative(image: np.ndarray) -> np.ndarray:
+    return apply_lut(image, 255 - LEVELS)
+
+
+def binarize(image: np.ndarray, threshold: int) -> np.ndarray:
+    return apply_lut(image, np.where(LEVELS < threshold, 0, 255))
+
+
+def limiarize(image: np.ndarray, threshold: int) -> np.ndarray:
+    return apply_lut(image, np.where(LEVELS < threshold, 0, LEVELS))
+
+
+# Otsu: threshold from the gray histogram, applied to the RGB channels.
+def otsu_binarize(image: np.ndarray) -> np.ndarray:
+    return binarize(image, otsu.threshold(otsu.gray_histogram(image)))
+
+
+def otsu_limiarize(image: np.ndarray) -> np.ndarray:
+    return limiarize(image, otsu.threshold(otsu.gray_histogram(image)))
+
+
+def otsu_multilevel(image: np.ndarray, classes: int = 3) -> np.ndarray:
+    levels = otsu.thresholds(otsu.gray_histogram(image), classes)
+    return apply_lut(image, otsu.quantization_lut(levels))
+
+
+# Local thresholds from the mean m and deviation s of a size x size window
+# around every gray pixel; pixels below their threshold turn black.
+def _local_binarize(image: np.ndarray, size: int, threshold: callable) -> np.ndarray:
+    gray = otsu.gray_levels(image)
+    mean, deviation = conv.local_statistics(gray, size)
+    new_image = _new_image_like(image)
+    new_image[..., :3] = np.where(gray < threshold(mean, deviation), 0, 255)[..., np.newaxis]
+    return new_image
+
+
+def niblack_binarize(image: np.ndarray, size: int = 15, k: float = -0.2) -> np.ndarray:
+    return _local_binarize(image, size, lambda m, s: m + k * s)
+
+
+def sauvola_binarize(image: np.ndarray, size: int = 15, k: float = 0.5, r: float = 128) -> np.ndarray:
+    return _local_binarize(image, size, lambda m, s: m * (1 + k * (s / r - 1)))
+
+
+def bradley_binarize(image: np.ndarray, size: int = 15, t: float = 15) -> np.ndarray:
+    # Black when t percent darker than the window mean.
+    return _local_binarize(image, size, lambda m, s: m * (1 - t / 100))
+
+
+def dynamic_compression(image: np.ndarray, constant: float, gamma: float) -> np.ndarray:
+    levels = LEVELS.astype(np.float32)
+    compressed = np.float32(constant) * levels ** np.float32(gamma)
+    # Same saturating cast as Rust's `as u8`: NaN -> 0, clamp, truncate.
+    compressed = np.clip(np.nan_to_num(compressed, nan=0.0), 0, 255)
+    return normalize(apply_lut(image, compressed.astype(np.uint8)))
+
+
+def normalize(image: np.ndarray) -> np.ndarray:
+    rgb = image[..., :3]
+    low, high = rgb.min(axis=(0, 1)), rgb.max(axis=(0, 1))
+    luts = np.zeros((3, 256), dtype=np.uint8)
+    for channel in range(3):
+        lo, hi = int(low[channel]), int(high[channel])
+        if hi > lo:
+            luts[channel, lo : hi + 1] = stretch_table(lo, hi)
+    return apply_lut(image, luts)
+
+
+def equalize(image: np.ndarray) -> np.ndarray:
+    histogram = np.bincount(image[..., :3].ravel(), minlength=256)
+    cumulative = np.cumsum(histogram, dtype=np.int64)
+    lut = cumulative * 255 // cumulative[-1]
+    return apply_lut(image, lut)
+
+
+def split_color_channel(image: np.ndarray, channel: int) -> np.ndarray:
+    new_image = _new_image_like(image)
+    new_image[..., :3] = 0
+    if 0 <= channel < 3:
+        new_image[..., channel] = image[..., channel]
+    return new_image
+
+
+def _gray_levels_lut() -> np.ndarray:
+    # Same ramp as libkayn: black, blue, cyan, green, yellow, red.
+    gray = LEVELS
+    lut = np.zeros((256, 3), dtype=np.int64)
+    ramp = (gray % 64) * 4
+    quarter = gray // 64
+    lut[:, 0] = np.where(quarter == 3, ramp, 0)
+    lut[:, 1] = np.select([quarter == 1, quarter == 2, quarter == 3], [ramp, 255, 255], 0)
+    lut[:, 2] = np.select([quarter == 0, quarter == 1, quarter == 2], [ramp, 255, 255 - ramp], 0)
+    return lut.astype(np.uint8)
+
+
+GRAY_TO_COLOR = _gray_levels_lut()
+
+
+def gray_to_color_scale(image: np.ndarray) -> np.ndarray:
+    new_image = np.full(image.shape, 255, dtype=np.uint8)
+    new_image[..., :3] = GRAY_TO_COLOR[otsu.gray_levels(image)]
+    return new_image
+
+
+# HSL as libkayn stores it: h in 0-239, s and l in 0-240, float32 math and
+# truncating casts, so both backends give the same pixels.
+def _rgb_to_hsl(rgb: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    r, g, b = (rgb[..., c].astype(np.float32) / np.float32(255) for c in range(3))
+    mx, mn = np.maximum(r, np.maximum(g, b)), np.minimum(r, np.minimum(g, b))
+    l = (mx + mn) / np.float32(2)
+    d = mx - mn
+    with np.errstate(divide="ignore", invalid="ignore"):
+        h = np.select(
+            [d == 0, mx == r, mx == g],
+            [np.float32(0), np.fmod((g - b) / d, np.float32(6)), (b - r) / d + 2],
+            (r - g) / d + 4,
+        ).astype(np.float32)
+        s = np.where(d != 0, d / (1 - np.abs(2 * l - 1)), np.float32(0)).astype(np.float32)
+    h *= np.float32(40)
+    h[h < 0] += np.float32(240)
+    as_u8 = lambda v: np.clip(np.nan_to_num(v, nan=0.0), 0, 255).astype(np.uint8)
+    return as_u8(h), as_u8(s * np.float32(240)), as_u8(l * np.float32(240))
+
+
+def _hsl_to_rgb(h: np.ndarray, s: np.ndarray, l: np.ndarray) -> np.ndarray:
+    h, s, l = (channel.astype(np.float32) for channel in (h, s, l))
+    s, l = s / np.float32(240), l / np.float32(240)
+    c = (1 - np.abs(2 * l - 1)) * s
+    x = c * (1 - np.abs(np.fmod(h / np.float32(40), np.float32(2)) - 1))
+    m = l - c / 2
+    zero = np.zeros_like(c)
+    sector = np.minimum(h // 40, 5).astype(np.intp)
+    channels = np.stack(
+        [
+            np.choose(sector, [c, x, zero, zero, x, c]),
+            np.choose(sector, [x, c, c, x, zero, zero]),
+            np.choose(sector, [zero, zero, x, c, c, x]),
+        ],
+        axis=-1,
+    )
+    rgb = (channels + m[..., np.newaxis]) * np.float32(255)
+    return np.clip(np.nan_to_num(rgb, nan=0.0), 0, 255).astype(np.uint8)
+
+
+def equalize_hsl(image: np.ndarray) -> np.ndarray:
+    h, s, l = _rgb_to_hsl(image[..., :3])
+    cumulative = np.cumsum(np.bincount(l.ravel(), minlength=241)[:241], dtype=np.int64)
+    lut = cumulative * 240 // max(int(cumulative[-1]), 1)
+    new_image = np.full(image.shape, 255, dtype=np.uint8)
+    new_image[..., :3] = _hsl_to_rgb(h, s, lut[l])
+    return new_image
+
+
+def resize_nearest_neighbor(image: np.ndarray, new_width: int, new_height: int) -> np.ndarray:
+    h, w = image.shape[:2]
+    # Same float32 ratios as libkayn, so both backends pick the same pixels.
+    x = (np.arange(new_width, dtype=np.float32) * np.float32(w / new_width)).astype(np.intp)
+    y = (np.arange(new_height, dtype=np.float32) * np.float32(h / new_height)).astype(np.intp)
+    new_image = image[y[:, np.newaxis], x].copy()
+    new_image[..., 3] = 255
+    return new_image
+
+
+# Both backends clamp the rounded sums and then normalize over the valid
+# region only. The engines add the products in different orders, so a sum
+# landing on .5 can still round one level apart between them.
+def convolute(image: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    mask = np.asarray(mask, dtype=np.float64)
+    side = int(round(mask.size ** 0.5))
+    filtered = conv.correlate(image[..., :3].astype(np.float32), mask.reshape(side, side))
+    new_image = np.full(filtered.shape[:2] + (4,), 255, dtype=np.uint8)
+    new_image[..., :3] = np.clip(round_half_away(filtered), 0, 255)
+    return normalize(new_image)
+
+
+SOBEL_X = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]]) / np.float64(4)
+SOBEL_Y = SOBEL_X.T
+
+
+def sobel_magnitude(horizontal: np.ndarray, vertical: np.ndarray) -> np.ndarray:
+    """Gray gradient magnitude of two Sobel responses, scaled to 0-255."""
+    gray = lambda image: otsu.gray_levels(image).astype(np.float32)
+    magnitude = np.hypot(gray(horizontal), gray(vertical))
+    low, high = (magnitude.min(), magnitude.max()) if magnitude.size else (0, 0)
+    scaled = np.float32(255) * (magnitude - low) / (high - low) if high > low else magnitude * 0
+    new_image = np.full(magnitude.shape + (4,), 255, dtype=np.uint8)
+    new_image[..., :3] = scaled.astype(np.uint8)[..., np.newaxis]
+    return new_image
+
+
+def sobel(image: np.ndarray) -> np.ndarray:
+    return sobel_magnitude(convolute(image, SOBEL_X), convolute(image, SOBEL_Y))
+
+
+def median(image: np.ndarray, distance: int, per_channel: bool = True) -> np.ndarray:
+    return rank.rank_filter(image, 2 * distance + 1, "median", per_channel)
+
+
+def noise_reduction_max(image: np.ndarray, distance: int, per_channel: bool = True) -> np.ndarray:
+    return rank.rank_filter(image, 2 * distance + 1, "max", per_channel)
+
+
+def noise_reduction_min(image: np.ndarray, distance: int, per_channel: bool = True) -> np.ndarray:
+    return rank.rank_filter(image, 2 * distance + 1, "min", per_channel)
+
+
+def noise_reduction_midpoint(image: np.ndarray, distance: int, per_channel: bool = True) -> np.ndarray:
+    return rank.rank_filter(image, 2 * distance + 1, "midpoint", per_channel)
+
+
+def _morphology(image: np.ndarray, operation, size, shape: str) -> np.ndarray:
+    new_image = _new_image_like(image)
+    new_image[..., :3] = operation(image[..., :3], size, shape)
+    return new_image
+
+
+def erosion(image: np.ndarray, size=3, shape: str = "cross") -> np.ndarray:
+    return _morphology(image, morph.erode, size, shape)
+
+
+def dilation(image: np.ndarray, size=3, shape: str = "cross") -> np.ndarray:
+    return _morphology(image, morph.dilate, size, shape)
+
+
+def opening(image: np.ndarray, size=3, shape: str = "cross") -> np.ndarray:
+    return _morphology(image, morph.opening, size, shape)
+
+
+def closing(image: np.ndarray, size=3, shape: str = "cross") -> np.ndarray:
+    return _morphology(image, morph.closing, size, shape)
+
+
+def top_hat(image: np.ndarray, size=3, shape: str = "cross") -> np.ndarray:
+    return _morphology(image, morph.top_hat, size, shape)
+
+
+def zhang_suen_thinning(image: np.ndarray) -> np.ndarray:
+    # White skeleton of the non-black pixels on black, opaque like libkayn.
+    skeleton = thinning.zhang_suen((image[..., :3] != 0).any(axis=2))
+    new_image = np.full(image.shape, 255, dtype=np.uint8)
+    new_image[..., :3] = np.where(skeleton, 255, 0)[..., np.newaxis]
+    return new_image
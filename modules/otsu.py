@@ -0,0 +1,89 @@
+import numpy as np
+
+# Otsu thresholding from a gray histogram. The histogram is built once, in
+# one pass over the pixels; everything after works on its 256 bins.
+#
+# Two classes: with cumulative sums ω(t) (count of levels <= t) and μ(t)
+# (their first moment), the between-class variance of every threshold is
+# proportional to (μT ω(t) - μ(t) N)² / (ω(t) (N - ω(t))), so all 256
+# candidates come from one vectorized expression instead of re-summing the
+# histogram per candidate.
+#
+# More classes: the between-class variance is, up to a constant, a sum of
+# S(a, b)² / P(a, b) over the classes [a, b], with P and S the weight and
+# first moment of the levels a..b. Those terms are precomputed once as a
+# 256 x 256 lookup table, and the best split into k classes follows by
+# dynamic programming over it in O(k * 256²), rather than trying all
+# C(255, k - 1) threshold tuples.
+#
+# Thresholds are the last level of each class but the last, as in libkayn:
+# a pixel at level t belongs to the class below t.
+
+
+def gray_levels(image: np.ndarray) -> np.ndarray:
+    """Gray levels (r + g + b) / 3 of an RGBA image, as libkayn's rgb2gray."""
+    gray = image[..., 0].astype(np.uint16) + image[..., 1] + image[..., 2]
+    gray //= 3
+    return gray
+
+
+def gray_histogram(image: np.ndarray) -> np.ndarray:
+    return np.bincount(gray_levels(image).ravel(), minlength=256)
+
+
+def threshold(histogram: np.ndarray) -> int:
+    counts = np.asarray(histogram, dtype=np.int64)
+    weight = np.cumsum(counts)
+    moment = np.cumsum(counts * np.arange(256))
+    total, global_moment = weight[-1], moment[-1]
+    # Integer weights, so classes are empty exactly at both ends.
+    valid = (weight > 0) & (weight < total)
+    if not valid.any():
+        return 0
+    between = global_moment * weight.astype(np.float64) - moment * np.float64(total)
+    weights = weight[valid].astype(np.float64)
+    variance = np.zeros(256)
+    variance[valid] = between[valid] ** 2 / (weights * (total - weights))
+    best = int(np.argmax(variance))  # First maximum, as libkayn.
+    return best if variance[best] > 0 else 0
+
+
+def class_variance_table(histogram: np.ndarray) -> np.ndarray:
+    """table[a, b] = S(a, b)² / P(a, b) for a <= b, -inf below the diagonal."""
+    counts = np.asarray(histogram, dtype=np.float64)
+    probabilities = counts / max(counts.sum(), 1)
+    weight = np.concatenate(([0.0], np.cumsum(probabilities)))
+    moment = np.concatenate(([0.0], np.cumsum(probabilities * np.arange(256))))
+    p = weight[np.newaxis, 1:] - weight[:-1, np.newaxis]
+    s = moment[np.newaxis, 1:] - moment[:-1, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        table = np.where(p > 0, s * s / p, 0.0)
+    table[np.tril_indices(256, -1)] = -np.inf
+    return table
+
+
+def thresholds(histogram: np.ndarray, classes: int) -> tuple[int, ...]:
+    """The `classes - 1` thresholds maximizing the between-class variance."""
+    if not 2 <= classes <= 256:
+        raise ValueError("Otsu needs between 2 and 256 classes")
+    table = class_variance_table(histogram)
+    # best[b]: best sum for levels 0..b split into the classes so far.
+    best = table[0].copy()
+    starts = []  # Per added class: the start level of the last class, per b.
+    for _ in range(classes - 1):
+        # candidates[a, b] = best[a - 1] + table[a, b], for a >= 1.
+        candidates = best[:-1, np.newaxis] + table[1:]
+        start = np.argmax(candidates, axis=0)
+        best = candidates[start, np.arange(256)]
+        starts.append(start + 1)
+    result, end = [], 255
+    for start in reversed(starts):
+        end = int(start[end]) - 1
+        result.append(end)
+    return tuple(reversed(result))
+
+
+def quantization_lut(levels: tuple[int, ...]) -> np.ndarray:
+    """Lookup table mapping every class of `levels` to evenly spaced grays."""
+    classes = np.searchsorted(np.asarray(levels), np.arange(256), side="left")
+    return (classes * 255 // len(levels)).astype(np.uint8)
@@ -0,0 +1,375 @@
+from dataclasses import dataclass
+from PyQt5.QtGui import QImage
+import numpy as np
+import modules.image_adapter as img_adpt
+import modules.numpy_backend as np_backend
+import modules.convolution as conv
+import modules.rank as rank
+import modules.progress as progress
+
+# Filter pipelines. A Pipeline records a sequence of NumPy backend filters,
+# e.g. Pipeline().grayscale().equalize().binarize(127).erosion(3), and runs
+# it on any image in one pass, without full-size intermediate images.
+#
+# Consecutive point ops fuse into one lookup table per channel. Ops that
+# depend on the image (equalize, normalize) are resolved in lookup table
+# space: the histogram of the fused stage's input, pushed through the table
+# built so far, is the histogram of the intermediate image they would see.
+# A grayscale mixes channels, so it starts a new fused stage.
+#
+# Neighborhood ops run in bands of output rows, or in tiles when
+# `band_columns` is set, so memory does not grow with the width either.
+# Every band walks the stages backwards to find the input rect it reads,
+# including each op's halo, then runs all stages on that small crop. Bands therefore agree with running
+# the filters one after the other on the whole image. Stages that need a
+# histogram of an intermediate result get it from an extra banded pass over
+# the stages before them.
+
+BAND_ROWS = 256
+
+# (y0, y1, x0, x1), half-open, in the coordinates of one stage's image.
+Rect = tuple[int, int, int, int]
+
+
+def _bands(size: tuple[int, int], rows: int, columns: int = None):
+    h, w = size
+    columns = columns or w
+    for y in range(0, h, rows):
+        for x in range(0, w, columns):
+            yield y, min(y + rows, h), x, min(x + columns, w)
+
+
+def _crop(pixels: np.ndarray, have: Rect, want: Rect) -> np.ndarray:
+    y, x = want[0] - have[0], want[2] - have[2]
+    return pixels[y : y + want[1] - want[0], x : x + want[3] - want[2]]
+
+
+# Point ops in lookup table space: `luts` (3, 256) maps the levels of the
+# stage input to current levels, `histogram` (3, 256) counts the stage input.
+def _levels_histogram(luts: np.ndarray, histogram: np.ndarray) -> np.ndarray:
+    return np.stack([np.bincount(luts[c], histogram[c], 256) for c in range(3)])
+
+
+def _negative(luts, histogram):
+    return 255 - luts
+
+
+def _binarize(luts, histogram, threshold):
+    return np.where(luts < threshold, 0, 255)
+
+
+def _limiarize(luts, histogram, threshold):
+    return np.where(luts < threshold, 0, luts)
+
+
+def _normalize(luts, histogram):
+    counts = _levels_histogram(luts, histogram)
+    new_luts = np.zeros_like(luts)
+    for channel in range(3):
+        present = np.flatnonzero(counts[channel])
+        if present.size == 0:
+            continue
+        lo, hi = int(present[0]), int(present[-1])
+        if hi > lo:
+            table = np.zeros(256, dtype=np.int64)
+            table[lo : hi + 1] = np_backend.stretch_table(lo, hi)
+            new_luts[channel] = table[luts[channel]]
+    return new_luts
+
+
+def _equalize(luts, histogram):
+    counts = _levels_histogram(luts, histogram).sum(axis=0).astype(np.int64)
+    cumulative = np.cumsum(counts)
+    return (cumulative * 255 // cumulative[-1])[luts]
+
+
+def _dynamic_compression(luts, histogram, constant, gamma):
+    levels = np_backend.LEVELS.astype(np.float32)
+    compressed = np.float32(constant) * levels ** np.float32(gamma)
+    compressed = np.clip(np.nan_to_num(compressed, nan=0.0), 0, 255)
+    return _normalize(compressed.astype(np.uint8).astype(np.int64)[luts], histogram)
+
+
+POINT_OPS = {
+    "negative": _negative,
+    "binarize": _binarize,
+    "limiarize": _limiarize,
+    "normalize": _normalize,
+    "equalize": _equalize,
+    "dynamic_compression": _dynamic_compression,
+}
+# Point ops whose table depends on the image.
+HISTOGRAM_OPS = {"normalize", "equalize", "dynamic_compression"}
+
+
+@dataclass
+class _PointStage:
+    gray: bool
+    ops: list
+    luts: np.ndarray = None  # Resolved per image, see Pipeline.run.
+
+    def need(self, rect: Rect, size) -> Rect:
+        return rect
+
+    def output_size(self, size):
+        return size
+
+    def stage_input(self, pixels: np.ndarray) -> np.ndarray:
+        return np_backend.grayscale(pixels) if self.gray else pixels
+
+    def run(self, pixels: np.ndarray, rect: Rect, size):
+        return np_backend.apply_lut(self.stage_input(pixels), self.luts), rect
+
+    def resolve(self, histogram: np.ndarray) -> None:
+        luts = np.tile(np.arange(256, dtype=np.int64), (3, 1))
+        for name, kwargs in self.ops:
+            luts = POINT_OPS[name](luts, histogram, **kwargs)
+        self.luts = luts.astype(np.uint8)
+
+
+@dataclass
+class _ValidStage:
+    # Rank filters and convolutions: a side x side window, valid region only.
+    side: int
+    function: callable
+
+    def need(self, rect: Rect, size) -> Rect:
+        y0, y1, x0, x1 = rect
+        return y0, y1 + self.side - 1, x0, x1 + self.side - 1
+
+    def output_size(self, size):
+        return size[0] - self.side + 1, size[1] - self.side + 1
+
+    def run(self, pixels: np.ndarray, rect: Rect, size):
+        y0, y1, x0, x1 = rect
+        shrink = self.side - 1
+        return self.function(pixels), (y0, y1 - shrink, x0, x1 - shrink)
+
+
+@dataclass
+class _SameSizeStage:
+    # Morphology: same size output, `halo` (top, bottom, left, right) pixels
+    # of input around every output pixel; the image border is padded.
+    halo: tuple
+    function: callable
+
+    def need(self, rect: Rect, size) -> Rect:
+        (y0, y1, x0, x1), (top, bottom, left, right) = rect, self.halo
+        h, w = size
+        return max(y0 - top, 0), min(y1 + bottom, h), max(x0 - left, 0), min(x1 + right, w)
+
+    def output_size(self, size):
+        return size
+
+    def run(self, pixels: np.ndarray, rect: Rect, size):
+        return self.function(pixels), rect
+
+
+def _convolute(mask: np.ndarray):
+    def function(pixels):
+        filtered = conv.correlate(pixels[..., :3].astype(np.float32), mask)
+        new_image = np.full(filtered.shape[:2] + (4,), 255, dtype=np.uint8)
+        new_image[..., :3] = np.clip(np_backend.round_half_away(filtered), 0, 255)
+        return new_image
+
+    return function
+
+
+MORPHOLOGY = {
+    "erosion": (np_backend.erosion, 1),
+    "dilation": (np_backend.dilation, 1),
+    "opening": (np_backend.opening, 2),
+    "closing": (np_backend.closing, 2),
+    "top_hat": (np_backend.top_hat, 2),
+}
+LAPLACE = np.array([[0, -1, 0], [-1, 4, -1], [0, -1, 0]]) / np.float64(4)
+# fmt: off
+GAUSSIAN_LAPLACE = np.array(
+    [
+        [ 0,  0, -1,  0,  0],
+        [ 0, -1, -2, -1,  0],
+        [-1, -2, 16, -2, -1],
+        [ 0, -1, -2, -1,  0],
+        [ 0,  0, -1,  0,  0],
+    ]
+) / np.float64(16)
+# fmt: on
+
+
+@dataclass(frozen=True)
+class Pipeline:
+    """
+    An immutable recipe of filters; every method returns a longer copy, so
+    a pipeline can be stored, extended and replayed on other images.
+    """
+
+    steps: tuple = ()
+    band_rows: int = BAND_ROWS
+    band_columns: int = None  # Whole rows
+
+    def _then(self, name: str, **kwargs) -> "Pipeline":
+        step = (name, tuple(sorted(kwargs.items())))
+        return Pipeline(self.steps + (step,), self.band_rows, self.band_columns)
+
+    # Point ops
+    def grayscale(self) -> "Pipeline":
+        return self._then("grayscale")
+
+    def negative(self) -> "Pipeline":
+        return self._then("negative")
+
+    def binarize(self, threshold: int) -> "Pipeline":
+        return self._then("binarize", threshold=threshold)
+
+    def limiarize(self, threshold: int) -> "Pipeline":
+        return self._then("limiarize", threshold=threshold)
+
+    def normalize(self) -> "Pipeline":
+        return self._then("normalize")
+
+    def equalize(self) -> "Pipeline":
+        return self._then("equalize")
+
+    def dynamic_compression(self, c: float = 1, gamma: float = 1) -> "Pipeline":
+        return self._then("dynamic_compression", constant=c, gamma=gamma)
+
+    # Neighborhood ops, with the same parameters as in Filters
+    def mean(self, n: int = 3) -> "Pipeline":
+        return self._then("mean", n=n)
+
+    def laplace(self) -> "Pipeline":
+        return self._then("laplace")
+
+    def gaussian_laplacian(self) -> "Pipeline":
+        return self._then("gaussian_laplacian")
+
+    def median(self, n: int = 3, per_channel: bool = True) -> "Pipeline":
+        return self._then("median", n=n, per_channel=per_channel)
+
+    def noise_reduction_max(self, n: int = 3, per_channel: bool = True) -> "Pipeline":
+        return self._then("max", n=n, per_channel=per_channel)
+
+    def noise_reduction_min(self, n: int = 3, per_channel: bool = True) -> "Pipeline":
+        return self._then("min", n=n, per_channel=per_channel)
+
+    def noise_reduction_midpoint(self, n: int = 3, per_channel: bool = True) -> "Pipeline":
+        return self._then("midpoint", n=n, per_channel=per_channel)
+
+    def erosion(self, size=3, shape: str = "cross") -> "Pipeline":
+        return self._then("erosion", size=size, shape=shape)
+
+    def dilation(self, size=3, shape: str = "cross") -> "Pipeline":
+        return self._then("dilation", size=size, shape=shape)
+
+    def opening(self, size=3, shape: str = "cross") -> "Pipeline":
+        return self._then("opening", size=size, shape=shape)
+
+    def closing(self, size=3, shape: str = "cross") -> "Pipeline":
+        return self._then("closing", size=size, shape=shape)
+
+    def top_hat(self, size=3, shape: str = "cross") -> "Pipeline":
+        return self._then("top_hat", size=size, shape=shape)
+
+    # Execution
+    def compile(self) -> list:
+        """The stages to run: fused point stages and neighborhood stages."""
+        stages = []
+
+        def point(name: str, **kwargs):
+            if not stages or not isinstance(stages[-1], _PointStage):
+                stages.append(_PointStage(gray=False, ops=[]))
+            stages[-1].ops.append((name, kwargs))
+
+        for name, kwargs in self.steps:
+            kwargs = dict(kwargs)
+            if name == "grayscale":
+                stages.append(_PointStage(gray=True, ops=[]))
+            elif name in POINT_OPS:
+                point(name, **kwargs)
+            elif name in ("mean", "laplace", "gaussian_laplacian"):
+                mask = {"laplace": LAPLACE, "gaussian_laplacian": GAUSSIAN_LAPLACE}.get(name)
+                if mask is None:
+                    mask = np.ones((kwargs["n"], kwargs["n"])) / kwargs["n"] ** 2
+                stages.append(_ValidStage(mask.shape[0], _convolute(mask)))
+                point("normalize")  # Convolutions normalize their result.
+            elif name in ("median", "max", "min", "midpoint"):
+                n, per_channel = kwargs["n"] | 1, kwargs["per_channel"]
+                function = lambda p, n=n, name=name, per_channel=per_channel: rank.rank_filter(
+                    p, n, name, per_channel
+                )
+                stages.append(_ValidStage(n, function))
+            elif name in MORPHOLOGY:
+                operation, passes = MORPHOLOGY[name]
+                size, shape = kwargs["size"], kwargs["shape"]
+                h, w = (size, size) if isinstance(size, int) else tuple(size)
+                halo = tuple(passes * d for d in (h // 2, (h - 1) // 2, w // 2, (w - 1) // 2))
+                function = lambda p, op=operation, size=size, shape=shape: op(p, size, shape)
+                stages.append(_SameSizeStage(halo, function))
+            else:
+                raise ValueError(f"Unknown pipeline step {name!r}")
+        return stages
+
+    def run(self, image: QImage) -> QImage:
+        return img_adpt.array_to_image(self.run_array(img_adpt.image_to_array(image)))
+
+    def output_size(self, height: int, width: int) -> tuple[int, int]:
+        size = height, width
+        for stage in self.compile():
+            size = stage.output_size(size)
+        return size
+
+    def run_array(self, pixels: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Run on an (h, w, 4) array. `pixels` and `out` may be memory maps:
+        they are only read and written band by band.
+        """
+        stages = self.compile()
+        sizes = [pixels.shape[:2]]
+        for stage in stages:
+            sizes.append(stage.output_size(sizes[-1]))
+        if min(sizes[-1]) <= 0:
+            raise ValueError("Image is smaller than the pipeline's masks")
+
+        # One pass per stage needing a histogram, then the output pass.
+        resolving = [i for i, s in enumerate(stages) if isinstance(s, _PointStage)]
+        passes = sum(1 for i in resolving if self._needs_histogram(stages[i])) + 1
+        done = 0
+        for i in resolving:
+            stage = stages[i]
+            histogram = np.zeros((3, 256), dtype=np.int64)
+            if self._needs_histogram(stage):
+                with progress.section(done, passes):
+                    for band in self._run_bands(pixels, stages[:i], sizes[: i + 1]):
+                        band = stage.stage_input(band)
+                        for channel in range(3):
+                            histogram[channel] += np.bincount(band[..., channel].ravel(), minlength=256)
+                done += 1
+            stage.resolve(histogram)
+
+        output = np.empty(sizes[-1] + (4,), dtype=np.uint8) if out is None else out
+        with progress.section(done, passes):
+            bands = _bands(sizes[-1], self.band_rows, self.band_columns)
+            for (y0, y1, x0, x1), band in zip(bands, self._run_bands(pixels, stages, sizes)):
+                output[y0:y1, x0:x1] = band
+        return output
+
+    @staticmethod
+    def _needs_histogram(stage) -> bool:
+        return any(name in HISTOGRAM_OPS for name, _ in stage.ops)
+
+    def _run_bands(self, pixels: np.ndarray, stages: list, sizes: list):
+        """Yield the output of `stages` band by band, in reading order."""
+        bands = list(_bands(sizes[-1], self.band_rows, self.band_columns))
+        for index, band in enumerate(bands):
+            with progress.section(index, len(bands)):
+                rects = [band]
+                for stage, size in zip(stages[::-1], sizes[-2::-1]):
+                    rects.append(stage.need(rects[-1], size))
+                rects.reverse()
+                have = rects[0]
+                values = _crop(pixels, (0, sizes[0][0], 0, sizes[0][1]), have)
+                for stage, size, want in zip(stages, sizes, rects[1:]):
+                    values, have = stage.run(values, have, size)
+                    values, have = _crop(values, have, want), want
+                progress.report(1, 1)
+            yield values
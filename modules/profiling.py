@@ -0,0 +1,203 @@
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+# Profiling spans. Code wraps its stages in `with span("kernel", **args):`
+# and every finished span goes to the registered sinks. Without sinks
+# `span` returns a shared no-op context manager, so instrumented code costs
+# next to nothing in production.
+#
+# Spans nest: a span's path is its parent's path plus its own name, e.g.
+# "grayscale/kernel", which is how the Aggregator tells the kernels of
+# different filters apart.
+#
+# Environment:
+#   KAYN_PROFILE=1          print an Aggregator summary to stderr at exit
+#   KAYN_TRACE=trace.json   write a Chrome trace (chrome://tracing, Perfetto)
+
+
+@dataclass
+class Span:
+    name: str
+    path: str
+    start: int  # perf_counter_ns
+    duration: int  # ns
+    thread: int
+    args: dict
+
+
+class NullSink:
+    """Discards everything; registering it keeps spans disabled."""
+
+    enabled = False
+
+    def record(self, span: Span) -> None:
+        pass
+
+
+@dataclass
+class Aggregator:
+    """Keeps every duration per span path and summarizes them."""
+
+    enabled = True
+    durations: dict = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, span: Span) -> None:
+        with self.lock:
+            self.durations.setdefault(span.path, []).append(span.duration)
+
+    def total(self, name: str) -> float:
+        """Seconds spent in spans called `name`, at any depth."""
+        with self.lock:
+            return sum(
+                sum(values)
+                for path, values in self.durations.items()
+                if path.rsplit("/", 1)[-1] == name
+            ) / 1e9
+
+    def summary(self) -> dict:
+        with self.lock:
+            items = [(path, sorted(values)) for path, values in self.durations.items()]
+        percentile = lambda values, p: values[min(int(p * len(values)), len(values) - 1)] / 1e9
+        return {
+            path: {
+                "count": len(values),
+                "total_s": sum(values) / 1e9,
+                "mean_s": sum(values) / len(values) / 1e9,
+                "p50_s": percentile(values, 0.50),
+                "p90_s": percentile(values, 0.90),
+                "p99_s": percentile(values, 0.99),
+                "max_s": values[-1] / 1e9,
+            }
+            for path, values in items
+        }
+
+    def report(self) -> str:
+        lines = [f"{'span':<40} {'count':>7} {'total s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}"]
+        for path, s in sorted(self.summary().items()):
+            lines.append(
+                f"{path:<40} {s['count']:>7} {s['total_s']:>10.4f} "
+                f"{s['p50_s'] * 1e3:>9.3f} {s['p90_s'] * 1e3:>9.3f} {s['p99_s'] * 1e3:>9.3f}"
+            )
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.durations.clear()
+
+
+@dataclass
+class ChromeTrace:
+    """Collects spans as Chrome trace "complete" events."""
+
+    enabled = True
+    events: list = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, span: Span) -> None:
+        event = {
+            "name": span.name,
+            "cat": "kayn",
+            "ph": "X",
+            "ts": span.start / 1e3,
+            "dur": span.duration / 1e3,
+            "pid": os.getpid(),
+            "tid": span.thread,
+            "args": {k: v if isinstance(v, (int, float, str, bool)) else repr(v) for k, v in span.args.items()},
+        }
+        with self.lock:
+            self.events.append(event)
+
+    def write(self, path: str) -> None:
+        with self.lock:
+            events = list(self.events)
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+_sinks: tuple = ()
+_path: ContextVar = ContextVar("span", default="")
+
+
+def add_sink(sink) -> None:
+    global _sinks
+    if sink.enabled:
+        _sinks = _sinks + (sink,)
+
+
+def remove_sink(sink) -> None:
+    global _sinks
+    _sinks = tuple(s for s in _sinks if s is not sink)
+
+
+class recording:
+    """`with recording(Aggregator()) as sink:` registers `sink` inside."""
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def __enter__(self):
+        add_sink(self.sink)
+        return self.sink
+
+    def __exit__(self, *exc):
+        remove_sink(self.sink)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "path", "reset", "start")
+
+    def __init__(self, name: str, args: dict):
+        self.name, self.args = name, args
+
+    def __enter__(self):
+        parent = _path.get()
+        self.path = f"{parent}/{self.name}" if parent else self.name
+        self.reset = _path.set(self.path)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter_ns() - self.start
+        _path.reset(self.reset)
+        span = Span(self.name, self.path, self.start, duration, threading.get_ident(), self.args)
+        for sink in _sinks:
+            sink.record(span)
+
+
+def span(name: str, **args):
+    if not _sinks:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def _install_from_environment() -> None:
+    if os.environ.get("KAYN_PROFILE"):
+        aggregator = Aggregator()
+        add_sink(aggregator)
+        atexit.register(lambda: print(aggregator.report(), file=sys.stderr))
+    trace_path = os.environ.get("KAYN_TRACE")
+    if trace_path:
+        trace = ChromeTrace()
+        add_sink(trace)
+        atexit.register(trace.write, trace_path)
+
+
+_install_from_environment()
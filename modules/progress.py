@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import threading
+
+# Progress and cooperative cancellation for long filters. A job runs its
+# filter under `tracking(token)`; chunked kernels call `report(done, total)`
+# between chunks, which forwards the fraction to the token and raises
+# Cancelled once the token was cancelled. Outside a job `report` is a no-op,
+# so kernels never need to know whether they run in the background.
+
+
+class Cancelled(Exception):
+    """Raised inside a filter whose job was cancelled or superseded."""
+
+
+@dataclass
+class Token:
+    on_progress: callable = None
+    _cancelled: threading.Event = field(default_factory=threading.Event)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+
+# (token, start, span): nested sections map their reports into [start, start + span].
+_current: ContextVar = ContextVar("progress", default=None)
+
+
+@contextmanager
+def tracking(token: Token):
+    reset = _current.set((token, 0.0, 1.0))
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+@contextmanager
+def section(index: int, count: int):
+    """Scale reports made inside to the `index`-th of `count` equal parts."""
+    state = _current.get()
+    if state is None:
+        yield
+        return
+    token, start, span = state
+    reset = _current.set((token, start + span * index / count, span / count))
+    try:
+        yield
+    finally:
+        _current.reset(reset)
+
+
+def report(done: int, total: int):
+    state = _current.get()
+    if state is None:
+        return
+    token, start, span = state
+    if token.cancelled:
+        raise Cancelled()
+    if token.on_progress is not None and total > 0:
+        token.on_progress(start + span * min(done / total, 1.0))
@@ -0,0 +1,43 @@
+from dataclasses import dataclass, field
+import numpy as np
+
+# Mip pyramid of an RGBA image for fast previews. Level 0 is the image
+# itself; each next level halves both sides by averaging 2 x 2 blocks.
+# Levels are built on demand, so asking for a small preview of a huge
+# image costs a few halvings, and later requests reuse them.
+
+
+def downsample(pixels: np.ndarray) -> np.ndarray:
+    """Halve an (h, w, c) uint8 image by averaging 2 x 2 blocks."""
+    h, w = pixels.shape[0] // 2 * 2, pixels.shape[1] // 2 * 2
+    blocks = pixels[:h, :w].astype(np.uint16)
+    total = blocks[0::2, 0::2] + blocks[1::2, 0::2] + blocks[0::2, 1::2] + blocks[1::2, 1::2]
+    return ((total + 2) >> 2).astype(np.uint8)
+
+
+@dataclass
+class Pyramid:
+    levels: list = field(default_factory=list)
+
+    @staticmethod
+    def of(pixels: np.ndarray) -> "Pyramid":
+        return Pyramid([pixels])
+
+    def level(self, index: int) -> np.ndarray:
+        while len(self.levels) <= index:
+            top = self.levels[-1]
+            if min(top.shape[:2]) < 2:
+                break
+            self.levels.append(downsample(top))
+        return self.levels[min(index, len(self.levels) - 1)]
+
+    def level_for(self, width: int, height: int) -> tuple[int, np.ndarray]:
+        """
+        The smallest level still covering a width x height display, as
+        (index, pixels). Index 0 means the full image is needed.
+        """
+        h, w = self.levels[0].shape[:2]
+        index = 0
+        while w >> (index + 1) >= width and h >> (index + 1) >= height:
+            index += 1
+        return index, self.level(index)
@@ -0,0 +1,121 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import modules.morphology as morph
+import modules.progress as progress
+
+# Rank filters (median, min, max, midpoint) used by the NumPy backend.
+# Like the convolution engine they return the valid region only.
+#
+# Per channel, min and max come from the van Herk/Gil-Werman filters in
+# modules.morphology. Other ranks partition every window directly for small
+# windows (O(k²) per pixel, vectorized); large windows use sliding column
+# histograms in the spirit of Perreault-Hébert, where the cost per pixel is
+# a fixed 256-bin histogram update whatever the window size.
+#
+# The packed ordering sorts whole pixels by their 0xRRGGBB value, as the
+# original libkayn kernels do.
+
+HISTOGRAM_MIN_SIDE = 15
+BAND_BYTES = 64 * 1024 * 1024
+
+
+def rank_of(name: str, side: int) -> tuple[int, ...]:
+    """Window positions (in sorted order) needed to compute `name`."""
+    size = side * side
+    ranks = {
+        "median": (size // 2,),
+        "min": (0,),
+        "max": (size - 1,),
+        "midpoint": (0, size - 1),
+    }
+    return ranks[name]
+
+
+def rank_filter(image: np.ndarray, side: int, name: str, per_channel: bool = True) -> np.ndarray:
+    """
+    Apply the `name` rank filter with a side x side window to the RGB
+    channels of an RGBA image. Returns an opaque RGBA valid region.
+    """
+    h, w = image.shape[0] - side + 1, image.shape[1] - side + 1
+    new_image = np.full((h, w, 4), 255, dtype=np.uint8)
+    ranks = rank_of(name, side)
+
+    if per_channel:
+        for channel in range(3):
+            with progress.section(channel, 3):
+                values = [_channel_rank(image[..., channel], side, r) for r in ranks]
+            new_image[..., channel] = _combine(values)
+        return new_image
+
+    keys = _pack(image)
+    values = [_partition_rank(keys, side, r) for r in ranks]
+    if len(values) == 1:
+        new_image[..., :3] = _unpack(values[0])
+    else:
+        new_image[..., :3] = _combine([_unpack(v) for v in values])
+    return new_image
+
+
+def _combine(values: list) -> np.ndarray:
+    if len(values) == 1:
+        return values[0]
+    low, high = values
+    return low // 2 + high // 2
+
+
+def _pack(image: np.ndarray) -> np.ndarray:
+    rgb = image[..., :3].astype(np.uint32)
+    return rgb[..., 0] << 16 | rgb[..., 1] << 8 | rgb[..., 2]
+
+
+def _unpack(keys: np.ndarray) -> np.ndarray:
+    shifts = np.array([16, 8, 0], dtype=np.uint32)
+    return (keys[..., np.newaxis] >> shifts & 0xFF).astype(np.uint8)
+
+
+def _channel_rank(channel: np.ndarray, side: int, rank: int) -> np.ndarray:
+    size = side * side
+    if rank == 0:
+        return morph.extreme(channel, side, np.minimum)
+    if rank == size - 1:
+        return morph.extreme(channel, side, np.maximum)
+    if side >= HISTOGRAM_MIN_SIDE:
+        return _histogram_rank(channel, side, rank)
+    return _partition_rank(channel, side, rank)
+
+
+def _partition_rank(values: np.ndarray, side: int, rank: int) -> np.ndarray:
+    windows = sliding_window_view(values, (side, side))
+    h, w = windows.shape[:2]
+    result = np.empty((h, w), dtype=values.dtype)
+    rows_per_band = max(1, BAND_BYTES // (w * side * side * values.itemsize))
+    for y in range(0, h, rows_per_band):
+        progress.report(y, h)
+        band = windows[y : y + rows_per_band].reshape(-1, w, side * side)
+        result[y : y + rows_per_band] = np.partition(band, rank, axis=-1)[..., rank]
+    return result
+
+
+def _histogram_rank(channel: np.ndarray, side: int, rank: int) -> np.ndarray:
+    h, w = channel.shape
+    new_h, new_w = h - side + 1, w - side + 1
+    columns = np.arange(w)
+    histograms = np.zeros((w, 256), dtype=np.int32)
+    for y in range(side - 1):
+        histograms[columns, channel[y]] += 1
+
+    result = np.empty((new_h, new_w), dtype=np.uint8)
+    window = np.zeros((new_w, 256), dtype=np.int32)
+    for y in range(new_h):
+        progress.report(y, new_h)
+        if y > 0:
+            histograms[columns, channel[y - 1]] -= 1
+        histograms[columns, channel[y + side - 1]] += 1
+
+        # Window histograms for the whole row, as differences of prefix sums.
+        prefix = np.cumsum(histograms, axis=0)
+        window[:] = prefix[side - 1 :]
+        window[1:] -= prefix[: new_w - 1]
+        cumulative = np.cumsum(window, axis=1, out=window)
+        result[y] = np.count_nonzero(cumulative <= rank, axis=1)
+    return result
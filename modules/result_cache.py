@@ -0,0 +1,179 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import wraps
+from PyQt5.QtGui import QImage
+import hashlib
+import inspect
+import threading
+import numpy as np
+import os
+import modules.image_adapter as img_adpt
+
+# LRU cache of filter results. Keys are the filter name, its arguments and
+# a blake2b digest of the pixels or arrays it reads, so the same filter on
+# the same content hits whichever QImage object carries it. Entries are
+# evicted least recently used first once their bytes exceed the budget.
+#
+# QImages are copy-on-write and can be handed out as they are, once they
+# own their pixels: those wrapping an array are detached when stored, as
+# the entry outlives the code that made them. Arrays may be changed in
+# place by the caller (FreqDomain edits its coefficients), so they are
+# copied in and out.
+#
+# Only filters costing well more than a digest are worth caching: Filters
+# decorates its neighborhood filters, transforms and pipelines, not the
+# point operations, which run in about the time hashing their input takes.
+
+# Memory the cache may hold, in MiB; 0 disables it.
+DEFAULT_BUDGET_MB = int(os.environ.get("FILTER_CACHE_MB", 256))
+# Image digests remembered by QImage.cacheKey().
+DIGESTS = 64
+
+
+def content_hash(pixels: np.ndarray) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((pixels.shape, pixels.dtype.str)).encode())
+    digest.update(np.ascontiguousarray(pixels).data)
+    return digest.digest()
+
+
+# Qt gives every new or detached QImage a new cacheKey(), so an image is
+# hashed once however many filters (and nested calls) read it. Pixels
+# written behind Qt's back, through an array wrapped by array_to_image,
+# keep the key: images handed to filters must not change afterwards.
+_digests: OrderedDict = OrderedDict()
+_digests_lock = threading.Lock()
+
+
+def image_hash(image: QImage) -> bytes:
+    key = image.cacheKey()
+    with _digests_lock:
+        if key in _digests:
+            _digests.move_to_end(key)
+            return _digests[key]
+    digest = content_hash(img_adpt.image_to_array(image))
+    with _digests_lock:
+        _digests[key] = digest
+        if len(_digests) > DIGESTS:
+            _digests.popitem(last=False)
+    return digest
+
+
+def _key_of(value):
+    if isinstance(value, QImage):
+        return "image", image_hash(value)
+    if isinstance(value, np.ndarray):
+        return "array", content_hash(value)
+    if isinstance(value, (list, tuple)):
+        return type(value).__name__, tuple(_key_of(v) for v in value)
+    return value
+
+
+def _size_of(value) -> int:
+    if isinstance(value, QImage):
+        return value.sizeInBytes()
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_size_of(v) for v in value)
+    return 64
+
+
+def _copy_arrays(value):
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy_arrays(v) for v in value)
+    if isinstance(value, list):
+        return [_copy_arrays(v) for v in value]
+    return value
+
+
+@dataclass
+class ResultCache:
+    budget: int = DEFAULT_BUDGET_MB << 20  # bytes
+    hits: int = 0
+    misses: int = 0
+    size: int = 0
+    entries: OrderedDict = field(default_factory=OrderedDict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def get(self, key):
+        """The cached result for `key`, or None on a miss."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return _copy_arrays(entry[0])
+
+    def put(self, key, value) -> None:
+        size = _size_of(value)
+        if size > self.budget:
+            return
+        value = _copy_arrays(img_adpt.detach(value))
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = value, size
+            self.size += size
+            while self.size > self.budget:
+                self.size -= self.entries.popitem(last=False)[1][1]
+
+    def resize(self, budget: int) -> None:
+        with self.lock:
+            self.budget = budget
+            while self.size > self.budget:
+                self.size -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "budget": self.budget,
+            }
+
+
+CACHE = ResultCache()
+
+
+def cached(function: callable) -> callable:
+    """
+    Memoize a filter. Methods are keyed on their instance's image and
+    backend, static methods on their arguments; QImage and array arguments
+    count by content. Arguments are bound to the signature first, so passing
+    them by position or by keyword gives the same key.
+    """
+    signature = inspect.signature(function)
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if CACHE.budget <= 0:
+            return function(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = []
+        for name, value in bound.arguments.items():
+            if name == "self" and hasattr(value, "img"):  # A Filters instance.
+                value = (value.img, value.backend)
+            arguments.append((name, _key_of(value)))
+        key = function.__qualname__, tuple(arguments)
+        result = CACHE.get(key)
+        if result is None:
+            result = function(*args, **kwargs)
+            CACHE.put(key, result)
+        return result
+
+    return wrapper
@@ -0,0 +1,58 @@
+import numpy as np
+
+# Zhang-Suen thinning for the NumPy backend, the same algorithm as libkayn's
+# thinning.rs. The 8 neighbors of a pixel form a byte (bit i is neighbor i,
+# clockwise from north) and a 256-entry table per sub-step tells whether a
+# pixel with those neighbors is deleted.
+#
+# Only pixels whose neighborhood changed are examined again: each sub-step
+# keeps a frontier, all foreground pixels at first and then the neighbors
+# of deleted pixels. A pixel that survived a sub-step stays deletable or not
+# in it until a neighbor goes, so the result equals rescanning every pixel.
+# libkayn packs the image in bits; here it takes a byte per pixel, which
+# keeps the neighbor gathers vectorized.
+
+# (dy, dx) of the neighbors P2..P9 of the paper.
+OFFSETS = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+
+
+def _deletable_tables() -> np.ndarray:
+    p = (np.arange(256)[:, np.newaxis] >> np.arange(8)) & 1
+    neighbors = p.sum(axis=1)
+    transitions = ((p == 0) & (np.roll(p, -1, axis=1) == 1)).sum(axis=1)
+    shape = (neighbors >= 2) & (neighbors <= 6) & (transitions == 1)
+    n, _, e, _, s, _, w, _ = p.T.astype(bool)
+    first = shape & ~(n & e & s) & ~(e & s & w)
+    second = shape & ~(n & e & w) & ~(n & s & w)
+    return np.stack([first, second])
+
+
+DELETABLE = _deletable_tables()
+
+
+def zhang_suen(foreground: np.ndarray) -> np.ndarray:
+    """Skeleton of a (h, w) boolean image; border pixels count as background."""
+    h, w = foreground.shape
+    image = np.zeros((h, w), dtype=bool)
+    image[1:-1, 1:-1] = foreground[1:-1, 1:-1]
+    image = image.ravel()
+    offsets = np.array([dy * w + dx for dy, dx in OFFSETS])
+
+    # frontier[step]: pixels to examine in that sub-step, as a mask, which
+    # also drops duplicates for free.
+    frontier = np.stack([image, image])
+    changed = True
+    while changed:
+        changed = False
+        for step in range(2):
+            candidates = np.flatnonzero(frontier[step] & image)
+            frontier[step] = False
+            codes = np.zeros(candidates.size, dtype=np.uint8)
+            for bit, offset in enumerate(offsets):
+                codes |= image[candidates + offset].view(np.uint8) << bit
+            deleted = candidates[DELETABLE[step][codes]]
+            image[deleted] = False  # After all tests: the sub-step is parallel.
+            if deleted.size:
+                changed = True
+                frontier[:, (deleted[:, np.newaxis] + offsets).ravel()] = True
+    return image.reshape(h, w)
@@ -0,0 +1,196 @@
+from PyQt5.QtGui import QImageReader
+import dataclasses
+import os
+import re
+import tempfile
+import weakref
+import numpy as np
+import modules.image_adapter as img_adpt
+import modules.progress as progress
+
+# Images larger than memory. A TiledImage keeps its RGBA pixels in a memory
+# mapped .npy file, so only the pages being read or written are resident
+# and the operating system drops them again under pressure.
+#
+# Pipelines stream over it in TILE x TILE tiles, each read with the halo its
+# filters need (see modules/pipeline.py), into a new memory mapped image.
+# Viewers ask for single tiles at a zoom level; level n reads every 2^n-th
+# pixel of a 2^n times larger area, so a tile always has at most TILE x TILE
+# pixels whatever the zoom.
+#
+# Uncompressed BMP and binary PGM/PPM files store their rows as they are, so
+# they are mapped like .npy files and converted in strips of STRIP_ROWS rows.
+# Qt has no way to decode other formats (TIFF, JPEG, PNG, ...) a part at a
+# time: a clip rect still decodes every row above it, when the plugin takes
+# one at all. Those are decoded whole, once, and refused when the decoded
+# image would take more than MAX_DECODED_BYTES.
+
+TILE = 512
+STRIP_ROWS = 1024
+MAX_DECODED_BYTES = int(os.environ.get("KAYN_MAX_DECODED_MB", 2048)) << 20
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _map_rows(path: str, offset: int, height: int, row_bytes: int, width: int, channels: int):
+    """A read-only map of the (height, width, channels) pixels of a raw file."""
+    rows = np.memmap(path, np.uint8, "r", offset=offset, shape=(height, row_bytes))
+    return rows[:, : width * channels].reshape(height, width, channels)
+
+
+def _map_bmp(path: str):
+    """(pixels, palette) of an uncompressed 8, 24 or 32 bit BMP, else None."""
+    with open(path, "rb") as file:
+        header = file.read(54)
+        if len(header) < 54 or header[:2] != b"BM":
+            return None
+        fields = "<u4,<u4,<i4,<i4,<u2,<u2,<u4,<u4,<i4,<i4,<u4"
+        offset, info_size, w, h, _, bits, compression, *_, used = np.frombuffer(
+            header, fields, count=1, offset=10
+        )[0].tolist()
+        if info_size < 40 or compression != 0 or bits not in (8, 24, 32) or w <= 0 or h == 0:
+            return None
+        palette = None
+        if bits == 8:  # BGRX entries right after the info header.
+            file.seek(14 + info_size)
+            colors = np.frombuffer(file.read(4 * min(used or 256, 256)), np.uint8)
+            palette = np.zeros((256, 3), np.uint8)
+            palette[: colors.size // 4] = colors[: colors.size // 4 * 4].reshape(-1, 4)[:, 2::-1]
+    channels = bits // 8
+    pixels = _map_rows(path, offset, abs(h), (w * channels + 3) & ~3, w, channels)
+    if h > 0:  # Rows are stored bottom-up unless the height is negative.
+        pixels = pixels[::-1]
+    return (pixels[..., 0], palette) if bits == 8 else (pixels[..., 2::-1], None)
+
+
+def _map_pnm(path: str):
+    """(pixels, None) of a binary 8 bit PGM or PPM, else None."""
+    with open(path, "rb") as file:
+        start = file.read(512)
+    # Magic number, width, height and maximum value, with optional comments.
+    separator = rb"(?:\s|#[^\n]*\n)+"
+    match = re.match(rb"P([56])" + (separator + rb"(\d+)") * 3 + rb"\s", start)
+    if match is None or int(match.group(4)) != 255:
+        return None
+    channels = 1 if match.group(1) == b"5" else 3
+    w, h = int(match.group(2)), int(match.group(3))
+    pixels = _map_rows(path, match.end(), h, w * channels, w, channels)
+    return (pixels[..., 0] if channels == 1 else pixels), None
+
+
+class TiledImage:
+    def __init__(self, pixels: np.ndarray, temporary: str = None):
+        self.pixels = pixels  # (height, width, 4) uint8, usually a np.memmap
+        if temporary is not None:  # Delete the backing file with the image.
+            weakref.finalize(self, _remove, temporary)
+
+    @classmethod
+    def create(cls, height: int, width: int) -> "TiledImage":
+        """A new image backed by a temporary file."""
+        descriptor, path = tempfile.mkstemp(prefix="kayn-tiles-", suffix=".npy")
+        os.close(descriptor)
+        pixels = np.lib.format.open_memmap(path, "w+", np.uint8, (height, width, 4))
+        return cls(pixels, temporary=path)
+
+    @classmethod
+    def open(cls, path: str) -> "TiledImage":
+        if path.lower().endswith(".npy"):
+            pixels = np.load(path, mmap_mode="r")
+            if pixels.dtype == np.uint8 and pixels.ndim == 3 and pixels.shape[2] == 4:
+                return cls(pixels)
+            return cls._from_array(pixels)
+        return cls._decode(path)
+
+    @classmethod
+    def _from_array(cls, pixels: np.ndarray, palette: np.ndarray = None) -> "TiledImage":
+        # Grayscale (h, w) or RGB (h, w, 3) arrays, converted in strips.
+        # `palette` maps (h, w) indices to RGB colors.
+        if pixels.ndim not in (2, 3) or pixels.ndim == 3 and pixels.shape[2] not in (3, 4):
+            raise ValueError(f"Unsupported array of shape {pixels.shape}")
+        h, w = pixels.shape[:2]
+        image = cls.create(h, w)
+        for y in range(0, h, STRIP_ROWS):
+            strip = pixels[y : y + STRIP_ROWS]
+            strip = np.clip(strip if palette is None else palette[strip], 0, 255).astype(np.uint8)
+            target = image.pixels[y : y + STRIP_ROWS]
+            if strip.ndim == 2:
+                target[..., :3] = strip[..., None]
+                target[..., 3] = 255
+            elif strip.shape[2] == 3:
+                target[..., :3] = strip
+                target[..., 3] = 255
+            else:
+                target[...] = strip
+            progress.report(min(y + STRIP_ROWS, h), h)
+        return image
+
+    @classmethod
+    def _decode(cls, path: str) -> "TiledImage":
+        raw = _map_bmp(path) or _map_pnm(path)
+        if raw is not None:
+            return cls._from_array(*raw)
+        reader = QImageReader(path)
+        size = reader.size()
+        if not size.isValid():
+            raise ValueError(f"Cannot read {path}: {reader.errorString()}")
+        w, h = size.width(), size.height()
+        if w * h * 4 > MAX_DECODED_BYTES:
+            raise ValueError(
+                f"{path} is too large to decode at once ({w}x{h}); "
+                "convert it to an uncompressed BMP, PPM or .npy file to open it tile by tile"
+            )
+        whole = reader.read()
+        if whole.isNull():
+            raise ValueError(f"Cannot read {path}: {reader.errorString()}")
+        image = cls.create(h, w)
+        image.pixels[...] = img_adpt.image_to_array(whole)
+        return image
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    def level_size(self, level: int) -> tuple[int, int]:
+        """(width, height) of the image at zoom level `level` (1 / 2^level)."""
+        step = 1 << level
+        return -(-self.width // step), -(-self.height // step)
+
+    def tile_count(self, level: int) -> tuple[int, int]:
+        """Tiles (across, down) at zoom level `level`."""
+        w, h = self.level_size(level)
+        return -(-w // TILE), -(-h // TILE)
+
+    def tile(self, tx: int, ty: int, level: int = 0) -> np.ndarray:
+        """Tile (tx, ty) of zoom level `level`, as a contiguous copy."""
+        step, span = 1 << level, TILE << level
+        x, y = tx * span, ty * span
+        return np.ascontiguousarray(self.pixels[y : y + span : step, x : x + span : step])
+
+    def apply(self, pipeline) -> "TiledImage":
+        """Run a Pipeline tile by tile into a new image."""
+        pipeline = dataclasses.replace(pipeline, band_rows=TILE, band_columns=TILE)
+        output = TiledImage.create(*pipeline.output_size(self.height, self.width))
+        pipeline.run_array(self.pixels, out=output.pixels)
+        output.pixels.flush()
+        return output
+
+    def save(self, path: str) -> None:
+        if path.lower().endswith(".npy"):
+            target = np.lib.format.open_memmap(path, "w+", np.uint8, self.pixels.shape)
+            for y in range(0, self.height, STRIP_ROWS):
+                target[y : y + STRIP_ROWS] = self.pixels[y : y + STRIP_ROWS]
+                progress.report(min(y + STRIP_ROWS, self.height), self.height)
+            target.flush()
+            return
+        # Image writers need the whole image; wrap the map instead of copying.
+        if not img_adpt.array_to_image(self.pixels).save(path):
+            raise ValueError(f"Cannot write {path}")
@@ -56,6 +56,14 @@ class Mac(OS):
 
 
 if __name__ == "__main__":
+    # Headless tools do not build anything
+    if sys.argv[1:2] == ["batch"]:
+        from modules.batch import main
+        sys.exit(main(sys.argv[2:]))
+    if sys.argv[1:2] == ["bench"]:
+        from modules.benchmark import main
+        sys.exit(main(sys.argv[2:]))
+
     # Recognize the OS
     system = sys.platform
     if sys.platform == "linux":
@@ -71,7 +79,7 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         if sys.argv[1] == "dev":
             system.dev_build()
-        if sys.argv[1] == "devb":
+        elif sys.argv[1] == "devb":
             system.lib_build()
             system.dev_build()
         elif sys.argv[1] == "release":
@@ -82,5 +90,5 @@ if __name__ == "__main__":
             print("Unsupported argument")
             sys.exit(1)
     else:
-        print("No argument given. Available arguments: dev, release")
+        print("No argument given. Available arguments: dev, devb, release, install, batch, bench")
         sys.exit(1)